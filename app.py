@@ -1,19 +1,31 @@
 # --- Imports
+# Les modules lourds (google.generativeai, fpdf, plotly, PIL, NumPy) sont
+# importés dans les fonctions qui les utilisent, au premier usage.
 import streamlit as st
-import google.generativeai as genai
-from google.api_core import exceptions as google_exceptions
-from datetime import datetime
 from io import BytesIO
-import pandas as pd
-from fpdf import FPDF
-import plotly.graph_objects as go
-from PIL import Image, ImageDraw, ImageFont
 import random
 import re
-import os
-import base64
+import json
 from pathlib import Path
-import tempfile
+import threading
+import time
+import hashlib
+import secrets
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from pipeline import Stage, run_pipeline, RUNNING, DONE, FAILED, SKIPPED
+from response_cache import get_response_cache, make_cache_key
+from neighbor_cache import get_neighbor_cache
+from asset_store import get_asset_store
+from image_renditions import get_image_renditions, EXTENSIONS
+from pdf_report import prepare_fonts, render_report
+from rate_limiter import get_scheduler, DEFAULT_OUTPUT_TOKENS
+from scoring import get_scoring_engine
+from history_store import get_history_store
+from static_assets import get_static_assets
+import gemini_clients
+import tracing
 
 ###########################
 # --- Configuration Globale
@@ -21,6 +33,73 @@ PRIMARY_COLOR = "#C8E546"
 SECONDARY_COLOR = "#1013B9"
 PREMIUM_FEATURES = True
 
+# --- Options des paramètres de campagne
+MODEL_OPTIONS = ["models/gemini-2.5-flash-image-preview", "gemini-pro", "gemini-1.5-pro-latest"]
+AUDIENCE_OPTIONS = ["18-24 ans", "25-34 ans", "35-44 ans", "45+ ans"]
+DURATION_OPTIONS = [7, 14, 30, 60, 90]
+GOAL_OPTIONS = ["Acquisition", "Conversion", "Rétention", "Notoriété"]
+STYLE_OPTIONS = ["Formel", "Dynamique", "Humour"]
+LANG_OPTIONS = ["Français", "Anglais"]
+DOMAIN_OPTIONS = [
+    "Général", "E-commerce", "Santé & Bien-être", "Éducation",
+    "Immobilier", "Finance", "Technologie", "Mode",
+    "Restauration", "Tourisme", "Divertissement", "Autre"
+]
+GENERATION_CONFIG = {"temperature": 0.7, "top_p": 1}
+GEMINI_TRANSPORT = None   # None = transport par défaut (gRPC), ou "rest"
+GEMINI_WARMUP = True      # Ouvrir la connexion au modèle par défaut dès le premier affichage
+
+# --- Backend des modèles (surchargeable dans les secrets : GEMINI_BACKEND, GEMINI_CASSETTE, [gemini_standin])
+GEMINI_BACKEND = "gemini"   # "gemini", "local" (simulateur), "record" ou "replay" (cassette)
+GEMINI_CASSETTE_PATH = ".cache/gemini_cassette.json"
+GEMINI_STANDIN_OPTIONS = {}  # Latences, taux de 429, etc. : voir gemini_standin.StandInModel
+BACKEND_LABELS = {"local": "simulateur local", "record": "API réelle, enregistrement de la cassette",
+                  "replay": "rejeu de la cassette"}
+
+# --- Cache approché : une analyse peut resservir, ajustée, à une campagne voisine
+NEIGHBOR_BANDS = {"budget": 2500}   # Largeur des tranches par paramètre numérique ; {} pour désactiver
+
+# --- Stockage en mémoire des images générées (par session)
+ASSET_STORE_MAX_BYTES = 64 * 1024 * 1024
+ASSET_SPILL_DIR = ".cache/assets"  # None pour désactiver le déversement sur disque
+ASSET_SPILL_MAX_BYTES = 256 * 1024 * 1024
+# Déclinaisons calculées en arrière-plan ; l'original n'est servi qu'au téléchargement.
+# Largeurs = celles que st.image sert sans redimensionner (pleine largeur : 2 × 730 px)
+HISTORY_THUMBNAIL_WIDTH = 120
+IMAGE_RENDITIONS = {
+    "display": {"max_width": 1460, "format": "AUTO", "quality": 82},   # Vue principale
+    "thumbnail": {"max_width": HISTORY_THUMBNAIL_WIDTH, "format": "AUTO", "quality": 75},  # Historique
+    "pdf": {"max_width": 1600, "format": "JPEG", "quality": 85},       # Rapport PDF (JPEG inclus sans ré-encodage)
+}
+RENDITION_WAIT_SECONDS = 2.0  # Au-delà, l'original est affiché en attendant sa déclinaison
+
+# --- Fichiers statiques (lus une fois par processus, revalidés par mtime)
+LOGO_PATH = "images/google_ai_gemini_logo.png"
+QR_CODE_PATH = "images/qr-code.png"
+PHOTO_PATH = "images/sofiane.jpg"
+TEMPLATE_PATH = "templates/marketing_template.docx"
+STATIC_REVALIDATE_SECONDS = 2.0
+DISPLAY_SCALE = 2  # Images servies en 2x pour les écrans haute densité
+
+# --- Historique persistant des analyses
+HISTORY_DB_PATH = ".cache/history.sqlite3"
+HISTORY_PAGE_SIZE = 10
+HISTORY_QUERY_PARAM = "historique"  # Lien privé : ?historique=<jeton> restaure l'historique
+
+# --- Quotas Gemini partagés par le processus : (requêtes/minute, tokens/minute)
+GEMINI_RATE_LIMITS = {
+    "models/gemini-2.5-flash-image-preview": (10, 250_000),
+    "models/gemini-pro": (15, 1_000_000),
+    "models/gemini-1.5-pro-latest": (2, 32_000),
+}
+GEMINI_DEFAULT_RATE_LIMIT = (10, 250_000)
+GEMINI_MAX_RETRIES = 4
+
+# --- Traces des étapes (journal JSON et métriques Prometheus)
+TRACE_LOG_PATH = ".cache/traces.jsonl"     # None pour ne pas journaliser
+METRICS_PATH = ".cache/metrics.prom"       # None pour ne pas écrire les métriques
+TRACE_DEBUG_PANEL = False                  # Panneau des traces dans la sidebar (ou ?debug=1 dans l'URL)
+
 # --- Configuration des polices locales
 def setup_fonts():
     font_dir = Path("fonts")
@@ -45,182 +124,345 @@ st.set_page_config(
 )
 
 # --- Styles CSS
+DEFAULT_CSS = """
+.stApp { background-color: #f9fafb; }
+.sidebar .sidebar-content { background-color: #ffffff; }
+.big-font { font-size: 1.5rem !important; }
+.premium-badge {
+    background-color: #F59E0B;
+    color: white;
+    padding: 0.2rem 0.5rem;
+    border-radius: 0.5rem;
+    font-size: 0.8rem;
+}
+.feature-card {
+    border-radius: 0.5rem;
+    padding: 1.5rem;
+    margin-bottom: 1rem;
+    box-shadow: 0 4px 6px -1px rgba(0, 0, 0, 0.1);
+}
+.celebration {
+    animation: celebrate 2s ease-in-out infinite;
+    text-align: center;
+    padding: 20px;
+    margin: 20px 0;
+}
+@keyframes celebrate {
+    0% { transform: scale(1); }
+    50% { transform: scale(1.05); }
+    100% { transform: scale(1); }
+}
+"""
+
+@st.cache_resource(show_spinner=False)
+def load_css(file_name):
+    """Crée le fichier CSS s'il manque et le lit une seule fois par processus."""
+    path = Path(file_name)
+    if not path.exists():
+        path.write_text(DEFAULT_CSS)
+    return path.read_text()
+
 def local_css(file_name):
-    if Path(file_name).exists():
-        with open(file_name) as f:
-            st.markdown(f'<style>{f.read()}</style>', unsafe_allow_html=True)
-
-# Créer le fichier CSS si inexistant
-css_file = "styles.css"
-if not Path(css_file).exists():
-    css_content = """
-    .stApp { background-color: #f9fafb; }
-    .sidebar .sidebar-content { background-color: #ffffff; }
-    .big-font { font-size: 1.5rem !important; }
-    .premium-badge {
-        background-color: #F59E0B;
-        color: white;
-        padding: 0.2rem 0.5rem;
-        border-radius: 0.5rem;
-        font-size: 0.8rem;
-    }
-    .feature-card {
-        border-radius: 0.5rem;
-        padding: 1.5rem;
-        margin-bottom: 1rem;
-        box-shadow: 0 4px 6px -1px rgba(0, 0, 0, 0.1);
-    }
-    .celebration {
-        animation: celebrate 2s ease-in-out infinite;
-        text-align: center;
-        padding: 20px;
-        margin: 20px 0;
-    }
-    @keyframes celebrate {
-        0% { transform: scale(1); }
-        50% { transform: scale(1.05); }
-        100% { transform: scale(1); }
-    }
-    """
-    with open(css_file, "w") as f:
-        f.write(css_content)
+    st.markdown(f'<style>{load_css(file_name)}</style>', unsafe_allow_html=True)
 
-local_css(css_file)
+local_css("styles.css")
 
-# --- Fonction pour générer une image de célébration (version améliorée)
-def generate_celebration_image(result_quality):
-    try:
-        width, height = 800, 400
-        # Utiliser un fond sombre pour un look plus 'pro'
-        background_color = (26, 28, 40) # Un bleu nuit profond
-        img = Image.new('RGB', (width, height), background_color)
-        draw = ImageDraw.Draw(img)
-
-        # Dessiner une grille subtile en arrière-plan
-        grid_color = (40, 42, 58)
-        for x in range(0, width, 40):
-            draw.line([(x, 0), (x, height)], fill=grid_color, width=1)
-        for y in range(0, height, 40):
-            draw.line([(0, y), (width, y)], fill=grid_color, width=1)
-
-        # Charger le logo Gemini
-        try:
-            gemini_logo = Image.open("images/google_ai_gemini_logo.png").convert("RGBA")
-            # Redimensionner le logo pour qu'il ne soit pas trop grand
-            gemini_logo.thumbnail((80, 80))
-        except IOError:
-            gemini_logo = None
-
-        # Définir les couleurs et messages en fonction de la qualité
-        if result_quality == "excellent":
-            accent_color = "#C8E546" # Vert citron
-            message, badge = "Analyse Exceptionnelle!", "🏆"
-        elif result_quality == "good":
-            accent_color = "#3B82F6" # Bleu vif
-            message, badge = "Résultats Impressionnants!", "⭐"
-        else:
-            accent_color = "#A855F7" # Violet
-            message, badge = "Analyse Terminée!", "📈"
+# --- Stockage des images de la session
+def asset_store():
+    return get_asset_store(max_bytes=ASSET_STORE_MAX_BYTES, spill_dir=ASSET_SPILL_DIR,
+                           max_disk_bytes=ASSET_SPILL_MAX_BYTES)
 
-        # Charger les polices DejaVuSans
-        try:
-            font_path, bold_font_path = setup_fonts()
-            if not font_path or not bold_font_path:
-                raise IOError("Polices DejaVuSans non trouvées.")
-            font_large = ImageFont.truetype(bold_font_path, 42)
-            font_medium = ImageFont.truetype(font_path, 22)
-            font_small = ImageFont.truetype(font_path, 18)
-        except IOError:
-            font_large = ImageFont.load_default()
-            font_medium = ImageFont.load_default()
-            font_small = ImageFont.load_default()
-
-        # Placer le logo Gemini
-        if gemini_logo:
-            img.paste(gemini_logo, (width - gemini_logo.width - 40, 40), gemini_logo)
-
-        # Dessiner une barre décorative
-        draw.rectangle([(40, 80), (45, height - 80)], fill=accent_color)
-
-        # Dessiner le message principal
-        draw.text((60, 100), message, font=font_large, fill="#FFFFFF")
-
-        # Dessiner le message secondaire
-        sub_message = "Votre stratégie marketing est prête !"
-        draw.text((60, 160), sub_message, font=font_medium, fill="#E5E7EB")
-
-        # Ajouter des "particules" qui ressemblent à des étoiles ou des données
-        for _ in range(100):
-            x_pos = random.randint(0, width)
-            y_pos = random.randint(0, height)
-            size = random.uniform(0.5, 2.5)
-            # Couleurs dans les tons de l'accent et du blanc
-            r, g, b = int(accent_color[1:3], 16), int(accent_color[3:5], 16), int(accent_color[5:7], 16)
-            particle_color = (
-                random.randint(min(r, 255), 255),
-                random.randint(min(g, 255), 255),
-                random.randint(min(b, 255), 255)
-            )
-            draw.ellipse([x_pos, y_pos, x_pos + size, y_pos + size], fill=particle_color)
+def current_session_id():
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else "local"
 
-        # Ajouter le badge emoji et le texte de qualité
-        try:
-            draw.text((60, height - 120), f"Qualité des résultats : {result_quality.capitalize()} {badge}", font=font_small, fill=accent_color)
-        except:
-            pass
-            
-        # Ajouter un petit logo texte "Powered by Gemini"
-        draw.text((width - 180, height - 40), "Powered by Gemini", font=font_small, fill="#AAAAAA")
+def encode_png(image):
+    buffer = BytesIO()
+    image.save(buffer, "PNG")
+    return buffer.getvalue()
+
+def image_renditions():
+    return get_image_renditions(store=asset_store(), renditions=IMAGE_RENDITIONS)
 
+def store_asset(data, mime=None):
+    """
+    Enregistre l'image d'origine pour la session courante et retourne son
+    identifiant ; ses déclinaisons (IMAGE_RENDITIONS) sont calculées en arrière-plan.
+    """
+    if not data:
+        return None
+    return image_renditions().put(current_session_id(), data, mime)
+
+def load_asset(asset_id):
+    """Octets de l'image d'origine (téléchargement)."""
+    return asset_store().get(current_session_id(), asset_id)
 
-        # Sauvegarder l'image
-        celebration_path = "images/celebration.png"
-        img.save(celebration_path, "PNG")
-        return celebration_path
+def load_image(asset_id, rendition="display"):
+    """Octets de la déclinaison adaptée à l'emplacement : "display", "thumbnail" ou "pdf"."""
+    if not asset_id:
+        return None
+    return image_renditions().get(current_session_id(), asset_id, rendition, timeout=RENDITION_WAIT_SECONDS)
+
+def original_download_button(asset_id, name, key):
+    """Téléchargement de l'image telle que produite ; ne relance pas le script."""
+    data = load_asset(asset_id)
+    if data:
+        mime = asset_store().mime(asset_id) or "image/png"
+        st.download_button("⬇️ Télécharger l'original", data=data, file_name=f"{name}.{EXTENSIONS.get(mime, 'png')}",
+                           mime=mime, key=key, on_click="ignore")
+
+# --- Fichiers statiques
+def static_assets():
+    return get_static_assets(revalidate_after=STATIC_REVALIDATE_SECONDS)
+
+def static_image(path, width, placeholder=None):
+    """Octets de l'image pré-encodée pour une largeur d'affichage donnée (None si absente)."""
+    return static_assets().image(path, max_width=width * DISPLAY_SCALE, placeholder=placeholder)
+
+def logo_placeholder():
+    """Logo de remplacement, généré une seule fois par le registre si le fichier manque."""
+    from PIL import Image, ImageDraw, ImageFont
+    img = Image.new('RGB', (600, 300), color=(73, 109, 137))
+    draw = ImageDraw.Draw(img)
+    draw.text((150, 140), "Gemini Marketing", fill=(255, 255, 255), font=ImageFont.load_default())
+    return img
+
+# --- Image de célébration (rendu pré-calculé par niveau de qualité)
+CELEBRATION_SIZE = (800, 400)
+CELEBRATION_BACKGROUND = (26, 28, 40)  # Un bleu nuit profond
+CELEBRATION_GRID_COLOR = (40, 42, 58)
+CELEBRATION_TIERS = {
+    "excellent": ("#C8E546", "Analyse Exceptionnelle!", "🏆"),  # Vert citron
+    "good": ("#3B82F6", "Résultats Impressionnants!", "⭐"),      # Bleu vif
+    "normal": ("#A855F7", "Analyse Terminée!", "📈"),             # Violet
+}
+
+def hex_to_rgb(color):
+    return tuple(int(color[i:i + 2], 16) for i in (1, 3, 5))
+
+@st.cache_resource(max_entries=1, show_spinner=False)
+def load_celebration_fonts():
+    """Charge une seule fois par processus les polices DejaVuSans (ou la police par défaut)."""
+    from PIL import ImageFont
+    try:
+        font_path, bold_font_path = setup_fonts()
+        if not font_path or not bold_font_path:
+            raise IOError("Polices DejaVuSans non trouvées.")
+        return (ImageFont.truetype(bold_font_path, 42),
+                ImageFont.truetype(font_path, 22),
+                ImageFont.truetype(font_path, 18))
+    except IOError:
+        default = ImageFont.load_default()
+        return default, default, default
+
+@st.cache_resource(max_entries=1, show_spinner=False)
+def load_gemini_logo_thumbnail(size=(80, 80)):
+    from PIL import Image
+    try:
+        logo = Image.open(LOGO_PATH).convert("RGBA")
+        logo.thumbnail(size)
+        return logo
+    except IOError:
+        return None
 
+@st.cache_resource(max_entries=len(CELEBRATION_TIERS), show_spinner=False)
+def _celebration_base_layer(result_quality):
+    """Fond, grille, logo et messages d'un niveau de qualité, sous forme de tableau NumPy."""
+    import numpy as np
+    from PIL import Image, ImageDraw
+    width, height = CELEBRATION_SIZE
+    accent_color, message, _ = CELEBRATION_TIERS[result_quality]
+
+    # Grille subtile : une ligne toutes les 40 px, composée directement dans le tableau
+    canvas = np.empty((height, width, 3), dtype=np.uint8)
+    canvas[:] = CELEBRATION_BACKGROUND
+    canvas[:, ::40] = CELEBRATION_GRID_COLOR
+    canvas[::40, :] = CELEBRATION_GRID_COLOR
+
+    img = Image.fromarray(canvas, "RGB")
+    draw = ImageDraw.Draw(img)
+    font_large, font_medium, _ = load_celebration_fonts()
+
+    gemini_logo = load_gemini_logo_thumbnail()
+    if gemini_logo:
+        img.paste(gemini_logo, (width - gemini_logo.width - 40, 40), gemini_logo)
+
+    # Barre décorative, message principal et message secondaire
+    draw.rectangle([(40, 80), (45, height - 80)], fill=accent_color)
+    draw.text((60, 100), message, font=font_large, fill="#FFFFFF")
+    draw.text((60, 160), "Votre stratégie marketing est prête !", font=font_medium, fill="#E5E7EB")
+
+    layer = np.asarray(img)
+    layer.setflags(write=False)
+    return layer
+
+def _apply_particles(canvas, accent_color, rng, count=100):
+    """Dessine en une passe vectorisée des « particules » de 1 à 3 px dans les tons de l'accent."""
+    import numpy as np
+    height, width, _ = canvas.shape
+    xs = rng.integers(0, width, count)
+    ys = rng.integers(0, height, count)
+    sizes = np.ceil(rng.uniform(0.5, 2.5, count)).astype(np.int64)
+    low = np.array(hex_to_rgb(accent_color))
+    colors = rng.integers(low, 256, size=(count, 3)).astype(np.uint8)
+
+    for dy in range(3):
+        for dx in range(3):
+            mask = (dx < sizes) & (dy < sizes) & (xs + dx < width) & (ys + dy < height)
+            canvas[ys[mask] + dy, xs[mask] + dx] = colors[mask]
+    return canvas
+
+@st.cache_resource(max_entries=32, show_spinner=False)
+def render_celebration_png(result_quality, seed):
+    """Rendu complet d'un niveau de qualité pour une graine donnée, encodé en PNG."""
+    import numpy as np
+    from PIL import Image, ImageDraw
+    width, height = CELEBRATION_SIZE
+    accent_color, _, badge = CELEBRATION_TIERS[result_quality]
+    _, _, font_small = load_celebration_fonts()
+
+    canvas = _apply_particles(_celebration_base_layer(result_quality).copy(), accent_color,
+                              np.random.default_rng(seed))
+    img = Image.fromarray(canvas, "RGB")
+    draw = ImageDraw.Draw(img)
+    try:
+        draw.text((60, height - 120), f"Qualité des résultats : {result_quality.capitalize()} {badge}",
+                  font=font_small, fill=accent_color)
+    except Exception:
+        pass
+    draw.text((width - 180, height - 40), "Powered by Gemini", font=font_small, fill="#AAAAAA")
+
+    return encode_png(img)
+
+def generate_celebration_image(result_quality, seed=None):
+    """
+    Retourne l'image de célébration en octets PNG. Sans graine, chaque niveau
+    de qualité n'est rendu qu'une fois par processus.
+    """
+    tier = result_quality if result_quality in CELEBRATION_TIERS else "normal"
+    if seed is None:
+        seed = list(CELEBRATION_TIERS).index(tier)
+    try:
+        return render_celebration_png(tier, seed)
     except Exception as e:
         st.warning(f"Impossible de créer l'image de célébration améliorée: {e}")
         # Retourner une image de secours simple
         try:
-            img = Image.new('RGB', (800, 400), (26, 28, 40))
+            from PIL import Image, ImageDraw
+            img = Image.new('RGB', CELEBRATION_SIZE, CELEBRATION_BACKGROUND)
             draw = ImageDraw.Draw(img)
             draw.text((50, 180), "Analyse terminée!", fill="white")
-            fallback_path = "images/celebration.png"
-            img.save(fallback_path, "PNG")
-            return fallback_path
-        except:
+            return encode_png(img)
+        except Exception:
             return None
 
+# --- Bannière de synthèse locale (rendu déterministe à partir des KPIs)
+BANNER_SIZE = (1200, 400)
+BANNER_SLOGAN = "La data au service de votre croissance."
+# fond, panneaux, accent (valeurs et icônes), titre, libellés
+DEFAULT_BANNER_THEME = {"background": "#F9FAFB", "panel": SECONDARY_COLOR, "accent": PRIMARY_COLOR,
+                        "title": SECONDARY_COLOR, "label": "#E5E7EB"}
+BANNER_THEMES = {
+    "Technologie": {"background": "#0B1020", "panel": "#111A3A", "accent": "#22D3EE",
+                    "title": "#E0F2FE", "label": "#93C5FD"},
+    "Restauration": {"background": "#FFF7ED", "panel": "#9A3412", "accent": "#FDBA74",
+                     "title": "#7C2D12", "label": "#FFEDD5"},
+    "Mode": {"background": "#FAFAF9", "panel": "#18181B", "accent": "#F5D0FE",
+             "title": "#18181B", "label": "#D4D4D8"},
+    "Santé & Bien-être": {"background": "#F0FDF4", "panel": "#166534", "accent": "#BBF7D0",
+                          "title": "#14532D", "label": "#DCFCE7"},
+    "Finance": {"background": "#F8FAFC", "panel": "#0F172A", "accent": "#FACC15",
+                "title": "#0F172A", "label": "#CBD5E1"},
+    "Tourisme": {"background": "#ECFEFF", "panel": "#0E7490", "accent": "#FDE68A",
+                 "title": "#164E63", "label": "#CFFAFE"},
+}
+
+@st.cache_resource(max_entries=16, show_spinner=False)
+def load_font(size, bold=False):
+    from PIL import ImageFont
+    font_path, bold_font_path = setup_fonts()
+    path = bold_font_path if bold else font_path
+    if not path:
+        return ImageFont.load_default()
+    return ImageFont.truetype(path, size)
+
+def _fit_font(draw, text, max_width, size, bold=True, min_size=20):
+    """Plus grande police (≤ size) pour laquelle le texte tient dans max_width."""
+    while size > min_size and draw.textlength(text, font=load_font(size, bold)) > max_width:
+        size -= 2
+    return load_font(size, bold)
+
+def _draw_growth_icon(draw, box, color):
+    # Histogramme croissant surmonté d'une flèche
+    x0, y0, x1, y1 = box
+    bar_width = (x1 - x0) // 5
+    for i, ratio in enumerate((0.35, 0.6, 0.85)):
+        left = x0 + i * (bar_width + bar_width // 2)
+        draw.rounded_rectangle([left, y1 - (y1 - y0) * ratio, left + bar_width, y1], radius=4, fill=color)
+    draw.line([(x0, y0 + (y1 - y0) * 0.45), (x1 - 8, y0 + 6)], fill=color, width=6)
+    draw.polygon([(x1, y0), (x1 - 26, y0 + 4), (x1 - 6, y0 + 24)], fill=color)
+
+def _draw_target_icon(draw, box, color, background):
+    # Cible : anneaux concentriques alternés
+    x0, y0, x1, y1 = box
+    cx, cy = (x0 + x1) / 2, (y0 + y1) / 2
+    radius = min(x1 - x0, y1 - y0) / 2
+    for i, fill in enumerate((color, background, color, background, color)):
+        r = radius * (1 - i * 0.2)
+        draw.ellipse([cx - r, cy - r, cx + r, cy + r], fill=fill)
+
+@st.cache_resource(max_entries=64, show_spinner=False)
+def render_summary_banner_png(roi_text, cpa_text, domain):
+    """Bannière 1200x400 « Synthèse des Résultats » : deux KPIs, deux icônes, thème du secteur."""
+    from PIL import Image, ImageDraw
+    theme = BANNER_THEMES.get(domain, DEFAULT_BANNER_THEME)
+    width, height = BANNER_SIZE
+    img = Image.new("RGB", BANNER_SIZE, theme["background"])
+    draw = ImageDraw.Draw(img)
+
+    # Titre, secteur et barre d'accent
+    draw.rectangle([(0, 0), (width, 10)], fill=theme["accent"])
+    draw.text((50, 38), "Synthèse des Résultats", font=load_font(40, bold=True), fill=theme["title"])
+    if domain:
+        draw.text((width - 50, 50), domain, font=load_font(22), fill=theme["title"], anchor="ra")
+
+    # Deux panneaux : ROI à gauche, CPA à droite
+    panel_width, panel_top, panel_bottom = 530, 115, 325
+    for index, (label, value, icon) in enumerate((("ROI estimé", roi_text, "growth"),
+                                                   ("CPA moyen", cpa_text, "target"))):
+        left = 50 + index * (panel_width + 40)
+        draw.rounded_rectangle([left, panel_top, left + panel_width, panel_bottom], radius=24, fill=theme["panel"])
+        icon_box = (left + 35, panel_top + 55, left + 135, panel_top + 155)
+        if icon == "growth":
+            _draw_growth_icon(draw, icon_box, theme["accent"])
+        else:
+            _draw_target_icon(draw, icon_box, theme["accent"], theme["panel"])
+        text_left = left + 170
+        draw.text((text_left, panel_top + 45), label, font=load_font(26), fill=theme["label"])
+        value_font = _fit_font(draw, value, left + panel_width - 30 - text_left, 60)
+        draw.text((text_left, panel_top + 90), value, font=value_font, fill=theme["accent"])
+
+    draw.text((width / 2, height - 40), BANNER_SLOGAN, font=load_font(20), fill=theme["title"], anchor="mm")
+    return encode_png(img)
+
+def generate_summary_banner_local(kpis, domain):
+    """Bannière de synthèse rendue localement en quelques millisecondes (None si les KPIs manquent)."""
+    if not kpis:
+        st.warning("KPIs introuvables dans l'analyse : la bannière de synthèse n'a pas été générée.")
+        return None
+    try:
+        return render_summary_banner_png(format_roi(kpis), f"{kpis['cpa']:g} €", domain)
+    except Exception as e:
+        st.warning(f"Impossible de créer la bannière de synthèse : {e}")
+        return None
+
 # --- Page d'accueil Premium
 def display_welcome_page():
     col1, col2 = st.columns([1, 2])
     with col1:
-        # Créer le dossier images s'il n'existe pas
-        images_dir = Path("images")
-        images_dir.mkdir(exist_ok=True)
-        
-        logo_path = "images/google_ai_gemini_logo.png"
-        
-        # Vérifier si l'image existe, sinon la créer
-        if not Path(logo_path).exists():
-            try:
-                # Créer une image de remplacement valide
-                img = Image.new('RGB', (600, 300), color=(73, 109, 137))
-                # Ajouter du texte pour en faire une image valide
-                draw = ImageDraw.Draw(img)
-                # Utiliser une police par défaut
-                try:
-                    font = ImageFont.load_default()
-                    draw.text((150, 140), "Gemini Marketing", fill=(255, 255, 255), font=font)
-                except:
-                    draw.text((150, 140), "Gemini Marketing", fill=(255, 255, 255))
-                img.save(logo_path, "PNG")
-            except Exception as e:
-                st.warning(f"Impossible de créer l'image de logo: {e}")
-        
-        # Charger et afficher l'image
+        logo = static_image(LOGO_PATH, 250, placeholder=logo_placeholder)
         try:
-            st.image(logo_path, width=250)
+            st.image(logo, width=250)
         except Exception as e:
             st.warning(f"Impossible de charger l'image: {e}")
             # Option de secours: afficher un placeholder
@@ -270,32 +512,292 @@ def display_welcome_page():
     st.markdown("Voici un aperçu de l'interface et de ses capacités : ")
 
 # --- Initialisation Gemini
+def secret(name, default=None):
+    try:
+        return st.secrets[name] if name in st.secrets else default
+    except Exception:
+        return default
+
+def _plain(value):
+    # Les sections des secrets sont des AttrDict imbriqués : les convertir en dict simples
+    if hasattr(value, "items"):
+        return {k: _plain(v) for k, v in value.items()}
+    return value
+
+def configure_gemini_backend():
+    """Applique le backend choisi (secrets prioritaires sur les constantes) et retourne son nom."""
+    name = secret("GEMINI_BACKEND", GEMINI_BACKEND)
+    options = {**GEMINI_STANDIN_OPTIONS, **_plain(secret("gemini_standin", {}))}
+    gemini_clients.set_backend(name, secret("GEMINI_CASSETTE", GEMINI_CASSETTE_PATH), **options)
+    return name
+
+def api_key_required():
+    return gemini_clients.backend_name() not in gemini_clients.LOCAL_BACKENDS
+
 def initialize_gemini(selected_model):
     try:
-        # Vérifier si l'API key est disponible
-        if "GEMINI_API_KEY" not in st.secrets:
+        # Vérifier si l'API key est disponible (inutile pour le simulateur et le rejeu)
+        api_key = secret("GEMINI_API_KEY")
+        if api_key is None and api_key_required():
             st.error("Clé API Gemini non trouvée dans les secrets Streamlit")
             return None
             
-        genai.configure(api_key=st.secrets["GEMINI_API_KEY"])
-        model = genai.GenerativeModel(
-            model_name=selected_model,
-            generation_config={"temperature": 0.7, "top_p": 1}
-        )
-        return model
+        # Clients partagés entre reruns et sessions : pas de nouvelle connexion à chaque clic
+        gemini_clients.configure(api_key, GEMINI_TRANSPORT)
+        return gemini_clients.get_model(selected_model, GENERATION_CONFIG)
     except Exception as e:
         st.error(f"❌ Erreur Gemini : {str(e)}")
         return None
 
+# --- Affichage en streaming des réponses
+class StreamWriter:
+    """
+    Affiche le texte au fil de l'eau dans un placeholder Streamlit et mesure
+    le délai avant le premier token (ttft) et la durée totale de la réponse.
+    """
+
+    def __init__(self, title=None, placeholder=None, min_interval=0.1):
+        self.title = title
+        self.placeholder = placeholder
+        self.min_interval = min_interval
+        self.text = ""
+        self.ttft = None
+        self.total = None
+        self._start = None
+        self._last_render = 0.0
+
+    def start(self):
+        self._start = time.perf_counter()
+
+    def write(self, chunk):
+        if not chunk:
+            return
+        if self.ttft is None:
+            self.ttft = time.perf_counter() - self._start
+        self.text += chunk
+        # Limiter la fréquence des mises à jour envoyées au navigateur
+        now = time.perf_counter()
+        if now - self._last_render >= self.min_interval:
+            self._render(cursor=True)
+            self._last_render = now
+
+    def finish(self):
+        self.total = time.perf_counter() - self._start
+        self._render()
+
+    def _render(self, cursor=False):
+        if self.placeholder is None:
+            return
+        header = f"**{self.title}**\n\n" if self.title else ""
+        self.placeholder.markdown(header + self.text + (" ▌" if cursor else ""))
+
+# --- Appels Gemini (quotas, file d'attente équitable, nouvelles tentatives)
+_call_feedback = threading.local()
+
+def scheduler():
+    return get_scheduler(limits=GEMINI_RATE_LIMITS, default_limits=GEMINI_DEFAULT_RATE_LIMIT,
+                         max_retries=GEMINI_MAX_RETRIES)
+
+def tracer():
+    return tracing.get_tracer(log_path=TRACE_LOG_PATH, metrics_path=METRICS_PATH)
+
+def model_name_of(model):
+    return getattr(model, "model_name", type(model).__name__)
+
+def call_gemini(model, prompt, **kwargs):
+    """
+    generate_content via l'ordonnanceur partagé. Les attentes (file ou backoff
+    après un 429) sont signalées au callback `on_wait` de l'étape en cours.
+    """
+    estimated_tokens = len(prompt) // 4 + DEFAULT_OUTPUT_TOKENS
+    feedback = getattr(_call_feedback, "on_wait", None)
+
+    def on_wait(position, delay, attempt):
+        if attempt:
+            tracing.record_retry()
+        if feedback is not None:
+            feedback(position, delay, attempt)
+
+    try:
+        response = scheduler().call(
+            current_session_id(),
+            model_name_of(model),
+            lambda: model.generate_content(prompt, **kwargs),
+            estimated_tokens,
+            on_wait=on_wait
+        )
+    except Exception as e:
+        tracing.record_error(e)
+        raise
+    if not kwargs.get("stream"):
+        tracing.record_usage(response)
+    return response
+
 # --- Fonctions Marketing Avancées
-def generate_prediction(model, params, style="Formel", lang="Français", domain="Général"):
-    style_prompts = {
-        "Formel": "Ton professionnel et technique avec des termes marketing précis.",
-        "Dynamique": "Ton énergique avec des verbes d'action et des phrases courtes.",
-        "Humour": "Ton décontracté avec des touches d'humour adapté au monde professionnel."
-    }
+def text_cache_key(model, prompt, generation_config=None):
+    namespace = json.dumps(generation_config, sort_keys=True) if generation_config else "text"
+    return make_cache_key(model_name_of(model), prompt, namespace)
 
-    prompt = f"""
+def generate_text(model, prompt, use_cache=True, stream=None, generation_config=None, store=True):
+    """
+    Appelle le modèle en passant par le cache de réponses (mémoire + disque).
+    Avec use_cache=False, le cache est ignoré en lecture mais rafraîchi avec la nouvelle réponse
+    (sauf avec store=False : l'appelant met lui-même en cache ce qu'il en tire).
+    Si un StreamWriter est fourni, la réponse est demandée en streaming et affichée au fil de l'eau.
+    """
+    cache = get_response_cache()
+    model_name = model_name_of(model)
+    extra = {"generation_config": generation_config} if generation_config else {}
+    key = text_cache_key(model, prompt, generation_config)
+    if stream is not None:
+        stream.start()
+    if use_cache:
+        cached = cache.get(key)
+        tracing.annotate(cache_hit=cached is not None)
+        if cached is not None:
+            if stream is not None:
+                stream.write(cached)
+                stream.finish()
+            return cached
+
+    if stream is None:
+        text = call_gemini(model, prompt, **extra).text
+    else:
+        chunk = None
+        for chunk in call_gemini(model, prompt, stream=True, **extra):
+            try:
+                stream.write(chunk.text)
+            except ValueError:
+                # Morceau sans texte (ex. métadonnées de sécurité) : on l'ignore
+                continue
+        # En streaming, le dernier morceau porte le décompte de tokens de toute la réponse
+        tracing.record_usage(chunk)
+        stream.finish()
+        text = stream.text
+    if store:
+        cache.set(key, text, model_name=model_name)
+    return text
+
+# --- Sortie structurée (JSON) de la prédiction
+PREDICTION_RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "analysis_markdown": {"type": "string"},
+        "roi_min": {"type": "number"},
+        "roi_max": {"type": "number"},
+        "cpa": {"type": "number"},
+        "channels": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "name": {"type": "string"},
+                    "budget_share": {"type": "number"}
+                },
+                "required": ["name", "budget_share"]
+            }
+        },
+        "strategies": {"type": "array", "items": {"type": "string"}}
+    },
+    "required": ["analysis_markdown", "roi_min", "roi_max", "cpa", "channels", "strategies"]
+}
+STRUCTURED_PREDICTION_CONFIG = {
+    "response_mime_type": "application/json",
+    "response_schema": PREDICTION_RESPONSE_SCHEMA,
+}
+
+def _to_number(value, field):
+    if isinstance(value, str):
+        value = value.replace(",", ".").replace("%", "").replace("€", "").strip()
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Valeur numérique invalide pour '{field}': {value!r}")
+
+def validate_kpis(data):
+    """Vérifie et normalise les KPIs (ROI en %, CPA en €, parts de budget en %)."""
+    roi_min = _to_number(data.get("roi_min"), "roi_min")
+    roi_max = _to_number(data.get("roi_max", roi_min), "roi_max")
+    if roi_min > roi_max:
+        roi_min, roi_max = roi_max, roi_min
+    cpa = _to_number(data.get("cpa"), "cpa")
+    if cpa < 0:
+        raise ValueError(f"CPA négatif : {cpa}")
+
+    channels = []
+    for channel in data.get("channels") or []:
+        name = str(channel.get("name", "")).strip()
+        if not name:
+            continue
+        share = _to_number(channel.get("budget_share", 0), "budget_share")
+        channels.append({"name": name, "budget_share": min(max(share, 0.0), 100.0)})
+
+    strategies = [str(item).strip() for item in data.get("strategies") or [] if str(item).strip()]
+    return {"roi_min": roi_min, "roi_max": roi_max, "cpa": cpa,
+            "channels": channels, "strategies": strategies}
+
+def parse_structured_prediction(raw):
+    """Décode la réponse JSON du modèle : retourne (analyse markdown, KPIs validés)."""
+    try:
+        data = json.loads(raw)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Réponse JSON invalide : {e}")
+    if not isinstance(data, dict) or not str(data.get("analysis_markdown", "")).strip():
+        raise ValueError("Le champ 'analysis_markdown' est manquant")
+    kpis = validate_kpis(data)
+    kpis["source"] = "json"
+    return data["analysis_markdown"], kpis
+
+_NUMBER = r"(-?\d+(?:[.,]\d+)?)"
+
+def extract_kpis_from_text(text):
+    """
+    Extraction locale des KPIs depuis l'analyse en markdown (format
+    « ROI estimé: X% à Y% », « CPA moyen: Z € », « Canal (X% du budget) »).
+    Retourne None si le ROI ou le CPA est introuvable.
+    """
+    roi = re.search(r"ROI[^:\n]*:\s*\**\s*" + _NUMBER + r"\s*%?\s*(?:à|-|–|to)\s*" + _NUMBER, text, re.IGNORECASE)
+    roi_single = roi or re.search(r"ROI[^:\n]*:\s*\**\s*" + _NUMBER, text, re.IGNORECASE)
+    cpa = re.search(r"CPA[^:\n]*:\s*\**\s*" + _NUMBER, text, re.IGNORECASE)
+    if not roi_single or not cpa:
+        return None
+
+    channels = [
+        {"name": name.strip(" *"), "budget_share": share}
+        for name, share in re.findall(r"^\s*[-*]\s*(.+?)\s*\(\s*" + _NUMBER + r"\s*%", text, re.MULTILINE)
+    ]
+    strategies = []
+    section = re.search(r"###\s*Strat[ée]g\w*[^\n]*\n(.*?)(?:\n###|\Z)", text, re.IGNORECASE | re.DOTALL)
+    if section:
+        strategies = re.findall(r"^\s*\d+\.\s*(.+)$", section.group(1), re.MULTILINE)
+
+    try:
+        kpis = validate_kpis({
+            "roi_min": roi.group(1) if roi else roi_single.group(1),
+            "roi_max": roi.group(2) if roi else roi_single.group(1),
+            "cpa": cpa.group(1),
+            "channels": channels,
+            "strategies": strategies,
+        })
+    except ValueError:
+        return None
+    kpis["source"] = "texte"
+    return kpis
+
+def format_roi(kpis):
+    if kpis["roi_min"] == kpis["roi_max"]:
+        return f"{kpis['roi_min']:g} %"
+    return f"{kpis['roi_min']:g} % à {kpis['roi_max']:g} %"
+
+STYLE_PROMPTS = {
+    "Formel": "Ton professionnel et technique avec des termes marketing précis.",
+    "Dynamique": "Ton énergique avec des verbes d'action et des phrases courtes.",
+    "Humour": "Ton décontracté avec des touches d'humour adapté au monde professionnel."
+}
+
+def _prediction_brief(params, domain):
+    """Rôle, paramètres, instructions et format de réponse, communs à tous les styles et langues."""
+    return f"""
     [ROLE] Vous êtes un expert en marketing digital avec 15 ans d'expérience spécialisé en {domain}.
     [CONTEXTE] Analyse de campagne marketing pour un client.
 
@@ -327,13 +829,27 @@ def generate_prediction(model, params, style="Formel", lang="Français", domain=
     - Canal 1 (X% du budget)
     - Canal 2 (Y% du budget)
 
-    [STYLE] {style_prompts.get(style)}
+"""
+
+def build_prediction_prompt(params, style="Formel", lang="Français", domain="Général", structured=False):
+    prompt = _prediction_brief(params, domain) + f"""    [STYLE] {STYLE_PROMPTS.get(style)}
     [LANGUE] {lang}
     """
+    if structured:
+        prompt += """
+    [SORTIE STRUCTURÉE] Répondez uniquement en JSON :
+    - "analysis_markdown" : l'analyse complète au format de réponse ci-dessus
+    - "roi_min" / "roi_max" : ROI estimé en pourcentage (nombres)
+    - "cpa" : CPA moyen en euros (nombre)
+    - "channels" : canaux prioritaires avec "name" et "budget_share" (pourcentage du budget)
+    - "strategies" : les 3 stratégies recommandées (phrases courtes)
+    """
+    return prompt
 
+def _request_prediction(model, prompt, use_cache=True, stream=None, generation_config=None, store=True):
+    from google.api_core import exceptions as google_exceptions
     try:
-        response = model.generate_content(prompt)
-        return response.text
+        return generate_text(model, prompt, use_cache, stream, generation_config, store)
     except google_exceptions.ResourceExhausted:
         st.error("🚦 Erreur de quota (429) : Vous avez dépassé votre nombre de requêtes par minute. Veuillez patienter un peu avant de réessayer.")
         return None
@@ -341,7 +857,175 @@ def generate_prediction(model, params, style="Formel", lang="Français", domain=
         st.error(f"Erreur génération : {str(e)}")
         return None
 
-def generate_premium_insights(model, params, domain):
+def generate_prediction(model, params, style="Formel", lang="Français", domain="Général", use_cache=True,
+                        stream=None):
+    prompt = build_prediction_prompt(params, style, lang, domain)
+    return _request_prediction(model, prompt, use_cache, stream)
+
+# --- Variantes de style et de langue (un seul appel pour plusieurs rendus)
+VARIANT_HEADER = re.compile(r"^[ \t#*]*=+\s*VARIANTE\s+(\d+)\s*=+[^\n]*$", re.MULTILINE | re.IGNORECASE)
+
+def build_variants_prompt(params, variants, domain="Général"):
+    """Même analyse, rédigée dans chaque (style, langue) de `variants`, en sections numérotées."""
+    renditions = "\n".join(f"    {i}. [STYLE] {STYLE_PROMPTS.get(style)} [LANGUE] {lang}"
+                            for i, (style, lang) in enumerate(variants, 1))
+    return _prediction_brief(params, domain) + f"""    [VARIANTES] Rédigez {len(variants)} versions complètes de la même analyse (mêmes chiffres),
+    dans cet ordre :
+{renditions}
+    Faites précéder chaque version d'une ligne « === VARIANTE n === » (n = numéro de la version),
+    sans autre texte avant la première.
+    """
+
+def split_variants(text, count):
+    """Découpe une réponse sectionnée : liste de `count` textes (None pour une section absente ou vide)."""
+    sections = [None] * count
+    headers = list(VARIANT_HEADER.finditer(text))
+    for header, following in zip(headers, headers[1:] + [None]):
+        index = int(header.group(1)) - 1
+        body = text[header.end():following.start() if following else len(text)].strip()
+        if 0 <= index < count and body and sections[index] is None:
+            sections[index] = body
+    return sections
+
+def generate_prediction_variants(model, params, variants, domain="Général", use_cache=True, stream=None):
+    """
+    Rendus (style, langue) de la même analyse : {(style, langue): texte}.
+    Chaque variante est mise en cache sous la clé de la prédiction simple
+    correspondante ; seules les variantes absentes du cache sont demandées,
+    en un seul appel. Une variante introuvable dans la réponse est omise.
+    """
+    cache = get_response_cache()
+    keys = {variant: text_cache_key(model, build_prediction_prompt(params, *variant, domain))
+            for variant in variants}
+    texts = {}
+    if use_cache:
+        for variant, key in keys.items():
+            cached = cache.get(key)
+            if cached is not None:
+                texts[variant] = cached
+    missing = [variant for variant in variants if variant not in texts]
+    tracing.annotate(variants=len(variants), cached_variants=len(texts))
+
+    if len(missing) == 1:
+        text = generate_prediction(model, params, *missing[0], domain, use_cache=False, stream=stream)
+        if text:
+            texts[missing[0]] = text
+    elif missing:
+        raw = _request_prediction(model, build_variants_prompt(params, missing, domain), use_cache=False,
+                                  stream=stream, store=False)
+        sections = split_variants(raw, len(missing)) if raw else []
+        for variant, section in zip(missing, sections):
+            if section:
+                texts[variant] = section
+                cache.set(keys[variant], section, model_name=model_name_of(model))
+        lost = [f"{style} · {lang}" for style, lang in missing if (style, lang) not in texts]
+        if raw and lost:
+            st.warning(f"Variantes absentes de la réponse : {', '.join(lost)}")
+    return {variant: texts[variant] for variant in variants if variant in texts}
+
+# --- Réutilisation d'une analyse voisine (même tranche de paramètres)
+_AMOUNT = re.compile(r"(?<![\d.,])(\d{1,3}(?:[ \u00a0\u202f.,]\d{3})+|\d+)([.,]\d{1,2})?(?!\d)"
+                     r"(\s*(?:€|EUR\b|euros?\b))", re.IGNORECASE)
+_UNIT_COST = re.compile(r"\bCP[ACLMV]\b|co[uû]t par|par (?:clic|conversion|lead|client|vente)", re.IGNORECASE)
+
+def _scale_amount(match, ratio):
+    # Même présentation que le montant d'origine : séparateur de milliers et nombre de décimales
+    integer, fraction, unit = match.groups()
+    separator = re.search(r"\D", integer)
+    value = (int(re.sub(r"\D", "", integer)) + (float("0." + fraction[1:]) if fraction else 0)) * ratio
+    if fraction:
+        whole, _, digits = f"{value:.{len(fraction) - 1}f}".partition(".")
+    else:
+        whole, digits = str(round(value)), ""
+    if separator:
+        whole = f"{int(whole):,}".replace(",", separator.group())
+    return whole + (fraction[0] + digits if fraction else "") + unit
+
+def rescale_budget_figures(text, ratio):
+    """Montants en euros multipliés par `ratio`, sauf les coûts unitaires (CPA, CPC, coût par clic…)."""
+    return "\n".join(line if _UNIT_COST.search(line) else _AMOUNT.sub(lambda m: _scale_amount(m, ratio), line)
+                     for line in text.split("\n"))
+
+def neighbor_cache():
+    return get_neighbor_cache(bands=NEIGHBOR_BANDS)
+
+def _neighbor_context(style, lang, domain, structured):
+    return {"style": style, "lang": lang, "domain": domain, "structured": structured}
+
+def reuse_neighbor_prediction(model, params, style, lang, domain, structured, stream=None):
+    """
+    Analyse d'une campagne de la même tranche, budget ajusté : {"text", "kpis",
+    "reused_from"}. None si la prédiction exacte est en cache (elle est alors
+    servie telle quelle) ou si la tranche est vide.
+    """
+    config = STRUCTURED_PREDICTION_CONFIG if structured else None
+    prompt = build_prediction_prompt(params, style, lang, domain, structured)
+    if get_response_cache().get(text_cache_key(model, prompt, config), count_stats=False) is not None:
+        return None
+    entry = neighbor_cache().get(model_name_of(model), params, _neighbor_context(style, lang, domain, structured))
+    tracing.annotate(neighbor_hit=entry is not None)
+    if entry is None:
+        return None
+
+    source, stored = entry["params"], entry["value"]
+    text = rescale_budget_figures(stored["text"], params["budget"] / source["budget"])
+    if stream is not None:
+        stream.start()
+        stream.write(text)
+        stream.finish()
+    return {"text": text, "kpis": stored["kpis"], "reused_from": source if source != params else None}
+
+def remember_neighbor_prediction(model, params, style, lang, domain, structured, result):
+    neighbor_cache().set(model_name_of(model), params, {"text": result["text"], "kpis": result["kpis"]},
+                         _neighbor_context(style, lang, domain, structured))
+
+def generate_prediction_with_kpis(model, params, style="Formel", lang="Français", domain="Général",
+                                  use_cache=True, stream=None, structured=False, variants=None):
+    """
+    Retourne {"text": analyse markdown, "kpis": KPIs typés ou None}.
+    En mode structuré, le modèle répond en JSON (sans streaming) ; sinon les
+    KPIs sont extraits localement du markdown. Avec `variants` (autres couples
+    (style, langue)), la réponse contient aussi "variants" : [{"style", "lang",
+    "text"}], le rendu principal en premier ; les KPIs sont alors extraits du texte.
+    Avec le cache, une analyse de la même tranche de paramètres (NEIGHBOR_BANDS)
+    peut être réutilisée : "reused_from" indique alors les paramètres d'origine.
+    """
+    if variants:
+        wanted = [(style, lang)] + [v for v in variants if v != (style, lang)]
+        texts = generate_prediction_variants(model, params, wanted, domain, use_cache, stream)
+        if not texts:
+            return None
+        rendered = [{"style": v_style, "lang": v_lang, "text": texts[(v_style, v_lang)]}
+                    for v_style, v_lang in wanted if (v_style, v_lang) in texts]
+        text = rendered[0]["text"]
+        return {"text": text, "kpis": extract_kpis_from_text(text), "variants": rendered}
+
+    if use_cache and NEIGHBOR_BANDS:
+        reused = reuse_neighbor_prediction(model, params, style, lang, domain, structured,
+                                           None if structured else stream)
+        if reused is not None:
+            return reused
+
+    if not structured:
+        text = generate_prediction(model, params, style, lang, domain, use_cache, stream)
+        result = {"text": text, "kpis": extract_kpis_from_text(text)} if text else None
+    else:
+        prompt = build_prediction_prompt(params, style, lang, domain, structured=True)
+        raw = _request_prediction(model, prompt, use_cache, None, STRUCTURED_PREDICTION_CONFIG)
+        if raw is None:
+            return None
+        try:
+            text, kpis = parse_structured_prediction(raw)
+        except ValueError as e:
+            st.warning(f"Sortie structurée invalide, extraction depuis le texte : {e}")
+            text, kpis = raw, extract_kpis_from_text(raw)
+        result = {"text": text, "kpis": kpis}
+    if result is not None and NEIGHBOR_BANDS:
+        remember_neighbor_prediction(model, params, style, lang, domain, structured, result)
+    return result
+
+def generate_premium_insights(model, params, domain, use_cache=True, stream=None):
+    from google.api_core import exceptions as google_exceptions
     prompt = f"""
     [ROLE] Expert en analyse marketing premium
     [TACHE] Générer des insights exclusifs pour:
@@ -357,8 +1041,7 @@ def generate_premium_insights(model, params, domain):
     5. Checklist d'optimisation
     """
     try:
-        response = model.generate_content(prompt)
-        return response.text
+        return generate_text(model, prompt, use_cache, stream)
     except google_exceptions.ResourceExhausted:
         st.error("🚦 Erreur de quota (429) : Vous avez dépassé votre nombre de requêtes par minute pour les insights premium. Veuillez patienter.")
         return None
@@ -370,6 +1053,8 @@ def generate_visual_asset(model, prediction_text, domain):
     """
     Génère un visuel publicitaire avec Gemini 2.5 Flash Image Preview.
     """
+    from PIL import Image
+    from google.api_core import exceptions as google_exceptions
     prompt = f"""
     [ROLE] Vous êtes un directeur artistique expert en publicité.
     [CONTEXTE] Créer un visuel publicitaire percutant (bannière ou poster) pour une campagne marketing.
@@ -392,14 +1077,11 @@ def generate_visual_asset(model, prediction_text, domain):
     Générez l'image directement.
     """
     try:
-        response = model.generate_content(prompt)
+        response = call_gemini(model, prompt)
         if hasattr(response, 'parts') and len(response.parts) > 0 and response.parts[0].inline_data:
             image_data = response.parts[0].inline_data.data
-            image = Image.open(BytesIO(image_data))
-            
-            asset_path = "images/generated_asset.png"
-            image.save(asset_path, "PNG")
-            return asset_path
+            Image.open(BytesIO(image_data))  # Lecture de l'en-tête seulement : rejette une image invalide
+            return image_data  # Original conservé tel quel ; déclinaisons calculées au stockage
         else:
             st.warning("La réponse du modèle ne contenait pas d'image.")
             return None
@@ -411,10 +1093,17 @@ def generate_visual_asset(model, prediction_text, domain):
         st.error(f"Erreur lors de la génération du visuel : {str(e)}")
         return None
 
-def generate_summary_banner(model, prediction_text, domain):
+def generate_summary_banner(model, prediction_text, domain, kpis=None):
     """
-    Génère une bannière résumant les résultats clés de l'analyse en laissant le modèle extraire les données.
+    Génère une bannière résumant les résultats clés de l'analyse. Si les KPIs
+    sont déjà connus, seules leurs valeurs sont envoyées ; sinon le modèle les
+    extrait du texte de l'analyse.
     """
+    from PIL import Image
+    from google.api_core import exceptions as google_exceptions
+    if kpis:
+        # Les valeurs sont déjà extraites : inutile de renvoyer toute l'analyse au modèle
+        prediction_text = f"- ROI estimé : {format_roi(kpis)}\n    - CPA moyen : {kpis['cpa']:g} €"
     prompt = f"""
     [ROLE] Vous êtes un designer de données (Data Designer) expert, spécialisé dans la création de rapports visuels percutants pour le marketing.
 
@@ -443,14 +1132,11 @@ def generate_summary_banner(model, prediction_text, domain):
     Générez l'image directement. Assurez-vous que les valeurs du ROI et du CPA extraites du texte sont clairely visibles sur l'image finale.
     """
     try:
-        response = model.generate_content(prompt)
+        response = call_gemini(model, prompt)
         if hasattr(response, 'parts') and len(response.parts) > 0 and response.parts[0].inline_data:
             image_data = response.parts[0].inline_data.data
-            image = Image.open(BytesIO(image_data))
-            
-            banner_path = "images/summary_banner.png"
-            image.save(banner_path, "PNG")
-            return banner_path
+            Image.open(BytesIO(image_data))  # Lecture de l'en-tête seulement : rejette une image invalide
+            return image_data
         else:
             st.warning("La réponse du modèle pour la bannière de synthèse ne contenait pas d'image.")
             return None
@@ -463,69 +1149,93 @@ def generate_summary_banner(model, prediction_text, domain):
         return None
 
 # --- Fonction pour déterminer la qualité des résultats
+# Lexiques pondérés FR/EN, négations et seuils : voir scoring.py
+def score_results_quality(prediction_text, budget):
+    """Détail du score : niveau, score ajusté, termes retenus ou niés par groupe."""
+    return get_scoring_engine().score(prediction_text, budget)
+
 def evaluate_results_quality(prediction_text, budget):
-    # Analyse simple pour déterminer la qualité des résultats
-    text_lower = prediction_text.lower()
-    
-    # Vérifier les indicateurs positifs
-    positive_indicators = 0
-    
-    if "roi" in text_lower and any(word in text_lower for word in ["élevé", "fort", "important", "supérieur", "excellent"]):
-        positive_indicators += 2
-    
-    if "cpa" in text_lower and any(word in text_lower for word in ["faible", "bas", "réduit", "optimisé"]):
-        positive_indicators += 2
-    
-    if any(word in text_lower for word in ["exceptionnel", "excellent", "remarquable", "exceptionnelle"]):
-        positive_indicators += 3
-        
-    if any(word in text_lower for word in ["efficace", "performant", "rentable", "optimisé"]):
-        positive_indicators += 2
-    
-    # Budget élevé = attentes plus élevées
-    budget_factor = 1.0
-    if budget > 20000:
-        budget_factor = 1.2
-    elif budget < 5000:
-        budget_factor = 0.8
-    
-    adjusted_score = positive_indicators * budget_factor
-    
-    if adjusted_score >= 5:
-        return "excellent"
-    elif adjusted_score >= 3:
-        return "good"
-    else:
-        return "normal"
+    return score_results_quality(prediction_text, budget)["tier"]
+
+# --- Simulation Monte Carlo des performances
+SIMULATION_MONTHS = 6
+SIMULATION_SCENARIOS = 10000
+SIMULATION_PERCENTILES = (10, 50, 90)
+
+def campaign_seed(budget, duration, goal):
+    """Graine stable dérivée des paramètres : une même campagne donne toujours les mêmes courbes."""
+    digest = hashlib.sha256(f"{budget}|{duration}|{goal}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "little")
+
+def run_monte_carlo(budget, duration, goal, n_scenarios=SIMULATION_SCENARIOS, seed=None):
+    """
+    Tire n_scenarios trajectoires mensuelles en un seul calcul vectorisé et
+    retourne les bandes P10/P50/P90 (tableaux de forme (3, SIMULATION_MONTHS)).
+    """
+    import numpy as np
+    rng = np.random.default_rng(campaign_seed(budget, duration, goal) if seed is None else seed)
+    shape = (n_scenarios, SIMULATION_MONTHS)
+
+    # ROI : base par scénario + variation mensuelle
+    roi_base = rng.uniform(5, 15, (n_scenarios, 1)) + budget / 10000
+    roi = roi_base * (1 + rng.uniform(-0.1, 0.2, shape))
+    # CPA : base par scénario (plus la campagne est longue, plus il baisse)
+    cpa_base = rng.uniform(5, 20, (n_scenarios, 1)) - duration / 30
+    cpa = cpa_base * (1 + rng.uniform(-0.15, 0.15, shape))
+    # Conversions : croissance de 10 % par mois
+    growth = 1 + np.arange(SIMULATION_MONTHS) / 10
+    conversions = budget / rng.uniform(10, 50, shape) * growth
+
+    bands = {}
+    for name, values in (("roi", roi), ("cpa", cpa), ("conversions", conversions)):
+        band = np.percentile(values, SIMULATION_PERCENTILES, axis=0)
+        band.setflags(write=False)
+        bands[name] = band
+    return bands
+
+@st.cache_resource(max_entries=128, show_spinner=False)
+def simulate_campaign(budget, duration, goal, n_scenarios=SIMULATION_SCENARIOS):
+    """Bandes de percentiles d'une campagne, calculées une seule fois par processus."""
+    return run_monte_carlo(budget, duration, goal, n_scenarios)
 
 # --- Visualisations
+def _add_band(fig, x, band, color, name):
+    """Ajoute la zone P10–P90 et la médiane P50 d'une bande de percentiles."""
+    import plotly.graph_objects as go
+    p10, _, p90 = band
+    fig.add_trace(go.Scatter(x=x, y=p90, mode='lines', line=dict(width=0),
+                             showlegend=False, hoverinfo='skip'))
+    fig.add_trace(go.Scatter(x=x, y=p10, mode='lines', line=dict(width=0), fill='tonexty',
+                             fillcolor=color, name=f'{name} P10–P90'))
+
 def generate_advanced_graphs(budget, duration, goal, mois_filtre=None):
-    # ROI Simulation
-    roi_base = random.uniform(5, 15) + budget / 10000
-    roi_values = [roi_base * (1 + random.uniform(-0.1, 0.2)) for _ in range(6)]
-    # CPA Simulation
-    cpa_base = random.uniform(5, 20) - duration / 30
-    cpa_values = [cpa_base * (1 + random.uniform(-0.15, 0.15)) for _ in range(6)]
-    # Conversions Simulation
-    conversions = [int(budget / random.uniform(10, 50) * (1 + i/10)) for i in range(6)]
-
-    # Filtrer les données si un filtre de mois est appliqué
-    if mois_filtre:
-        start_month, end_month = mois_filtre
-        roi_values = roi_values[start_month-1:end_month]
-        cpa_values = cpa_values[start_month-1:end_month]
-        conversions = conversions[start_month-1:end_month]
-        x_axis_labels = [f"Mois {i}" for i in range(start_month, end_month+1)]  # Générer les labels d'axe X
-    else:
-        x_axis_labels = [f"Mois {i+1}" for i in range(len(roi_values))]
+    """
+    Figures d'une campagne pour une plage de mois. Les bandes viennent du cache
+    de simulate_campaign ; les figures (modifiables) sont construites à chaque
+    appel et ne sont donc jamais partagées entre sessions.
+    """
+    import plotly.graph_objects as go
+    import plotly.io as pio
+    # Passer l'objet gabarit évite de le résoudre par son nom pour chaque figure
+    template = pio.templates["plotly_white"]
+    bands = simulate_campaign(budget, duration, goal)
+
+    # Filtrer les données si un filtre de mois est appliqué (simple découpage, pas de recalcul)
+    start_month, end_month = mois_filtre if mois_filtre else (1, SIMULATION_MONTHS)
+    months = slice(start_month - 1, end_month)
+    roi_band = bands["roi"][:, months]
+    cpa_band = bands["cpa"][:, months]
+    conv_band = bands["conversions"][:, months]
+    x_axis_labels = [f"Mois {i}" for i in range(start_month, end_month + 1)]
 
     # ROI Graph
     fig_roi = go.Figure()
+    _add_band(fig_roi, x_axis_labels, roi_band, "rgba(200, 229, 70, 0.3)", "ROI")
     fig_roi.add_trace(go.Scatter(
         x=x_axis_labels,  # Utiliser les labels d'axe X
-        y=roi_values,
+        y=roi_band[1],
         mode='lines+markers',
-        name='ROI (%)',
+        name='ROI médian (%)',
         line=dict(color=PRIMARY_COLOR, width=3),
         marker=dict(size=8)
     ))
@@ -534,7 +1244,7 @@ def generate_advanced_graphs(budget, duration, goal, mois_filtre=None):
         xaxis_title="Mois",
         yaxis_title="ROI (%)",
         height=350,
-        template="plotly_white",
+        template=template,
         margin=dict(l=20, r=20, t=50, b=20)
     )
 
@@ -542,25 +1252,30 @@ def generate_advanced_graphs(budget, duration, goal, mois_filtre=None):
     fig_cpa = go.Figure()
     fig_cpa.add_trace(go.Bar(
         x=x_axis_labels, # Utiliser les labels d'axe X
-        y=cpa_values,
-        name='CPA (EUR)',
-        marker_color=SECONDARY_COLOR
+        y=cpa_band[1],
+        name='CPA médian (EUR)',
+        marker_color=SECONDARY_COLOR,
+        error_y=dict(type='data', symmetric=False,
+                     array=cpa_band[2] - cpa_band[1],
+                     arrayminus=cpa_band[1] - cpa_band[0])
     ))
     fig_cpa.update_layout(
         title="Coût par Acquisition (CPA)",
         xaxis_title="Mois",
         yaxis_title="CPA (EUR)",
         height=350,
-        template="plotly_white"
+        template=template
     )
 
     # Conversions Graph
+    conversions = conv_band[1].astype(int)
     fig_conv = go.Figure()
+    _add_band(fig_conv, x_axis_labels, conv_band, "rgba(124, 58, 237, 0.3)", "Conversions")
     fig_conv.add_trace(go.Scatter(
         x=x_axis_labels, # Utiliser les labels d'axe X
         y=conversions,
         mode='lines+markers+text',
-        name='Conversions',
+        name='Conversions (médiane)',
         text=conversions,
         textposition="top center",
         line=dict(color="#7C3AED", width=3),
@@ -571,49 +1286,531 @@ def generate_advanced_graphs(budget, duration, goal, mois_filtre=None):
         xaxis_title="Mois",
         yaxis_title="Nombre",
         height=350,
-        template="plotly_white"
+        template=template
     )
 
     return fig_roi, fig_cpa, fig_conv
 
-def create_simple_pdf(content):
-    pdf = FPDF()
-    pdf.add_page()
-    
-    # Add logo
-    logo_path = "images/google_ai_gemini_logo.png"
-    if Path(logo_path).exists():
-        try:
-            pdf.image(logo_path, x=10, y=8, w=40)
-        except Exception as e:
-            print(f"Error adding image to PDF: {e}")
-            
-    pdf.set_font("Arial", 'B', 16)
-    pdf.cell(80)
-    pdf.cell(30, 10, 'Rapport d\'Analyse Marketing', 0, 0, 'C')
-    pdf.ln(20)
-    
-    pdf.set_font("Arial", '', 12)
-    
-    # Add analysis content
-    # Replace non-breaking space with regular space and handle potential encoding issues
-    content = content.replace('\u00a0', ' ').encode('latin-1', 'replace').decode('latin-1')
-    pdf.multi_cell(0, 10, content)
-    
+# --- Rapport PDF (mis en cache par contenu et version du gabarit)
+PDF_TEMPLATE_VERSION = 2
+PDF_CACHE_SIZE = 32
+PDF_LOGO_WIDTH = 100              # Logo d'en-tête (30 mm), servi en 2x
+PDF_RENDITION_WAIT_SECONDS = 15   # Attente des déclinaisons "pdf" (dans le thread du rapport)
+PDF_POLL_SECONDS = 1              # Relance de l'export tant que le PDF est en cours de génération
+PDF_CHARTS = (
+    ("roi", "ROI Prédictif par Mois (%)", "band", PRIMARY_COLOR),
+    ("cpa", "Coût par Acquisition (CPA, EUR)", "bar", SECONDARY_COLOR),
+    ("conversions", "Projection de Conversions", "band", "#7C3AED"),
+)
+
+@st.cache_resource(show_spinner=False)
+def pdf_prefetch_state():
+    """Cache (clé -> Future des octets PDF) et exécuteur, conservés d'un rerun à l'autre."""
+    return {"futures": OrderedDict(), "lock": threading.Lock(),
+            "executor": ThreadPoolExecutor(max_workers=2, thread_name_prefix="pdf")}
+
+def build_pdf_report(state, session_id):
+    """
+    Contenu du rapport d'une session (données sérialisables : textes, paramètres,
+    identifiants d'images). Le rendu et la lecture des images se font en arrière-plan.
+    """
+    def get(key):
+        return state[key] if key in state else None
+    return {
+        "prediction": get("last_prediction"),
+        "premium": get("premium_content"),
+        "params": get("last_params"),
+        "domain": get("domain") or "Général",
+        "quality": get("result_quality"),
+        "kpis": get("last_kpis"),
+        "assets": {"summary_banner": get("summary_banner_asset"), "visual_asset": get("generated_asset")},
+        "session_id": session_id,
+    }
+
+def current_pdf_report():
+    return build_pdf_report(st.session_state, current_session_id())
+
+def pdf_charts(params):
+    """Bandes P10/P50/P90 de la simulation, sur toute la durée, pour les graphiques vectoriels."""
+    bands = simulate_campaign(params['budget'], params['duration'], params['goal'])
+    labels = [f"Mois {i}" for i in range(1, SIMULATION_MONTHS + 1)]
+    return [{"title": title, "kind": kind, "color": color, "labels": labels,
+             "band": bands[name].tolist(), "show_values": name == "conversions"}
+            for name, title, kind, color in PDF_CHARTS]
+
+def render_pdf_bytes(report):
+    """Rapport complet : synthèse et KPIs, analyse, graphiques, insights premium et images."""
+    params = report["params"]
+    kpis = report["kpis"]
+    summary = [("Budget", f"{params['budget']} €"), ("Durée", f"{params['duration']} jours"),
+               ("Audience", params.get('audience', "-")), ("Objectif", params['goal'])]
+    if report["quality"] in CELEBRATION_TIERS:
+        summary.append(("Qualité", CELEBRATION_TIERS[report["quality"]][1].rstrip("!")))
+    if kpis:
+        summary += [("ROI estimé", format_roi(kpis)), ("CPA moyen", f"{kpis['cpa']:g} €")]
+        summary += [(channel["name"], f"{channel['budget_share']:g} % du budget") for channel in kpis["channels"]]
+
+    def image(name):
+        asset_id = report["assets"].get(name)
+        if not asset_id:
+            return None
+        return image_renditions().get(report["session_id"], asset_id, "pdf", timeout=PDF_RENDITION_WAIT_SECONDS)
+
+    sections = [
+        {"title": "Bannière de synthèse", "image": image("summary_banner")},
+        {"title": "Analyse détaillée", "markdown": report["prediction"]},
+        {"title": "Projections de performance", "charts": pdf_charts(params)},
+        {"title": "Insights premium", "markdown": report["premium"]},
+        {"title": "Visuel publicitaire", "image": image("visual_asset"),
+         "caption": "Visuel généré par Gemini pour illustrer la stratégie."},
+    ]
+    return render_report(
+        {"title": "Rapport d'Analyse Marketing", "subtitle": f"Secteur : {report['domain']}",
+         "summary": summary, "sections": sections},
+        fonts=prepare_fonts(*setup_fonts()),
+        logo=static_image(LOGO_PATH, PDF_LOGO_WIDTH),
+    )
+
+def pdf_renditions_ready(report):
+    """Vrai si les déclinaisons des images du rapport sont prêtes (sinon le rendu peut se faire sans elles)."""
+    return all(image_renditions().ready(asset_id) for asset_id in report["assets"].values() if asset_id)
+
+def pdf_cache_key(report):
+    # Les identifiants d'images sont des empreintes de leur contenu : la session n'entre pas dans la clé.
+    # L'état des déclinaisons y entre : un PDF rendu avant qu'elles soient prêtes n'est pas resservi ensuite.
+    content = json.dumps({name: value for name, value in report.items() if name != "session_id"},
+                         sort_keys=True, ensure_ascii=False)
+    content += f"\x00{pdf_renditions_ready(report)}"
+    return hashlib.sha256(f"{PDF_TEMPLATE_VERSION}\x00{content}".encode("utf-8")).hexdigest()
+
+def traced_render_pdf(report, trace_id=None):
+    with tracer().span("pdf", trace_id, chars=len(report["prediction"])):
+        return render_pdf_bytes(report)
+
+def prefetch_pdf(report, trace_id=None):
+    """Lance (une seule fois par contenu) la génération du PDF en arrière-plan et retourne son Future."""
+    key = pdf_cache_key(report)
+    state = pdf_prefetch_state()
+    with state["lock"]:
+        future = state["futures"].get(key)
+        if future is not None:
+            state["futures"].move_to_end(key)
+            return future
+        future = state["executor"].submit(traced_render_pdf, report, trace_id)
+        state["futures"][key] = future
+        while len(state["futures"]) > PDF_CACHE_SIZE:
+            state["futures"].popitem(last=False)
+    return future
+
+def pdf_ready(report, trace_id=None):
+    """Vrai si le PDF est généré (ou en échec) : create_pdf_report répondra sans attendre."""
+    return prefetch_pdf(report, trace_id).done()
+
+def create_pdf_report(report, trace_id=None):
+    future = prefetch_pdf(report, trace_id)
     try:
-        pdf_bytes = pdf.output(dest='S').encode('latin-1')
-        return BytesIO(pdf_bytes)
+        return BytesIO(future.result())
     except Exception as e:
+        # Ne pas garder un échec en cache : la prochaine exécution réessaiera
+        state = pdf_prefetch_state()
+        with state["lock"]:
+            for key, cached in list(state["futures"].items()):
+                if cached is future:
+                    del state["futures"][key]
         st.error(f"Erreur création PDF: {str(e)}")
         return None
 
 
+# --- Pipeline d'analyse (étapes exécutées en parallèle)
+STAGE_ICONS = {RUNNING: "🔄", DONE: "✅", FAILED: "❌", SKIPPED: "⏭️"}
+
+def build_analysis_stages(model, params, style, lang, domain, premium, generate_visual, generate_summary,
+                          use_cache=True, streams=None, structured=False, artistic_banner=False, variants=None):
+    """
+    Décrit le graphe des étapes : la prédiction et les insights premium sont
+    indépendants ; le visuel, la bannière et la célébration ne dépendent que
+    de la prédiction ({"text", "kpis"}). `streams` associe un StreamWriter aux étapes textuelles.
+    """
+    streams = streams or {}
+    stages = [
+        Stage("prediction", lambda r: generate_prediction_with_kpis(model, params, style, lang, domain, use_cache,
+                                                                    streams.get("prediction"), structured,
+                                                                    variants),
+              label="🔎 Analyse prédictive"),
+    ]
+    if PREMIUM_FEATURES and premium:
+        stages.append(Stage("premium", lambda r: generate_premium_insights(model, params, domain, use_cache,
+                                                                          streams.get("premium")),
+                            label="🔍 Insights premium"))
+    stages.append(Stage("quality", lambda r: score_results_quality(r["prediction"]["text"], params['budget']),
+                        depends_on=["prediction"], label="🏅 Évaluation des résultats"))
+    stages.append(Stage("celebration", lambda r: generate_celebration_image(r["quality"]["tier"]),
+                        depends_on=["quality"], label="🎉 Image de célébration"))
+    if PREMIUM_FEATURES and generate_visual:
+        stages.append(Stage("visual_asset", lambda r: generate_visual_asset(model, r["prediction"]["text"], domain),
+                            depends_on=["prediction"], label="🎨 Visuel publicitaire"))
+    if PREMIUM_FEATURES and generate_summary:
+        if artistic_banner:
+            banner = lambda r: generate_summary_banner(model, r["prediction"]["text"], domain, r["prediction"]["kpis"])
+        else:
+            banner = lambda r: generate_summary_banner_local(r["prediction"]["kpis"], domain)
+        stages.append(Stage("summary_banner", banner, depends_on=["prediction"], label="📊 Bannière de synthèse"))
+    return stages
+
+def run_analysis_pipeline(stages, streams=None, stream_area=None, trace_id=None):
+    """
+    Exécute les étapes et affiche la progression de chacune. Le texte en
+    streaming est affiché dans `stream_area` (zone principale de la page).
+    Chaque étape est tracée sous `trace_id`.
+    """
+    streams = streams or {}
+    ctx = get_script_run_ctx()
+
+    def attach_streamlit_context():
+        # Permet aux étapes d'utiliser st.error / st.warning depuis les threads du pool
+        if ctx is not None:
+            add_script_run_ctx(threading.current_thread(), ctx)
+
+    with st.status("🔎 Analyse en cours avec Gemini 2.5 Flash...", expanded=True) as status:
+        placeholders = {stage.name: st.empty() for stage in stages}
+        for stage in stages:
+            placeholders[stage.name].markdown(f"⏳ {stage.label}")
+        if streams:
+            with stream_area if stream_area is not None else st.container():
+                for writer in streams.values():
+                    writer.placeholder = st.empty()
+
+        def with_queue_feedback(stage):
+            # Affiche la position dans la file d'attente partagée (ou le délai avant nouvelle tentative)
+            def on_wait(position, delay, attempt):
+                if attempt:
+                    note = f"🚦 quota atteint, nouvelle tentative {attempt}/{GEMINI_MAX_RETRIES} dans {delay:.0f} s"
+                elif position:
+                    note = f"🚦 en file d'attente (position {position})"
+                else:
+                    note = f"🚦 quota par minute atteint, reprise dans ~{delay:.0f} s"
+                placeholders[stage.name].markdown(f"⏳ {stage.label} — {note}")
+
+            def run(inputs):
+                _call_feedback.on_wait = on_wait
+                try:
+                    with tracer().span(stage.name, trace_id) as span:
+                        value = stage.func(inputs)
+                        if value is None and span.status == "ok":
+                            span.status = "empty"
+                        return value
+                finally:
+                    _call_feedback.on_wait = None
+
+            return Stage(stage.name, run, stage.depends_on, stage.label)
+
+        def on_update(stage, stage_status, result):
+            line = f"{STAGE_ICONS.get(stage_status, '⏳')} {stage.label}"
+            if stage.name in result.durations and stage_status in (DONE, FAILED):
+                line += f" — {result.durations[stage.name]:.1f} s"
+                writer = streams.get(stage.name)
+                if writer is not None and writer.ttft is not None:
+                    line += f" (premier token : {writer.ttft:.1f} s)"
+            placeholders[stage.name].markdown(line)
+
+        result = run_pipeline([with_queue_feedback(stage) for stage in stages],
+                              max_workers=len(stages), on_update=on_update,
+                              worker_init=attach_streamlit_context)
+
+        if not result.ok("prediction"):
+            status.update(label="❌ L'analyse n'a pas pu aboutir", state="error")
+        elif any(s in (FAILED, SKIPPED) or not result.ok(name) for name, s in result.statuses.items()):
+            status.update(label="⚠️ Analyse terminée (résultats partiels)", state="complete", expanded=False)
+        else:
+            status.update(label="✅ Analyse terminée", state="complete", expanded=False)
+
+    for name, error in result.errors.items():
+        st.warning(f"L'étape '{name}' a échoué : {error}")
+    return result
+
+
 # --- Interface Utilisateur
+# --- Sections de résultats (fragments : chaque interaction ne relance que sa section)
+@st.fragment
+def display_charts():
+    """Graphiques prédictifs : le filtre de mois ne recalcule que ce fragment."""
+    st.markdown("### 📈 Visualisations Prédictives")
+    # Filtre pour les graphiques
+    mois_filtre = st.slider("Mois à afficher", 1, SIMULATION_MONTHS, (1, SIMULATION_MONTHS))
+    params = st.session_state.last_params
+    with tracer().span("graphs", st.session_state.get("trace_id"), months=list(mois_filtre)):
+        fig_roi, fig_cpa, fig_conv = generate_advanced_graphs(params['budget'], params['duration'],
+                                                              params['goal'], tuple(mois_filtre))
+
+    col1, col2, = st.columns(2)
+    with col1:
+        st.plotly_chart(fig_roi, width='stretch')
+    with col2:
+        st.plotly_chart(fig_cpa, width='stretch')
+    st.plotly_chart(fig_conv, width='stretch')
+
+@st.fragment
+def display_premium_tools():
+    """Insights et outils premium (le téléchargement du modèle ne relance que ce fragment)."""
+    if not (PREMIUM_FEATURES and st.session_state.premium_content):
+        return
+    st.markdown("---")
+    st.header("💎 Insights Premium")
+    with st.expander("Afficher les recommandations avancées"):
+        st.markdown(st.session_state.premium_content)
+
+    st.markdown("Ces insights premium peuvent être illustrés par l'image suivante :")
+
+    st.markdown("### 🛠 Outils Premium")
+    tab1, tab2, tab3 = st.tabs(["Checklist", "Calendrier", "Template"])
+
+    with tab1:
+        st.markdown("""
+        ### Checklist d'Optimisation
+        - [ ] Audit des mots-clés
+        - [ ] Analyse concurrentielle
+        - [ ] Test A/B landing page
+        - [ ] Segmentation audience
+        - [ ] Automatisation CRM
+        """)
+
+    with tab2:
+        st.markdown("""
+        ### Calendrier Editorial
+        | Semaine | Thème Principal | Canaux |
+        |---------|------------------|--------|
+        | 1 | Lancement produit | FB, IG, Email |
+        | 2 | Témoignages clients | LinkedIn, Blog |
+        | 3 | Promotion spéciale | Tous canaux |
+        """)
+
+    with tab3:
+        template = static_assets().read(TEMPLATE_PATH)
+        if template is not None:
+            st.download_button(
+                "📥 Template Stratégie Marketing",
+                data=template,
+                file_name="template_strategie.docx",
+                mime="application/octet-stream"
+            )
+        else:
+            st.warning("Template non trouvé dans le dossier 'templates'")
+
+def display_pdf_buttons(report, trace_id):
+    pdf_buffer = create_pdf_report(report, trace_id)
+
+    if pdf_buffer:
+        col1, col2 = st.columns(2)
+        with col1:
+            st.download_button(
+                label="💾 Télécharger PDF Complet",
+                data=pdf_buffer,
+                file_name=st.session_state.filename_pdf,
+                mime="application/pdf",
+                width='stretch'
+            )
+        with col2:
+            if st.button("🔄 Générer une Nouvelle Analyse", width='stretch'):
+                del st.session_state.last_prediction
+                st.rerun()
+    else:
+        st.error("Erreur lors de la génération du PDF")
+
+@st.fragment(run_every=PDF_POLL_SECONDS)
+def display_pdf_pending():
+    """Attente du PDF : ce fragment se relance seul et affiche le bouton dès que le rapport est prêt."""
+    report = current_pdf_report()
+    trace_id = st.session_state.get("trace_id")
+    if pdf_ready(report, trace_id):
+        display_pdf_buttons(report, trace_id)
+    else:
+        st.info("⏳ Préparation du rapport PDF...")
+
+@st.fragment
+def display_export():
+    """Export PDF : le PDF est pré-généré, son téléchargement ne relance que ce fragment."""
+    st.markdown("---")
+    st.markdown("### 📤 Exporter le Rapport")
+
+    report = current_pdf_report()
+    trace_id = st.session_state.get("trace_id")
+    # Jamais d'attente du rendu dans l'exécution du script : le bouton n'apparaît que PDF prêt
+    if pdf_ready(report, trace_id):
+        display_pdf_buttons(report, trace_id)
+    else:
+        display_pdf_pending()
+
+# --- Historique (SQLite, paginé)
+def history_store():
+    return get_history_store(path=HISTORY_DB_PATH)
+
+def history_owner():
+    """
+    Jeton de l'historique, gardé dans la session. Le jeton donne accès à
+    l'historique : il n'est jamais écrit dans l'URL de la page, qu'on peut
+    donc partager. Un lien privé (?historique=<jeton>) le restaure, puis le
+    paramètre est retiré de la barre d'adresse.
+    """
+    owner = st.query_params.get(HISTORY_QUERY_PARAM)
+    if owner:
+        del st.query_params[HISTORY_QUERY_PARAM]
+    else:
+        owner = st.session_state.get("history_owner") or secrets.token_urlsafe(16)
+    st.session_state.history_owner = owner
+    return owner
+
+def history_private_link(owner):
+    base = (st.context.url or "").split("?")[0]
+    return f"{base}?{HISTORY_QUERY_PARAM}={owner}"
+
+def reset_history_page():
+    st.session_state.history_page = 0
+
+def reopen_analysis(analysis_id):
+    """Recharge une analyse enregistrée comme résultat courant (texte lu à la demande)."""
+    analysis = history_store().get(history_owner(), analysis_id)
+    if analysis is None:
+        return
+    assets = analysis["assets"]
+    st.session_state.last_prediction = analysis["prediction"]
+    st.session_state.last_kpis = analysis["kpis"]
+    st.session_state.last_variants = None
+    st.session_state.reused_from = None
+    st.session_state.reused_settings = None
+    st.session_state.last_params = analysis["params"]
+    st.session_state.domain = analysis["domain"]
+    st.session_state.filename_pdf = f"rapport_{analysis['domain'].lower()}_{analysis_id}.pdf"
+    st.session_state.result_quality = analysis["quality"]
+    st.session_state.quality_breakdown = score_results_quality(analysis["prediction"], analysis["params"]["budget"])
+    st.session_state.premium_content = None
+    # Les images ne sont disponibles que si elles sont encore dans le stockage de cette session
+    st.session_state.celebration_asset = assets.get("celebration")
+    st.session_state.generated_asset = assets.get("visual_asset")
+    st.session_state.summary_banner_asset = assets.get("summary_banner")
+    st.session_state.summary_banner_artistic = False
+    st.session_state.last_timings = {}
+    st.session_state.trace_id = tracing.new_trace_id()
+    prefetch_pdf(current_pdf_report(), st.session_state.trace_id)
+
+def request_refresh():
+    st.session_state.force_refresh = True
+
+def change_history_page(delta):
+    st.session_state.history_page = st.session_state.get("history_page", 0) + delta
+
+@st.fragment
+def display_history_sidebar():
+    """Historique paginé : recherche, filtres et pages ne relancent que ce fragment."""
+    store = history_store()
+    owner = history_owner()
+    if not store.count(owner):
+        return
+
+    st.markdown("---")
+    st.markdown("## 📚 Historique")
+    with st.expander("🔑 Lien privé de l'historique"):
+        st.code(history_private_link(owner), language=None)
+        st.caption("⚠️ Ce lien donne accès à tout votre historique : gardez-le pour vous, ne le partagez pas.")
+    search = st.text_input("🔎 Rechercher", key="history_search", on_change=reset_history_page)
+    filter_col1, filter_col2 = st.columns(2)
+    with filter_col1:
+        domain = st.selectbox("Secteur", ["Tous"] + DOMAIN_OPTIONS, key="history_domain",
+                              on_change=reset_history_page)
+    with filter_col2:
+        quality = st.selectbox("Qualité", ["Toutes", "excellent", "good", "normal"], key="history_quality",
+                               on_change=reset_history_page)
+    filters = {
+        "search": search or None,
+        "domain": None if domain == "Tous" else domain,
+        "quality": None if quality == "Toutes" else quality,
+    }
+
+    total = store.count(owner, **filters)
+    pages = max(1, -(-total // HISTORY_PAGE_SIZE))
+    page = min(st.session_state.get("history_page", 0), pages - 1)
+    if not total:
+        st.caption("Aucune analyse ne correspond à ces filtres.")
+        return
+
+    for analysis in store.page(owner, page, HISTORY_PAGE_SIZE, **filters):
+        quality_badge = ""
+        if analysis.get('quality') == "excellent":
+            quality_badge = " 🏆"
+        elif analysis.get('quality') == "good":
+            quality_badge = " ⭐"
+        with st.expander(f"Analyse #{analysis['id']} · {analysis['domain']}{quality_badge}", expanded=False):
+            assets = analysis["assets"]
+            # Aperçu : vignette du premier visuel encore disponible dans cette session
+            for kind in ("visual_asset", "summary_banner", "celebration"):
+                thumbnail = load_image(assets.get(kind), "thumbnail")
+                if thumbnail:
+                    st.image(thumbnail, width=HISTORY_THUMBNAIL_WIDTH)
+                    break
+            st.markdown(f"""
+            **Date**: {analysis['created_at']}
+            **Budget**: {analysis['budget']} €
+            **Secteur**: {analysis['domain']}
+            **Qualité**: {(analysis.get('quality') or 'normal').capitalize()}{quality_badge}
+            """)
+            if analysis.get('premium'):
+                st.markdown("<span class='premium-badge'>Premium</span>", unsafe_allow_html=True)
+            if st.button("📂 Rouvrir cette analyse", key=f"history_open_{analysis['id']}"):
+                reopen_analysis(analysis["id"])
+                # La page de résultats est hors du fragment : relancer toute l'application
+                st.rerun()
+
+    if pages > 1:
+        nav_prev, nav_label, nav_next = st.columns([1, 2, 1])
+        with nav_prev:
+            st.button("◀", key="history_prev", disabled=page == 0, on_click=change_history_page, args=(-1,))
+        with nav_label:
+            st.caption(f"Page {page + 1}/{pages} · {total} analyses")
+        with nav_next:
+            st.button("▶", key="history_next", disabled=page >= pages - 1,
+                      on_click=change_history_page, args=(1,))
+
+# --- Panneau de debug : traces de la dernière analyse et percentiles du processus
+STATUS_ICONS = {"ok": "✅", "empty": "⚪", "error": "❌"}
+
+def debug_panel_enabled():
+    return TRACE_DEBUG_PANEL or st.query_params.get("debug") == "1"
+
+def display_trace_panel():
+    with st.expander("🩺 Traces (debug)"):
+        spans = tracer().trace(st.session_state.get("trace_id"))
+        if spans:
+            rows = ["| Étape | Durée | Tokens | Essais | Statut |", "|---|---|---|---|---|"]
+            for span in spans:
+                status = STATUS_ICONS.get(span["status"], "") + (f" {span['error']}" if span["error"] else "")
+                rows.append(f"| {span['span']} | {span['duration_s']:.2f} s | {span['tokens']['total']} "
+                            f"| {span['retries']} | {status} |")
+            st.markdown("**Dernière analyse**\n\n" + "\n".join(rows))
+        else:
+            st.caption("Aucune trace pour l'analyse affichée.")
+
+        summary = tracer().summary()
+        if summary:
+            rows = ["| Étape | n | p50 | p95 | Tokens |", "|---|---|---|---|---|"]
+            for name, stats in sorted(summary.items(), key=lambda item: -item[1]["p95"]):
+                rows.append(f"| {name} | {stats['count']} | {stats['p50']:.2f} s | {stats['p95']:.2f} s "
+                            f"| {stats['tokens']['total']} |")
+            st.markdown("**Toutes les analyses du processus**\n\n" + "\n".join(rows))
+        outputs = [f"{label} : `{path}`" for label, path in
+                   (("Métriques Prometheus", METRICS_PATH), ("journal JSON", TRACE_LOG_PATH)) if path]
+        if outputs:
+            st.caption(" · ".join(outputs))
+
 def main():
     display_welcome_page()
 
+    try:
+        backend = configure_gemini_backend()
+    except ValueError as e:
+        st.error(f"❌ Backend Gemini invalide : {e}")
+        return
+
     # Vérification API Key
-    if 'GEMINI_API_KEY' not in st.secrets:
+    if api_key_required() and 'GEMINI_API_KEY' not in st.secrets:
         st.error("""
         🔐 Configuration manquante :
         1. Créez un fichier `.streamlit/secrets.toml`
@@ -622,12 +1819,25 @@ def main():
         """)
         return
 
+    if GEMINI_WARMUP:
+        # Import du SDK, configuration et préchauffage hors du premier affichage
+        gemini_clients.warm_up(MODEL_OPTIONS[0], GENERATION_CONFIG,
+                               api_key=secret("GEMINI_API_KEY"), transport=GEMINI_TRANSPORT)
+        # Non bloquant : le premier appel ouvrira la connexion ; un échec du thread est signalé une fois par session
+        warmup_error = gemini_clients.warm_up_error(MODEL_OPTIONS[0], GENERATION_CONFIG)
+        if warmup_error is not None and not st.session_state.get("warmup_warned"):
+            st.session_state.warmup_warned = True
+            st.warning(f"⚠️ Préchauffage Gemini impossible : {warmup_error}")
+
+    # Zone d'affichage des réponses en streaming pendant l'analyse
+    live_output = st.container()
+
     # --- Sidebar
     with st.sidebar:
-        logo_path = "images/google_ai_gemini_logo.png"
-        if Path(logo_path).exists():
+        sidebar_logo = static_image(LOGO_PATH, 100, placeholder=logo_placeholder)
+        if sidebar_logo:
             try:
-                st.image(logo_path, width=100)
+                st.image(sidebar_logo, width=100)
             except:
                 st.markdown("""
                 <div style="width:100px; height:60px; background-color:#4F46E5; 
@@ -642,31 +1852,37 @@ def main():
         # Modification ici pour utiliser le modèle gemini-2.5-flash-image-preview
         selected_model = st.selectbox(
             "Modèle Gemini",
-            ["models/gemini-2.5-flash-image-preview", "gemini-pro", "gemini-1.5-pro-latest"],
+            MODEL_OPTIONS,
             index=0,  # Défini par défaut sur gemini-2.5-flash-image-preview
             help="Choisissez le modèle IA à utiliser"
         )
 
         budget = st.slider("Budget (EUR)", 1000, 50000, 15000, step=500)
-        audience = st.selectbox("Audience", ["18-24 ans", "25-34 ans", "35-44 ans", "45+ ans"])
-        duration = st.select_slider("Durée (jours)", options=[7, 14, 30, 60, 90])
-        goal = st.selectbox("Objectif Principal", ["Acquisition", "Conversion", "Rétention", "Notoriété"])
+        audience = st.selectbox("Audience", AUDIENCE_OPTIONS)
+        duration = st.select_slider("Durée (jours)", options=DURATION_OPTIONS)
+        goal = st.selectbox("Objectif Principal", GOAL_OPTIONS)
 
         st.markdown("---")
         st.markdown("### ✨ Options Avancées")
 
         col1, col2 = st.columns(2)
         with col1:
-            style = st.radio("Style", ["Formel", "Dynamique", "Humour"])
+            style = st.radio("Style", STYLE_OPTIONS)
         with col2:
-            lang = st.radio("Langue", ["Français", "Anglais"])
+            lang = st.radio("Langue", LANG_OPTIONS)
 
-        domaine_options = [
-            "Général", "E-commerce", "Santé & Bien-être", "Éducation",
-            "Immobilier", "Finance", "Technologie", "Mode",
-            "Restauration", "Tourisme", "Divertissement", "Autre"
-        ]
-        domain_selection = st.selectbox("Secteur d'Activité", domaine_options)
+        variants = None
+        if st.checkbox("🎭 Variantes de style et de langue", False,
+                       help="Rédige en un seul appel l'analyse dans plusieurs styles et langues, affichées "
+                            "en onglets. Chaque variante est mise en cache séparément ; les KPIs sont "
+                            "extraits du texte de la variante principale (Style / Langue ci-dessus)."):
+            variant_styles = st.multiselect("Styles des variantes", STYLE_OPTIONS, default=[style])
+            variant_langs = st.multiselect("Langues des variantes", LANG_OPTIONS, default=[lang])
+            combos = [(v_style, v_lang) for v_style in variant_styles or [style] for v_lang in variant_langs or [lang]]
+            if len(set(combos) | {(style, lang)}) > 1:
+                variants = combos
+
+        domain_selection = st.selectbox("Secteur d'Activité", DOMAIN_OPTIONS)
 
         if domain_selection == "Autre":
             domain = st.text_input("Précisez votre secteur :", "")
@@ -675,75 +1891,140 @@ def main():
 
         filename_pdf = st.text_input("Nom du rapport PDF", f"rapport_{domain.lower()}.pdf")
 
+        bypass_cache = st.checkbox(
+            "♻️ Ignorer le cache",
+            False,
+            help="Force un nouvel appel à Gemini même si une analyse identique est déjà en cache"
+        )
+        streaming = st.checkbox(
+            "⚡ Affichage en streaming",
+            True,
+            help="Affiche l'analyse au fur et à mesure de sa génération"
+        )
+        structured = st.checkbox(
+            "🧮 KPIs structurés (JSON)",
+            False,
+            help="Demande au modèle des KPIs typés (ROI, CPA, canaux, stratégies) en plus de l'analyse. "
+                 "L'analyse n'est alors pas affichée en streaming."
+        )
+        cache_stats = get_response_cache().stats
+        st.caption(
+            f"Cache : {cache_stats['memory_hits'] + cache_stats['disk_hits']} hits "
+            f"({cache_stats['disk_hits']} disque) · {cache_stats['misses']} misses"
+            + (f" · {neighbor_cache().stats['hits']} analyses voisines réutilisées" if NEIGHBOR_BANDS else "")
+        )
+        if backend in BACKEND_LABELS:
+            st.caption(f"🧪 Backend Gemini : {BACKEND_LABELS[backend]}")
+
         if PREMIUM_FEATURES:
             st.markdown("---")
             premium = st.checkbox("🔓 Activer les fonctionnalités Premium", True)
             generate_visual = st.checkbox("🎨 Générer un visuel publicitaire", True)
             generate_summary = st.checkbox("📊 Générer une bannière de résumé", True)
+            artistic_banner = st.checkbox(
+                "🖌️ Bannière artistique (Gemini)",
+                False,
+                help="Fait dessiner la bannière par Gemini au lieu du rendu local instantané"
+            )
 
-        if st.button("🚀 Lancer l'Analyse", width='stretch'):
+        launch = st.button("🚀 Lancer l'Analyse", width='stretch')
+        # « Rafraîchir » sous une analyse réutilisée : mêmes paramètres, sans aucun cache
+        refresh = st.session_state.pop("force_refresh", False) and "last_params" in st.session_state
+        if refresh:
+            domain = st.session_state.domain
+            # Réglages de génération de l'analyse réutilisée, même si la barre latérale a changé depuis
+            settings = st.session_state.get("reused_settings") or {}
+            style = settings.get("style", style)
+            lang = settings.get("lang", lang)
+            structured = settings.get("structured", structured)
+            variants = None
+        if launch or refresh:
             if domain_selection == "Autre" and domain.strip() == "":
                 st.warning("Veuillez préciser votre secteur d'activité")
             else:
-                with st.spinner("🔎 Analyse en cours avec Gemini 2.5 Flash..."):
+                trace_id = tracing.new_trace_id()
+                with tracer().span("client_init", trace_id, model=selected_model) as span:
                     model = initialize_gemini(selected_model)
-                    if model:
-                        params = {
-                            'budget': budget,
-                            'audience': audience,
-                            'duration': duration,
-                            'goal': goal
+                    if model is None:
+                        span.status = "error"
+                if model:
+                    params = dict(st.session_state.last_params) if refresh else {
+                        'budget': budget,
+                        'audience': audience,
+                        'duration': duration,
+                        'goal': goal
+                    }
+
+                    streams = {}
+                    if streaming:
+                        streams["prediction"] = StreamWriter("🔎 Analyse prédictive")
+                        if PREMIUM_FEATURES and premium:
+                            streams["premium"] = StreamWriter("💎 Insights premium")
+
+                    stages = build_analysis_stages(
+                        model, params, style, lang, domain,
+                        premium, generate_visual, generate_summary,
+                        use_cache=not (bypass_cache or refresh), streams=streams, structured=structured,
+                        artistic_banner=artistic_banner, variants=variants
+                    )
+                    pipeline_result = run_analysis_pipeline(stages, streams, stream_area=live_output,
+                                                            trace_id=trace_id)
+                    prediction_result = pipeline_result.get("prediction")
+
+                    if prediction_result:
+                        prediction = prediction_result["text"]
+                        kpis = prediction_result["kpis"]
+                        quality_breakdown = (pipeline_result.get("quality")
+                                             or score_results_quality(prediction, params['budget']))
+                        result_quality = quality_breakdown["tier"]
+                        premium_content = pipeline_result.get("premium")
+                        celebration_asset = store_asset(pipeline_result.get("celebration"))
+                        generated_asset = store_asset(pipeline_result.get("visual_asset"))
+                        summary_banner_asset = store_asset(pipeline_result.get("summary_banner"))
+
+                        history_store().add(
+                            history_owner(), params, domain, result_quality, prediction, kpis,
+                            assets={"celebration": celebration_asset, "visual_asset": generated_asset,
+                                    "summary_banner": summary_banner_asset},
+                            premium=PREMIUM_FEATURES and premium
+                        )
+                        st.session_state.history_page = 0
+
+                        st.session_state.last_prediction = prediction
+                        st.session_state.last_kpis = kpis
+                        st.session_state.last_variants = prediction_result.get("variants")
+                        st.session_state.reused_from = prediction_result.get("reused_from")
+                        st.session_state.reused_settings = (
+                            {"style": style, "lang": lang, "structured": structured}
+                            if st.session_state.reused_from else None
+                        )
+                        st.session_state.last_params = params
+                        st.session_state.filename_pdf = filename_pdf
+                        st.session_state.domain = domain
+                        st.session_state.premium_content = premium_content if PREMIUM_FEATURES and premium else None
+                        st.session_state.result_quality = result_quality
+                        st.session_state.quality_breakdown = quality_breakdown
+                        st.session_state.celebration_asset = celebration_asset
+                        st.session_state.generated_asset = generated_asset
+                        st.session_state.summary_banner_asset = summary_banner_asset
+                        st.session_state.summary_banner_artistic = artistic_banner
+                        st.session_state.last_timings = {
+                            name: {"ttft": writer.ttft, "total": writer.total}
+                            for name, writer in streams.items()
                         }
+                        st.session_state.trace_id = trace_id
 
-                        prediction = generate_prediction(model, params, style, lang, domain)
-                        premium_content = None
-                        if PREMIUM_FEATURES and premium:
-                            with st.spinner("🔍 Génération des insights premium..."):
-                                premium_content = generate_premium_insights(model, params, domain)
-
-                        if prediction:
-                            result_quality = evaluate_results_quality(prediction, budget)
-                            celebration_path = generate_celebration_image(result_quality)
-
-                            generated_asset_path = None
-                            if generate_visual:
-                                with st.spinner("🎨 Création du visuel publicitaire..."):
-                                    generated_asset_path = generate_visual_asset(model, prediction, domain)
-                            
-                            summary_banner_path = None
-                            if generate_summary:
-                                with st.spinner("📊 Création de la bannière de synthèse..."):
-                                    summary_banner_path = generate_summary_banner(model, prediction, domain)
-
-                            if 'history' not in st.session_state:
-                                st.session_state.history = []
-
-                            st.session_state.history.append({
-                                "date": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                                "params": params,
-                                "domain": domain,
-                                "premium": PREMIUM_FEATURES and premium,
-                                "quality": result_quality,
-                                "visual_asset": generated_asset_path
-                            })
-
-                            st.session_state.last_prediction = prediction
-                            st.session_state.last_params = params
-                            st.session_state.filename_pdf = filename_pdf
-                            st.session_state.domain = domain
-                            st.session_state.premium_content = premium_content if PREMIUM_FEATURES and premium else None
-                            st.session_state.result_quality = result_quality
-                            st.session_state.celebration_path = celebration_path
-                            st.session_state.generated_asset_path = generated_asset_path
-                            st.session_state.summary_banner_path = summary_banner_path
-                            st.rerun()
+                        # Préparer le PDF pendant le prochain affichage
+                        prefetch_pdf(current_pdf_report(), trace_id)
+                        st.rerun()
 
     # --- Affichage Résultats
     if 'last_prediction' in st.session_state:
         # Afficher l'image de célébration
-        if st.session_state.celebration_path and Path(st.session_state.celebration_path).exists():
+        celebration_image = load_image(st.session_state.get("celebration_asset"))
+        if celebration_image:
             try:
-                st.image(st.session_state.celebration_path, width='stretch')
+                st.image(celebration_image, width='stretch')
             except:
                 # Fallback en cas d'erreur
                 quality = st.session_state.result_quality
@@ -781,131 +2062,88 @@ def main():
             with col3:
                 st.metric("Secteur", st.session_state.domain)
 
-        with st.expander("🔍 Analyse Détailée", expanded=True):
-            st.markdown(st.session_state.last_prediction)
+            kpis = st.session_state.get("last_kpis")
+            if kpis:
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    st.metric("ROI estimé", format_roi(kpis))
+                with col2:
+                    st.metric("CPA moyen", f"{kpis['cpa']:g} €")
+                with col3:
+                    if kpis["channels"]:
+                        top = max(kpis["channels"], key=lambda c: c["budget_share"])
+                        st.metric("Canal principal", top["name"], f"{top['budget_share']:g} % du budget",
+                                  delta_color="off")
+
+        reused_from = st.session_state.get("reused_from")
+        if reused_from:
+            col_badge, col_refresh = st.columns([3, 1])
+            with col_badge:
+                st.badge("réutilisé", icon="♻️", color="orange")
+                st.caption(f"Analyse d'une campagne voisine ({reused_from['budget']} €), montants ajustés au budget "
+                           f"de {st.session_state.last_params['budget']} €. Les pourcentages, le ROI et le CPA "
+                           "sont repris tels quels.")
+            with col_refresh:
+                st.button("🔄 Rafraîchir", width='stretch', on_click=request_refresh,
+                          help="Relance l'analyse avec Gemini pour ces paramètres exacts, sans cache")
 
-        if st.session_state.summary_banner_path and Path(st.session_state.summary_banner_path).exists():
+        with st.expander("🔍 Analyse Détailée", expanded=True):
+            renditions = st.session_state.get("last_variants")
+            if renditions and len(renditions) > 1:
+                # Variante principale en premier : c'est elle qui est notée, exportée et archivée
+                tabs = st.tabs([f"{v['style']} · {v['lang']}" for v in renditions])
+                for tab, variant in zip(tabs, renditions):
+                    with tab:
+                        st.markdown(variant["text"])
+            else:
+                st.markdown(st.session_state.last_prediction)
+            timings = st.session_state.get("last_timings", {}).get("prediction")
+            if timings and timings["ttft"] is not None:
+                st.caption(f"⏱️ Premier token : {timings['ttft']:.2f} s · Réponse complète : {timings['total']:.2f} s")
+            breakdown = st.session_state.get("quality_breakdown")
+            if breakdown:
+                details = []
+                for name, group in breakdown["groups"].items():
+                    if group["counted"]:
+                        details.append(f"{name} +{group['weight']} ({', '.join(sorted(set(group['hits'])))})")
+                    elif group["negated"]:
+                        details.append(f"{name} nié ({', '.join(sorted(set(group['negated'])))})")
+                st.caption(f"🏅 Score qualité : {breakdown['score']:g} = {breakdown['raw_score']} × "
+                           f"{breakdown['budget_factor']:g} (budget) → {breakdown['tier']}"
+                           + (" · " + " · ".join(details) if details else ""))
+
+        summary_banner = load_image(st.session_state.get("summary_banner_asset"))
+        if summary_banner:
             st.markdown("---")
             st.header("✨ Bannière de Synthèse des Résultats")
-            st.image(st.session_state.summary_banner_path, width='stretch',
-                     caption="Cette bannière de synthèse a été générée par Gemini pour résumer les KPIs.")
+            if st.session_state.get("summary_banner_artistic"):
+                caption = "Cette bannière de synthèse a été générée par Gemini pour résumer les KPIs."
+            else:
+                caption = "Bannière de synthèse générée à partir des KPIs extraits de l'analyse."
+            st.image(summary_banner, width='stretch', caption=caption)
+            original_download_button(st.session_state.summary_banner_asset, "banniere_synthese",
+                                     key="download_summary_banner")
 
-        if st.session_state.generated_asset_path and Path(st.session_state.generated_asset_path).exists():
+        generated_asset = load_image(st.session_state.get("generated_asset"))
+        if generated_asset:
             st.markdown("---")
             st.header("🎨 Visuel Publicitaire Généré")
-            st.image(st.session_state.generated_asset_path, width='stretch',
+            st.image(generated_asset, width='stretch',
                      caption="Ce visuel a été généré par Gemini 2.5 Flash pour illustrer la stratégie.")
+            original_download_button(st.session_state.generated_asset, "visuel_publicitaire",
+                                     key="download_generated_asset")
         
         st.markdown("Voici une représentation visuelle de l'impact de ces stratégies :")
 
-        st.markdown("### 📈 Visualisations Prédictives")
-        # Filtre pour les graphiques
-        mois_filtre = st.slider("Mois à afficher", 1, 6, (1, 6))
-        fig_roi, fig_cpa, fig_conv = generate_advanced_graphs(
-            st.session_state.last_params['budget'],
-            st.session_state.last_params['duration'],
-            st.session_state.last_params['goal'],
-            mois_filtre
-        )
-
-        col1, col2, = st.columns(2)
-        with col1:
-            st.plotly_chart(fig_roi, width='stretch')
-        with col2:
-            st.plotly_chart(fig_cpa, width='stretch')
-        st.plotly_chart(fig_conv, width='stretch')
-
-        if PREMIUM_FEATURES and st.session_state.premium_content:
-            st.markdown("---")
-            st.header("💎 Insights Premium")
-            with st.expander("Afficher les recommandations avancées"):
-                st.markdown(st.session_state.premium_content)
-            
-            st.markdown("Ces insights premium peuvent être illustrés par l'image suivante :")
-
-            st.markdown("### 🛠 Outils Premium")
-            tab1, tab2, tab3 = st.tabs(["Checklist", "Calendrier", "Template"])
-
-            with tab1:
-                st.markdown("""
-                ### Checklist d'Optimisation
-                - [ ] Audit des mots-clés
-                - [ ] Analyse concurrentielle
-                - [ ] Test A/B landing page
-                - [ ] Segmentation audience
-                - [ ] Automatisation CRM
-                """)
-
-            with tab2:
-                st.markdown("""
-                ### Calendrier Editorial
-                | Semaine | Thème Principal | Canaux |
-                |---------|------------------|--------|
-                | 1 | Lancement produit | FB, IG, Email |
-                | 2 | Témoignages clients | LinkedIn, Blog |
-                | 3 | Promotion spéciale | Tous canaux |
-                """)
-
-            with tab3:
-                # Créer le dossier templates s'il n'existe pas
-                templates_dir = Path("templates")
-                templates_dir.mkdir(exist_ok=True)
-                
-                template_path = "templates/marketing_template.docx"
-                if Path(template_path).exists():
-                    with open(template_path, "rb") as f:
-                        st.download_button(
-                            "📥 Template Stratégie Marketing",
-                            data=f,
-                            file_name="template_strategie.docx",
-                            mime="application/octet-stream"
-                        )
-                else:
-                    st.warning("Template non trouvé dans le dossier 'templates'")
-
-        st.markdown("---")
-        st.markdown("### 📤 Exporter le Rapport")
-
-        pdf_buffer = create_simple_pdf(st.session_state.last_prediction)
-
-        if pdf_buffer:
-            col1, col2 = st.columns(2)
-            with col1:
-                st.download_button(
-                    label="💾 Télécharger PDF Complet",
-                    data=pdf_buffer,
-                    file_name=st.session_state.filename_pdf,
-                    mime="application/pdf",
-                    width='stretch'
-                )
-            with col2:
-                if st.button("🔄 Générer une Nouvelle Analyse", width='stretch'):
-                    del st.session_state.last_prediction
-                    st.rerun()
-        else:
-            st.error("Erreur lors de la génération du PDF")
+        display_charts()
+        display_premium_tools()
+        display_export()
 
     # --- Section Historique
-    if 'history' in st.session_state and st.session_state.history:
-        st.sidebar.markdown("---")
-        st.sidebar.markdown("## 📚 Historique")
-
-        for i, analysis in enumerate(reversed(st.session_state.history)):
-            with st.sidebar.expander(f"Analyse #{len(st.session_state.history)-i}", expanded=False):
-                quality_badge = ""
-                if analysis.get('quality') == "excellent":
-                    quality_badge = " 🏆"
-                elif analysis.get('quality') == "good":
-                    quality_badge = " ⭐"
-                
-                st.markdown(f"""
-                **Date**: {analysis['date']}
-                **Budget**: {analysis['params']['budget']} €
-                **Secteur**: {analysis['domain']}
-                **Qualité**: {analysis.get('quality', 'normal').capitalize()}{quality_badge}
-                """)
-                if analysis.get('premium', False):
-                    st.markdown("<span class='premium-badge'>Premium</span>", unsafe_allow_html=True)
+    with st.sidebar:
+        display_history_sidebar()
+        if debug_panel_enabled():
+            display_trace_panel()
 
     # --- Section Contact
     st.markdown("---")
@@ -939,15 +2177,10 @@ def main():
             Algérie
             """)
 
-            # Créer le dossier images s'il n'existe pas
-            images_dir = Path("images")
-            images_dir.mkdir(exist_ok=True)
-            
-            # Insérer le QR Code ici en utilisant le chemin du fichier
-            qr_image_path = "images/qr-code.png"
-            if Path(qr_image_path).exists():
+            qr_image = static_image(QR_CODE_PATH, 150)
+            if qr_image:
                 try:
-                    st.image(qr_image_path, caption="Scannez pour nous contacter", width=150)
+                    st.image(qr_image, caption="Scannez pour nous contacter", width=150)
                 except:
                     st.markdown("""
                     <div style="width:150px; height:150px; background-color:#25D366; 
@@ -1008,14 +2241,10 @@ def main():
         st.markdown("---")
         st.markdown("👉 Développé par : [Sofiane Chehboune](https://www.linkedin.com/in/sofiane-chehboune-5b243766/)")
         
-        # Créer le dossier images s'il n'existe pas
-        images_dir = Path("images")
-        images_dir.mkdir(exist_ok=True)
-        
-        photo_path = "images/sofiane.jpg"
-        if Path(photo_path).exists():
+        photo = static_image(PHOTO_PATH, 100)
+        if photo:
             try:
-                st.image(photo_path, width=100)
+                st.image(photo, width=100)
             except:
                 st.markdown("""
                 <div style="width:100px; height:100px; background-color:#4F46E5; 
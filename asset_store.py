@@ -0,0 +1,173 @@
+# --- Stockage des images générées
+# Les images sont conservées encodées en mémoire, identifiées par le hash de
+# leur contenu et rattachées aux sessions qui les ont produites. Un budget
+# d'octets par processus borne la mémoire (éviction LRU) ; les entrées évincées
+# peuvent être déversées sur disque puis rechargées à la demande. Le disque a
+# son propre budget : au-delà, les fichiers les moins récemment utilisés sont
+# supprimés et l'asset est oublié.
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_MAX_DISK_BYTES = 256 * 1024 * 1024
+
+
+class AssetStore:
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, spill_dir=None, max_disk_bytes=DEFAULT_MAX_DISK_BYTES):
+        self.max_bytes = max_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.spill_dir = Path(spill_dir) if spill_dir else None
+        if self.spill_dir:
+            self.spill_dir.mkdir(parents=True, exist_ok=True)
+            # Fichiers d'un processus précédent : plus aucune session n'y a accès
+            for path in self.spill_dir.glob("*.bin"):
+                path.unlink(missing_ok=True)
+        self._memory = OrderedDict()   # asset_id -> octets encodés
+        self._owners = {}              # asset_id -> sessions autorisées
+        self._mimes = {}               # asset_id -> type MIME
+        self._spilled = OrderedDict()  # asset_id -> taille du fichier déversé (ordre LRU)
+        self._bytes = 0
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"puts": 0, "hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "disk_evictions": 0}
+
+    @staticmethod
+    def asset_id_for(data):
+        return hashlib.sha256(data).hexdigest()[:32]
+
+    def put(self, session_id, data, mime="image/png"):
+        """Enregistre des octets pour une session et retourne leur identifiant stable."""
+        asset_id = self.asset_id_for(data)
+        with self._lock:
+            self.stats["puts"] += 1
+            self._owners.setdefault(asset_id, set()).add(session_id)
+            self._mimes[asset_id] = mime
+            if asset_id in self._memory:
+                self._memory.move_to_end(asset_id)
+            else:
+                self._memory[asset_id] = data
+                self._bytes += len(data)
+                self._evict()
+        return asset_id
+
+    def get(self, session_id, asset_id):
+        """Retourne les octets d'un asset si la session y a accès, sinon None."""
+        if not asset_id:
+            return None
+        with self._lock:
+            if session_id not in self._owners.get(asset_id, ()):
+                self.stats["misses"] += 1
+                return None
+            data = self._memory.get(asset_id)
+            if data is not None:
+                self._memory.move_to_end(asset_id)
+                self.stats["hits"] += 1
+                return data
+            if asset_id in self._spilled:
+                try:
+                    data = self._spill_path(asset_id).read_bytes()
+                except OSError:
+                    self._disk_bytes -= self._spilled.pop(asset_id)
+                else:
+                    self._spilled.move_to_end(asset_id)
+                    self.stats["disk_hits"] += 1
+                    self._memory[asset_id] = data
+                    self._bytes += len(data)
+                    self._evict()
+                    return data
+            self.stats["misses"] += 1
+            return None
+
+    def mime(self, asset_id):
+        return self._mimes.get(asset_id)
+
+    def grant(self, session_id, asset_id):
+        """Donne à une session l'accès à un asset déjà enregistré ; False s'il est inconnu."""
+        with self._lock:
+            owners = self._owners.get(asset_id)
+            if owners is None:
+                return False
+            owners.add(session_id)
+            return True
+
+    def drop_session(self, session_id):
+        """Retire l'accès d'une session ; les assets qui n'ont plus de propriétaire sont supprimés."""
+        with self._lock:
+            for asset_id in [a for a, owners in self._owners.items() if session_id in owners]:
+                owners = self._owners[asset_id]
+                owners.discard(session_id)
+                if not owners:
+                    self._forget(asset_id)
+
+    def memory_usage(self):
+        return self._bytes
+
+    def disk_usage(self):
+        return self._disk_bytes
+
+    def session_usage(self, session_id):
+        """Octets en mémoire des assets accessibles à une session (partagés compris)."""
+        with self._lock:
+            return sum(len(self._memory[asset_id]) for asset_id, owners in self._owners.items()
+                       if session_id in owners and asset_id in self._memory)
+
+    def _spill_path(self, asset_id):
+        return self.spill_dir / f"{asset_id}.bin"
+
+    def _forget(self, asset_id):
+        data = self._memory.pop(asset_id, None)
+        if data is not None:
+            self._bytes -= len(data)
+        if asset_id in self._spilled:
+            self._disk_bytes -= self._spilled.pop(asset_id)
+            self._spill_path(asset_id).unlink(missing_ok=True)
+        self._owners.pop(asset_id, None)
+        self._mimes.pop(asset_id, None)
+
+    def _spill(self, asset_id, data):
+        """Déverse un asset sur disque ; False si l'écriture échoue."""
+        try:
+            self._spill_path(asset_id).write_bytes(data)
+        except OSError as e:
+            logger.warning("Impossible de déverser l'asset %s sur disque : %s", asset_id, e)
+            return False
+        self._disk_bytes += len(data) - self._spilled.pop(asset_id, 0)
+        self._spilled[asset_id] = len(data)
+        while self._disk_bytes > self.max_disk_bytes and len(self._spilled) > 1:
+            oldest, size = self._spilled.popitem(last=False)
+            self._disk_bytes -= size
+            self._spill_path(oldest).unlink(missing_ok=True)
+            self.stats["disk_evictions"] += 1
+            if oldest not in self._memory:
+                self._owners.pop(oldest, None)
+                self._mimes.pop(oldest, None)
+        return True
+
+    def _evict(self):
+        # On garde toujours au moins l'entrée la plus récente, même si elle dépasse le budget
+        while self._bytes > self.max_bytes and len(self._memory) > 1:
+            asset_id, data = self._memory.popitem(last=False)
+            self._bytes -= len(data)
+            self.stats["evictions"] += 1
+            if self.spill_dir and self._spill(asset_id, data):
+                continue
+            self._owners.pop(asset_id, None)
+            self._mimes.pop(asset_id, None)
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_asset_store(**kwargs):
+    """Instance partagée par toutes les sessions du processus."""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = AssetStore(**kwargs)
+        return _default_store
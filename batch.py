@@ -0,0 +1,257 @@
+# --- Mode batch (sans interface)
+# Évalue une grille de variantes de campagnes avec les mêmes fonctions que
+# l'application (generate_prediction, evaluate_results_quality,
+# generate_premium_insights), avec une concurrence bornée, reprise sur
+# point de contrôle et écriture des résultats au fil de l'eau.
+#
+#   python batch.py --grid grille.json --out resultats.jsonl [--parquet resultats.parquet]
+#   python batch.py --csv campagnes.csv --out resultats.jsonl --concurrency 4 --premium
+import argparse
+import csv
+import hashlib
+import itertools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+
+# Les messages Streamlit (« missing ScriptRunContext ») n'ont pas de sens hors de l'interface
+logging.getLogger("streamlit").setLevel(logging.ERROR)
+
+import app  # noqa: E402
+import gemini_clients  # noqa: E402
+
+PARAM_FIELDS = ["budget", "audience", "duration", "goal", "domain", "style", "lang"]
+DEFAULTS = {
+    "budget": 15000,
+    "audience": app.AUDIENCE_OPTIONS[0],
+    "duration": app.DURATION_OPTIONS[0],
+    "goal": app.GOAL_OPTIONS[0],
+    "domain": app.DOMAIN_OPTIONS[0],
+    "style": app.STYLE_OPTIONS[0],
+    "lang": app.LANG_OPTIONS[0],
+}
+
+
+def normalize_job(raw):
+    job = dict(DEFAULTS)
+    job.update({k: v for k, v in raw.items() if k in PARAM_FIELDS and v not in (None, "")})
+    job["budget"] = int(float(job["budget"]))
+    job["duration"] = int(float(job["duration"]))
+    return job
+
+
+def job_id(job, model_name, premium, structured=False):
+    payload = json.dumps([model_name, premium] + [job[k] for k in PARAM_FIELDS] + ([True] if structured else []),
+                         ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def load_jobs(grid_path=None, csv_path=None):
+    """Produit exprimé soit par une grille JSON ({"budget": [5000, 10000], ...}), soit par un CSV."""
+    if grid_path:
+        grid = json.loads(Path(grid_path).read_text(encoding="utf-8"))
+        axes = {k: (v if isinstance(v, list) else [v]) for k, v in grid.items() if k in PARAM_FIELDS}
+        unknown = set(grid) - set(PARAM_FIELDS)
+        if unknown:
+            raise ValueError(f"Paramètres inconnus dans la grille : {', '.join(sorted(unknown))}")
+        keys = list(axes)
+        return [normalize_job(dict(zip(keys, values))) for values in itertools.product(*axes.values())]
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        return [normalize_job(row) for row in csv.DictReader(f)]
+
+
+def read_checkpoint(out_path):
+    """Résultats déjà présents dans le journal JSONL (les échecs seront rejoués)."""
+    done = {}
+    if Path(out_path).exists():
+        with open(out_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Ligne tronquée par une interruption
+                if not row.get("error"):
+                    done[row["id"]] = row
+    return done
+
+
+class ResultWriter:
+    """Ajoute chaque résultat au journal JSONL et, en option, à un fichier Parquet par groupes de lignes."""
+
+    def __init__(self, out_path, parquet_path=None, previous_rows=(), flush_every=20):
+        self._lock = threading.Lock()
+        self._jsonl = open(out_path, "a", encoding="utf-8")
+        self._parquet_path = parquet_path
+        self._parquet = None
+        self._pending = []
+        self._flush_every = flush_every
+        if parquet_path:
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                raise SystemExit("L'export Parquet nécessite pyarrow : pip install pyarrow")
+            # Le fichier Parquet est réécrit : on y reporte d'abord les résultats déjà journalisés
+            self._pending.extend(previous_rows)
+            self._flush_parquet()
+
+    def write(self, row):
+        with self._lock:
+            self._jsonl.write(json.dumps(row, ensure_ascii=False) + "\n")
+            self._jsonl.flush()
+            if self._parquet_path:
+                self._pending.append(row)
+                if len(self._pending) >= self._flush_every:
+                    self._flush_parquet()
+
+    def _flush_parquet(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if not self._pending:
+            return
+        # Les KPIs imbriqués sont stockés en JSON dans une colonne texte
+        rows = [{**row, "kpis": json.dumps(row.get("kpis"), ensure_ascii=False) if row.get("kpis") else None}
+                for row in self._pending]
+        table = pa.Table.from_pylist(rows, schema=self._schema())
+        if self._parquet is None:
+            self._parquet = pq.ParquetWriter(self._parquet_path, table.schema)
+        self._parquet.write_table(table)
+        self._pending = []
+
+    @staticmethod
+    def _schema():
+        import pyarrow as pa
+
+        return pa.schema([
+            ("id", pa.string()), ("model", pa.string()),
+            ("budget", pa.int64()), ("audience", pa.string()), ("duration", pa.int64()),
+            ("goal", pa.string()), ("domain", pa.string()), ("style", pa.string()), ("lang", pa.string()),
+            ("quality", pa.string()), ("prediction", pa.string()), ("kpis", pa.string()),
+            ("premium_content", pa.string()), ("reused_from_budget", pa.int64()),
+            ("error", pa.string()), ("duration_s", pa.float64()), ("completed_at", pa.string()),
+        ])
+
+    def close(self):
+        with self._lock:
+            if self._parquet_path:
+                self._flush_parquet()
+                if self._parquet is not None:
+                    self._parquet.close()
+            self._jsonl.close()
+
+
+def run_job(model, job, premium, use_cache, structured=False):
+    started = time.perf_counter()
+    params = {k: job[k] for k in ("budget", "audience", "duration", "goal")}
+    row = {"id": None, "model": app.model_name_of(model), **job,
+           "quality": None, "prediction": None, "kpis": None, "premium_content": None,
+           "reused_from_budget": None, "error": None}
+    try:
+        result = app.generate_prediction_with_kpis(model, params, job["style"], job["lang"], job["domain"],
+                                                   use_cache, structured=structured)
+        if result is None:
+            row["error"] = "Aucune réponse du modèle"
+        else:
+            row["prediction"] = result["text"]
+            row["kpis"] = result["kpis"]
+            row["reused_from_budget"] = (result.get("reused_from") or {}).get("budget")
+            row["quality"] = app.evaluate_results_quality(result["text"], job["budget"])
+            if premium:
+                row["premium_content"] = app.generate_premium_insights(model, params, job["domain"], use_cache)
+    except Exception as e:
+        row["error"] = f"{type(e).__name__}: {e}"
+    row["duration_s"] = round(time.perf_counter() - started, 3)
+    row["completed_at"] = datetime.now().isoformat(timespec="seconds")
+    return row
+
+
+def resolve_api_key(cli_value):
+    if cli_value:
+        return cli_value
+    if os.environ.get("GEMINI_API_KEY"):
+        return os.environ["GEMINI_API_KEY"]
+    try:
+        return app.st.secrets["GEMINI_API_KEY"]
+    except Exception:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyse en lot de variantes de campagnes marketing.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--grid", help="Grille JSON : {paramètre: [valeurs]} (produit cartésien)")
+    source.add_argument("--csv", help="CSV avec les colonnes " + ", ".join(PARAM_FIELDS))
+    parser.add_argument("--out", required=True, help="Journal JSONL des résultats (sert aussi de point de reprise)")
+    parser.add_argument("--parquet", help="Export Parquet supplémentaire (nécessite pyarrow)")
+    parser.add_argument("--model", default=app.MODEL_OPTIONS[0])
+    parser.add_argument("--concurrency", type=int, default=4, help="Nombre d'analyses simultanées")
+    parser.add_argument("--premium", action="store_true", help="Générer aussi les insights premium")
+    parser.add_argument("--structured", action="store_true", help="Demander les KPIs en JSON (sinon extraits du texte)")
+    parser.add_argument("--no-cache", action="store_true", help="Ignorer le cache de réponses")
+    parser.add_argument("--neighbors", action="store_true",
+                        help="Réutiliser l'analyse d'une campagne voisine (même tranche de budget), montants ajustés")
+    parser.add_argument("--api-key", help="Clé Gemini (sinon GEMINI_API_KEY ou .streamlit/secrets.toml)")
+    parser.add_argument("--backend", choices=gemini_clients.BACKENDS, default=app.GEMINI_BACKEND,
+                        help="API réelle, simulateur local, ou enregistrement / rejeu d'une cassette")
+    parser.add_argument("--cassette", default=app.GEMINI_CASSETTE_PATH, help="Cassette des backends record et replay")
+    args = parser.parse_args(argv)
+    if not args.neighbors:
+        # Une grille explore justement des budgets proches : chaque variante reçoit sa propre analyse
+        app.NEIGHBOR_BANDS = {}
+
+    gemini_clients.set_backend(args.backend, args.cassette, **app.GEMINI_STANDIN_OPTIONS)
+    api_key = resolve_api_key(args.api_key)
+    if not api_key and args.backend not in gemini_clients.LOCAL_BACKENDS:
+        parser.error("Clé API Gemini introuvable (--api-key, GEMINI_API_KEY ou .streamlit/secrets.toml)")
+    gemini_clients.configure(api_key, app.GEMINI_TRANSPORT)
+    model = gemini_clients.get_model(args.model, app.GENERATION_CONFIG)
+
+    jobs = load_jobs(args.grid, args.csv)
+    done = read_checkpoint(args.out)
+    todo = []
+    for job in jobs:
+        jid = job_id(job, args.model, args.premium, args.structured)
+        if jid not in done:
+            todo.append((jid, job))
+    print(f"{len(jobs)} variantes, {len(jobs) - len(todo)} déjà traitées, {len(todo)} à lancer "
+          f"(concurrence : {args.concurrency})", file=sys.stderr)
+
+    writer = ResultWriter(args.out, args.parquet, previous_rows=done.values())
+    started = time.perf_counter()
+    completed = failed = 0
+    executor = ThreadPoolExecutor(max_workers=args.concurrency, thread_name_prefix="batch")
+    try:
+        futures = {executor.submit(run_job, model, job, args.premium, not args.no_cache, args.structured): jid
+                   for jid, job in todo}
+        for future in as_completed(futures):
+            row = future.result()
+            row["id"] = futures[future]
+            writer.write(row)
+            completed += 1
+            failed += bool(row["error"])
+            elapsed = time.perf_counter() - started
+            print(f"[{completed}/{len(todo)}] {row['domain']} · {row['budget']} € · {row['quality'] or 'échec'} "
+                  f"— {60 * completed / elapsed:.1f} analyses/min", file=sys.stderr)
+    except KeyboardInterrupt:
+        print("Interruption : les résultats déjà écrits seront repris au prochain lancement.", file=sys.stderr)
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    finally:
+        executor.shutdown(wait=True)
+        writer.close()
+
+    elapsed = time.perf_counter() - started
+    rate = 60 * completed / elapsed if elapsed else 0.0
+    print(f"Terminé : {completed} analyses ({failed} échecs) en {elapsed:.1f} s — {rate:.1f} analyses/min",
+          file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+# --- Benchmark : image de célébration
+# Compare le rendu historique (grille ligne par ligne, 100 ellipses, polices
+# et logo rechargés, écriture PNG sur disque) au rendu pré-calculé actuel.
+#
+#   python benchmarks/bench_celebration.py [--runs 50]
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+os.chdir(ROOT)
+
+from PIL import Image, ImageDraw, ImageFont  # noqa: E402
+
+import app  # noqa: E402
+
+
+def legacy_generate_celebration_image(result_quality, output_path):
+    """Copie de l'ancienne implémentation (sans les appels Streamlit), pour référence."""
+    width, height = 800, 400
+    img = Image.new('RGB', (width, height), (26, 28, 40))
+    draw = ImageDraw.Draw(img)
+    grid_color = (40, 42, 58)
+    for x in range(0, width, 40):
+        draw.line([(x, 0), (x, height)], fill=grid_color, width=1)
+    for y in range(0, height, 40):
+        draw.line([(0, y), (width, y)], fill=grid_color, width=1)
+    try:
+        gemini_logo = Image.open("images/google_ai_gemini_logo.png").convert("RGBA")
+        gemini_logo.thumbnail((80, 80))
+    except IOError:
+        gemini_logo = None
+    accent_color, message, badge = app.CELEBRATION_TIERS[result_quality]
+    font_path, bold_font_path = "fonts/DejaVuSans.ttf", "fonts/DejaVuSans-Bold.ttf"
+    font_large = ImageFont.truetype(bold_font_path, 42)
+    font_medium = ImageFont.truetype(font_path, 22)
+    font_small = ImageFont.truetype(font_path, 18)
+    if gemini_logo:
+        img.paste(gemini_logo, (width - gemini_logo.width - 40, 40), gemini_logo)
+    draw.rectangle([(40, 80), (45, height - 80)], fill=accent_color)
+    draw.text((60, 100), message, font=font_large, fill="#FFFFFF")
+    draw.text((60, 160), "Votre stratégie marketing est prête !", font=font_medium, fill="#E5E7EB")
+    for _ in range(100):
+        x_pos = random.randint(0, width)
+        y_pos = random.randint(0, height)
+        size = random.uniform(0.5, 2.5)
+        r, g, b = int(accent_color[1:3], 16), int(accent_color[3:5], 16), int(accent_color[5:7], 16)
+        particle_color = (random.randint(r, 255), random.randint(g, 255), random.randint(b, 255))
+        draw.ellipse([x_pos, y_pos, x_pos + size, y_pos + size], fill=particle_color)
+    draw.text((60, height - 120), f"Qualité des résultats : {result_quality.capitalize()} {badge}",
+              font=font_small, fill=accent_color)
+    draw.text((width - 180, height - 40), "Powered by Gemini", font=font_small, fill="#AAAAAA")
+    img.save(output_path, "PNG")
+    return output_path
+
+
+def measure(func, runs):
+    timings = []
+    for i in range(runs):
+        start = time.perf_counter()
+        func(i)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return {
+        "mean_ms": 1000 * sum(timings) / len(timings),
+        "p50_ms": 1000 * timings[len(timings) // 2],
+        "max_ms": 1000 * timings[-1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+
+    tiers = list(app.CELEBRATION_TIERS)
+    with tempfile.TemporaryDirectory() as tmp:
+        output_path = os.path.join(tmp, "celebration.png")
+        results = {
+            "ancien rendu": measure(lambda i: legacy_generate_celebration_image(tiers[i % 3], output_path), args.runs),
+        }
+
+    app.render_celebration_png.clear()
+    app._celebration_base_layer.clear()
+    results["nouveau, à froid (graine différente)"] = measure(
+        lambda i: app.generate_celebration_image(tiers[i % 3], seed=1000 + i), args.runs)
+    results["nouveau, niveau en cache"] = measure(
+        lambda i: app.generate_celebration_image(tiers[i % 3]), args.runs)
+
+    print(f"{'Variante':<40}{'moyenne':>12}{'p50':>12}{'max':>12}")
+    for name, r in results.items():
+        print(f"{name:<40}{r['mean_ms']:>10.2f}ms{r['p50_ms']:>10.2f}ms{r['max_ms']:>10.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
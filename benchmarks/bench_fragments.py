@@ -0,0 +1,92 @@
+# --- Benchmark : coût d'une interaction sur la page de résultats
+# Compare un rerun complet de la page de résultats au rerun d'un seul
+# fragment (graphiques, outils premium, export, historique), ce que
+# Streamlit exécute quand on déplace le filtre de mois, qu'on télécharge un
+# fichier ou qu'on change de page d'historique. Chaque fragment est exécuté
+# seul dans un script AppTest ; un script vide donne le coût fixe du harnais.
+#
+#   python benchmarks/bench_fragments.py [--runs 10]
+import argparse
+import logging
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+logging.getLogger("streamlit").setLevel(logging.ERROR)
+
+import gemini_clients  # noqa: E402
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+# Pas de préchauffage réseau : aucune clé réelle n'est utilisée
+gemini_clients.warm_up = lambda *args, **kwargs: None
+
+RESULT_STATE = {
+    "last_prediction": "ROI estimé : 120% à 180%. CPA moyen : 12 €. Stratégie efficace et rentable.",
+    "last_kpis": None,
+    "last_params": {"budget": 15000, "audience": "25-34 ans", "duration": 30, "goal": "Conversion"},
+    "domain": "Général",
+    "filename_pdf": "rapport.pdf",
+    "premium_content": "### Recommandations\n- Audit des mots-clés\n- Tests A/B",
+    "result_quality": "good",
+    "last_timings": {},
+}
+
+# app.py n'est importé qu'au premier run : les runs suivants n'exécutent que la section
+SECTION_SCRIPT = """
+import sys
+sys.path.insert(0, {root!r})
+import app
+section = {section!r}
+if section:
+    with app.st.sidebar if section == "display_history_sidebar" else app.st.container():
+        getattr(app, section)()
+"""
+
+# Fragment exécuté par chaque interaction
+SECTIONS = {
+    "harnais seul (script vide)": None,
+    "filtre de mois": "display_charts",
+    "outils premium": "display_premium_tools",
+    "export PDF": "display_export",
+    "historique (sidebar)": "display_history_sidebar",
+}
+
+
+def prepared(at):
+    at.secrets["GEMINI_API_KEY"] = "bench"
+    for key, value in RESULT_STATE.items():
+        at.session_state[key] = value
+    at.run()
+    return at
+
+
+def measure(at, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        at.run()
+        if at.exception:
+            raise SystemExit(f"Exception dans l'application : {at.exception[0].value}")
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    full = measure(prepared(AppTest.from_file(str(ROOT / "app.py"), default_timeout=120)), args.runs)
+    print(f"{'Interaction':<36}{'temps':>10}{'gain':>10}")
+    print(f"{'rerun complet (page de résultats)':<36}{full * 1000:>8.1f}ms{'1.0x':>10}")
+    for label, section in SECTIONS.items():
+        script = SECTION_SCRIPT.format(root=str(ROOT), section=section)
+        elapsed = measure(prepared(AppTest.from_string(script, default_timeout=120)), args.runs)
+        print(f"{label:<36}{elapsed * 1000:>8.1f}ms{full / elapsed:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,372 @@
+# --- Test de charge : N sessions simultanées dans un seul processus
+# Chaque session est un AppTest qui exécute app.py comme un navigateur le
+# ferait : affichage de l'accueil, clic sur « Lancer l'Analyse » (paramètres
+# propres à la session, cache ignoré), déplacement du filtre de mois puis
+# téléchargement du PDF. Le modèle est le simulateur local (gemini_standin),
+# qui marque chaque réponse avec la référence de son prompt : on vérifie
+# ainsi que chaque session reçoit sa prédiction, ses images, son historique
+# et son PDF, et jamais ceux d'une autre.
+#
+#   python benchmarks/bench_load.py [--sessions 1,5,10] [--rounds 2] [--latency 0.8]
+#                                   [--error-rate 0.05] [--quotas] [--json charge.json]
+#
+# Par palier : débit (analyses/min), percentiles de latence de chaque action,
+# mémoire (RSS du processus et part de chaque session) et incohérences
+# détectées. Le script se termine en erreur si une incohérence est trouvée.
+import argparse
+import contextlib
+import json
+import logging
+import math
+import os
+import pickle
+import re
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest.mock import MagicMock
+
+ROOT = Path(__file__).resolve().parents[1]
+CALLER_DIR = Path.cwd()
+sys.path.insert(0, str(ROOT))
+os.chdir(ROOT)
+logging.getLogger("streamlit").setLevel(logging.ERROR)
+
+import gemini_clients  # noqa: E402
+from asset_store import get_asset_store  # noqa: E402
+from gemini_standin import prompt_reference  # noqa: E402
+from history_store import get_history_store  # noqa: E402
+from response_cache import get_response_cache  # noqa: E402
+import streamlit as st  # noqa: E402
+from streamlit.components.v2.component_manager import BidiComponentManager  # noqa: E402
+from streamlit.runtime import Runtime  # noqa: E402
+from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager  # noqa: E402
+from streamlit.runtime.dataframe_source_manager import DataframeSourceManager  # noqa: E402
+from streamlit.runtime.media_file_manager import MediaFileManager  # noqa: E402
+from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage  # noqa: E402
+from streamlit.runtime.scriptrunner.script_cache import ScriptCache  # noqa: E402
+from streamlit.runtime.secrets import Secrets  # noqa: E402
+from streamlit.testing.v1 import AppTest, app_test, local_script_runner  # noqa: E402
+from streamlit.testing.v1.util import patch_config_options  # noqa: E402
+from tracing import get_tracer  # noqa: E402
+
+# Rien n'est écrit dans .cache : historique et réponses en mémoire, pas de journal de traces
+get_response_cache(path=None)
+get_history_store(path=":memory:")
+get_tracer(log_path=None, metrics_path=None)
+gemini_clients.warm_up = lambda *args, **kwargs: None
+
+import app  # noqa: E402
+
+for name in list(logging.root.manager.loggerDict):
+    if name.startswith("streamlit"):
+        logging.getLogger(name).setLevel(logging.ERROR)
+
+ACTIONS = ("accueil", "lancer", "filtre de mois", "téléchargement PDF")
+BUDGET_STEPS = (50000 - 1000) // 500 + 1
+
+# --- Adaptations d'AppTest pour plusieurs sessions dans le même processus
+# AppTest est prévu pour un test à la fois : chaque run installe puis retire
+# un Runtime factice, des secrets et une option de configuration globaux, et
+# toutes ses sessions portent le même identifiant et compilent le script
+# chacune de leur côté. Ici, comme dans le serveur Streamlit, un seul Runtime
+# (et donc un seul gestionnaire de fichiers servis) et un seul cache de
+# bytecode servent toutes les sessions ; secrets et configuration sont
+# installés une fois pour toutes, et chaque thread impose son identifiant.
+class _RuntimeSlot:
+    _instance = None   # Reçoit les Runtime factices d'AppTest, qui ne servent plus
+
+
+media_storage = MemoryMediaFileStorage("/mock/media")
+shared_runtime = MagicMock(spec=Runtime)
+shared_runtime.media_file_mgr = MediaFileManager(media_storage)
+shared_runtime.dataframe_source_mgr = DataframeSourceManager()
+shared_runtime.cache_storage_manager = MemoryCacheStorageManager()
+shared_runtime.bidi_component_registry = BidiComponentManager()
+shared_runtime.bidi_component_registry.discover_and_register_components(start_file_watching=False)
+Runtime._instance = shared_runtime
+app_test.Runtime = _RuntimeSlot
+
+_app_test_config = patch_config_options({"global.appTest": True})   # Gardé : le patch dure tout le test
+_app_test_config.__enter__()
+app_test.patch_config_options = lambda options: contextlib.nullcontext()
+
+_session = threading.local()
+_script_cache = ScriptCache()
+_original_runner_init = local_script_runner.LocalScriptRunner.__init__
+
+
+def _runner_init(self, *args, **kwargs):
+    _original_runner_init(self, *args, **kwargs)
+    self._session_id = getattr(_session, "id", self._session_id)
+    self._script_cache = _script_cache
+
+
+local_script_runner.LocalScriptRunner.__init__ = _runner_init
+
+
+def install_secrets(values):
+    # Secrets globaux, communs à toutes les sessions (les AppTest n'en reçoivent pas)
+    secrets = Secrets()
+    secrets._secrets = values
+    st.secrets = secrets
+
+
+def downloaded_bytes(url):
+    try:
+        return media_storage.get_file(url.rsplit("/", 1)[-1]).content
+    except Exception:
+        return None
+
+
+_PDF_VOLATILE = re.compile(rb"/CreationDate \(D:\d+Z?\)|/ID \[<[0-9A-F]+><[0-9A-F]+>\]")
+
+
+def same_pdf(a, b):
+    """Même rapport, à la date de création et à l'identifiant de fichier près."""
+    return _PDF_VOLATILE.sub(b"", a) == _PDF_VOLATILE.sub(b"", b)
+
+
+# --- Une session
+def session_params(number):
+    return {
+        "budget": 1000 + 500 * (number % BUDGET_STEPS),
+        "audience": app.AUDIENCE_OPTIONS[0],
+        "duration": app.DURATION_OPTIONS[0],
+        "goal": app.GOAL_OPTIONS[(number // BUDGET_STEPS) % len(app.GOAL_OPTIONS)],
+    }
+
+
+def widget(elements, label):
+    return next(element for element in elements if element.label == label)
+
+
+def session_state_bytes(at):
+    total = 0
+    for key in at.session_state._state.filtered_state:
+        try:
+            total += len(pickle.dumps(at.session_state[key]))
+        except Exception:
+            continue
+    return total
+
+
+class Session:
+    def __init__(self, index, first_number, args):
+        self.id = f"charge-{index}"
+        self.first_number = first_number
+        self.args = args
+        self.timings = {action: [] for action in ACTIONS}
+        self.anomalies = []
+        self.analyses = 0
+        self.budgets = set()
+        self.state_bytes = 0
+        self.asset_bytes = 0
+        self.downloads = []   # (octets téléchargés, prédiction) vérifiés après les mesures
+
+    def timed(self, action, func):
+        start = time.perf_counter()
+        at = func()
+        self.timings[action].append(time.perf_counter() - start)
+        if at.exception:
+            self.anomalies.append(f"{action} : exception {at.exception[0].value}")
+        for error in at.error:
+            self.anomalies.append(f"{action} : erreur affichée « {error.value} »")
+        return at
+
+    def run(self):
+        _session.id = self.id
+        at = AppTest.from_file(str(ROOT / "app.py"), default_timeout=self.args.timeout)
+        self.timed("accueil", at.run)
+        widget(at.checkbox, "♻️ Ignorer le cache").check()
+
+        for number in range(self.first_number, self.first_number + self.args.rounds):
+            params = session_params(number)
+            widget(at.slider, "Budget (EUR)").set_value(params["budget"])
+            widget(at.selectbox, "Objectif Principal").set_value(params["goal"])
+            launch = next(b for b in at.button if "Lancer" in b.label)
+            self.timed("lancer", launch.click().run)
+            self.budgets.add(params["budget"])
+            if "last_prediction" not in at.session_state:
+                self.anomalies.append(f"analyse {number} : aucun résultat")
+                continue
+            self.analyses += 1
+            self.check_results(at, params)
+
+            self.timed("filtre de mois", widget(at.slider, "Mois à afficher").set_value((2, 5)).run)
+            pdf_button = self.pdf_button(at)
+            if pdf_button is None:
+                self.anomalies.append(f"analyse {number} : PDF toujours en préparation")
+                continue
+            self.timed("téléchargement PDF", pdf_button.click().run)
+            self.downloads.append((downloaded_bytes(pdf_button.proto.url), app.build_pdf_report(at.session_state, self.id)))
+
+        self.check_history(at)
+        self.state_bytes = session_state_bytes(at)
+        self.asset_bytes = get_asset_store().session_usage(self.id)
+        return self
+
+    def pdf_button(self, at):
+        # AppTest ignore run_every : on relance comme le fragment d'attente jusqu'au bouton
+        deadline = time.monotonic() + self.args.timeout
+        while True:
+            buttons = [b for b in at.get("download_button") if "PDF" in b.label]
+            if buttons or time.monotonic() > deadline:
+                return buttons[0] if buttons else None
+            time.sleep(app.PDF_POLL_SECONDS)
+            at.run()
+
+    def check_results(self, at, params):
+        state = at.session_state
+        if state["last_params"] != params:
+            self.anomalies.append(f"paramètres d'une autre analyse : {state['last_params']} au lieu de {params}")
+        expected = prompt_reference(app.build_prediction_prompt(params, "Formel", "Français", "Général"))
+        if expected not in state["last_prediction"]:
+            self.anomalies.append(f"prédiction d'une autre session (budget {params['budget']})")
+        for key in ("celebration_asset", "generated_asset", "summary_banner_asset"):
+            asset_id = state[key] if key in state else None
+            if asset_id and get_asset_store().get(self.id, asset_id) is None:
+                self.anomalies.append(f"{key} inaccessible pour la session")
+
+    def check_downloads(self):
+        # Hors mesure : le rendu de référence chargerait le processus pendant le test
+        for data, report in self.downloads:
+            if not data or not data.startswith(b"%PDF"):
+                self.anomalies.append("PDF téléchargé absent ou invalide")
+            elif not same_pdf(data, app.render_pdf_bytes(report)):
+                self.anomalies.append("PDF téléchargé différent du rapport de la session")
+
+    def check_history(self, at):
+        owner = at.session_state["history_owner"]
+        rows = get_history_store().page(owner, page_size=self.args.rounds + 10)
+        if len(rows) != self.analyses:
+            self.anomalies.append(f"historique : {len(rows)} analyses au lieu de {self.analyses}")
+        foreign = [row["budget"] for row in rows if row["budget"] not in self.budgets]
+        if foreign:
+            self.anomalies.append(f"historique : analyses d'une autre session (budgets {foreign})")
+
+
+# --- Mesures
+def current_rss():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low = math.floor(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def run_level(n_sessions, first_number, args):
+    rss_before = current_rss()
+    sessions = [Session(i, first_number + i * args.rounds, args) for i in range(n_sessions)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=n_sessions, thread_name_prefix="session") as executor:
+        futures = []
+        for i, session in enumerate(sessions):
+            futures.append(executor.submit(session.run))
+            if args.ramp_up and i < n_sessions - 1:
+                time.sleep(args.ramp_up / n_sessions)
+        for session, future in zip(sessions, futures):
+            try:
+                future.result()
+            except Exception as e:
+                session.anomalies.append(f"session interrompue : {type(e).__name__}: {e}")
+    elapsed = time.perf_counter() - started
+    rss_after = current_rss()
+    for session in sessions:
+        session.check_downloads()
+
+    analyses = sum(s.analyses for s in sessions)
+    latencies = {}
+    for action in ACTIONS:
+        values = [t for s in sessions for t in s.timings[action]]
+        if values:
+            latencies[action] = {"n": len(values), "p50_s": percentile(values, 50), "p95_s": percentile(values, 95),
+                                 "p99_s": percentile(values, 99), "max_s": max(values)}
+    return {
+        "sessions": n_sessions,
+        "analyses": analyses,
+        "elapsed_s": elapsed,
+        "analyses_per_min": 60 * analyses / elapsed if elapsed else 0.0,
+        "latency": latencies,
+        "rss_delta_per_session_kib": (rss_after - rss_before) / 1024 / n_sessions,
+        "session_state_kib": statistics.fmean(s.state_bytes for s in sessions) / 1024,
+        "session_assets_kib": statistics.fmean(s.asset_bytes for s in sessions) / 1024,
+        "anomalies": {s.id: s.anomalies for s in sessions if s.anomalies},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sessions", default="1,5,10", help="Paliers de sessions simultanées (ex. 1,5,10,20)")
+    parser.add_argument("--rounds", type=int, default=2, help="Analyses lancées par session")
+    parser.add_argument("--latency", type=float, default=0.8, help="Latence médiane des réponses texte (s)")
+    parser.add_argument("--image-latency", type=float, default=4.0, help="Latence médiane des images (s)")
+    parser.add_argument("--jitter", type=float, default=0.3, help="Dispersion log-normale des latences")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Proportion d'erreurs 429 simulées")
+    parser.add_argument("--ramp-up", type=float, default=0.0, help="Durée d'arrivée des sessions d'un palier (s)")
+    parser.add_argument("--quotas", action="store_true",
+                        help="Appliquer les quotas Gemini de l'application (sinon seule la capacité du processus compte)")
+    parser.add_argument("--timeout", type=float, default=300, help="Durée maximale d'un run de script (s)")
+    parser.add_argument("--json", help="Fichier où enregistrer les résultats")
+    args = parser.parse_args()
+
+    install_secrets({
+        "GEMINI_BACKEND": "local",
+        "gemini_standin": {
+            "latency": {"distribution": "lognormal", "median": args.latency, "sigma": args.jitter},
+            "image_latency": {"distribution": "lognormal", "median": args.image_latency, "sigma": args.jitter},
+            "error_rate": args.error_rate,
+            "retry_after": 1.0,
+            "tag_responses": True,
+        },
+    })
+    if not args.quotas:
+        from rate_limiter import get_scheduler
+
+        get_scheduler(limits={}, default_limits=(10 ** 9, 10 ** 12), max_retries=app.GEMINI_MAX_RETRIES)
+
+    levels = [int(n) for n in args.sessions.split(",") if n.strip()]
+    results, number = [], 0
+    header = f"{'sessions':>8}{'analyses/min':>14}" + "".join(f"{a + ' p50/p95':>28}" for a in ACTIONS)
+    print(header + f"{'Mio/session':>13}{'incohérences':>14}")
+    for n_sessions in levels:
+        level = run_level(n_sessions, number, args)
+        number += n_sessions * args.rounds
+        results.append(level)
+        cells = "".join(
+            f"{level['latency'][a]['p50_s']:>13.2f}s/{level['latency'][a]['p95_s']:>6.2f}s".rjust(28)
+            if a in level["latency"] else f"{'—':>28}" for a in ACTIONS)
+        anomalies = sum(len(v) for v in level["anomalies"].values())
+        print(f"{n_sessions:>8}{level['analyses_per_min']:>14.1f}{cells}"
+              f"{level['rss_delta_per_session_kib'] / 1024:>13.1f}{anomalies:>14}")
+
+    print(f"État de session moyen : {results[-1]['session_state_kib']:.0f} Kio · "
+          f"images par session : {results[-1]['session_assets_kib']:.0f} Kio")
+    failed = False
+    for level in results:
+        for session_id, anomalies in level["anomalies"].items():
+            failed = True
+            for anomaly in anomalies:
+                print(f"⚠️  {level['sessions']} sessions · {session_id} : {anomaly}")
+
+    if args.json:
+        config = {key: getattr(args, key) for key in
+                  ("rounds", "latency", "image_latency", "jitter", "error_rate", "ramp_up", "quotas")}
+        (CALLER_DIR / args.json).write_text(json.dumps({"config": config, "levels": results}, indent=2,
+                                                       ensure_ascii=False))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,208 @@
+# --- Benchmark : pipeline d'analyse complet, hors ligne
+# Le simulateur local de Gemini (gemini_standin.StandInModel) renvoie des
+# textes et images préenregistrés après une latence injectée (médiane et
+# dispersion log-normale réglables). Chaque
+# étape est mesurée seule (generate_prediction, evaluate_results_quality,
+# generate_celebration_image, generate_advanced_graphs, create_pdf_report),
+# puis le parcours complet tel que le déroule l'application. Les caches de
+# rendu sont vidés entre deux mesures (sauf avec --warm) : on mesure le
+# travail réel, pas un accès au cache. Aucun accès réseau, aucune clé API.
+#
+#   python benchmarks/bench_pipeline.py [--runs 20] [--latency 0.2] [--jitter 0.3]
+#                                       [--stream] [--visual] [--warm]
+#                                       [--json pipeline.json] [--baseline pipeline.json]
+#
+# Le JSON contient p50/p95 (ms) et le pic mémoire (Kio, tracemalloc) de chaque
+# étape ; avec --baseline, le script se termine en erreur si un p50 dépasse
+# la référence de plus de --tolerance (20 % par défaut).
+import argparse
+import json
+import logging
+import math
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+CALLER_DIR = Path.cwd()  # Les chemins --json / --baseline restent relatifs au dossier d'appel
+sys.path.insert(0, str(ROOT))
+os.chdir(ROOT)
+logging.getLogger("streamlit").setLevel(logging.ERROR)
+
+import gemini_clients  # noqa: E402
+from gemini_standin import CANNED_PREDICTION, StandInModel  # noqa: E402
+from pipeline import run_pipeline  # noqa: E402
+from rate_limiter import get_scheduler  # noqa: E402
+from response_cache import get_response_cache  # noqa: E402
+from tracing import get_tracer  # noqa: E402
+
+# Pas de quotas, de cache disque ni de journal de traces : seules les latences injectées comptent
+get_scheduler(limits={}, default_limits=(10 ** 9, 10 ** 12), max_retries=0)
+get_response_cache(path=None)
+get_tracer(log_path=None, metrics_path=None)
+gemini_clients.warm_up = lambda *args, **kwargs: None
+
+import app  # noqa: E402
+
+# Hors de `streamlit run`, chaque appel st.* signale l'absence de contexte : on le tait
+for name in list(logging.root.manager.loggerDict):
+    if name.startswith("streamlit"):
+        logging.getLogger(name).setLevel(logging.ERROR)
+
+BENCH_PARAMS = {"budget": 15000, "audience": "25-34 ans", "duration": 30, "goal": "Conversion"}
+
+
+# --- Étapes mesurées
+def clear_render_caches():
+    app.render_celebration_png.clear()
+    app.simulate_campaign.clear()
+
+
+def build_cases(model, args):
+    """(nom, fonction) ; chaque fonction reçoit l'indice de la mesure."""
+    budget = BENCH_PARAMS["budget"]
+    prediction = CANNED_PREDICTION
+    quality = app.evaluate_results_quality(prediction, budget)
+
+    def stream():
+        return app.StreamWriter() if args.stream else None
+
+    def pdf_report(text, case, i):
+        # Contenu distinct à chaque mesure : le cache des PDF n'est pas sollicité
+        text = text if args.warm else f"{text}\n{case} {i}"
+        state = {"last_prediction": text, "last_params": BENCH_PARAMS, "domain": "Général",
+                 "result_quality": quality, "last_kpis": app.extract_kpis_from_text(text)}
+        return app.build_pdf_report(state, "local")
+
+    def end_to_end(i):
+        stages = app.build_analysis_stages(model, BENCH_PARAMS, "Formel", "Français", "Général",
+                                           premium=False, generate_visual=args.visual,
+                                           generate_summary=False, use_cache=False,
+                                           streams={"prediction": stream()} if args.stream else None)
+        result = run_pipeline(stages, max_workers=len(stages))
+        text = result.get("prediction")["text"]
+        app.generate_advanced_graphs(budget, BENCH_PARAMS["duration"], BENCH_PARAMS["goal"])
+        return app.create_pdf_report(pdf_report(text, "end_to_end", i))
+
+    cases = [
+        ("generate_prediction", lambda i: app.generate_prediction(model, BENCH_PARAMS, use_cache=False,
+                                                                  stream=stream())),
+        ("evaluate_results_quality", lambda i: app.evaluate_results_quality(prediction, budget)),
+        ("generate_celebration_image", lambda i: app.generate_celebration_image(quality)),
+        ("generate_advanced_graphs", lambda i: app.generate_advanced_graphs(
+            budget, BENCH_PARAMS["duration"], BENCH_PARAMS["goal"])),
+        ("create_pdf_report", lambda i: app.create_pdf_report(pdf_report(prediction, "create_pdf_report", i))),
+    ]
+    if args.visual:
+        cases.append(("generate_visual_asset", lambda i: app.generate_visual_asset(model, prediction, "Général")))
+    cases.append(("end_to_end", end_to_end))
+    return cases
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low = math.floor(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def measure(func, runs, warm):
+    func(-1)  # Imports différés et polices : hors mesure
+    timings = []
+    for i in range(runs):
+        if not warm:
+            clear_render_caches()
+        start = time.perf_counter()
+        result = func(i)
+        timings.append(time.perf_counter() - start)
+        if result is None:
+            raise SystemExit("Une étape n'a rien retourné : voir les messages ci-dessus")
+
+    # Pic mémoire sur une mesure à part : tracemalloc ralentit l'exécution
+    if not warm:
+        clear_render_caches()
+    tracemalloc.start()
+    func(runs)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "runs": runs,
+        "p50_ms": percentile(timings, 50) * 1000,
+        "p95_ms": percentile(timings, 95) * 1000,
+        "mean_ms": statistics.fmean(timings) * 1000,
+        "peak_kib": peak / 1024,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.2, help="Latence médiane du simulateur (s)")
+    parser.add_argument("--image-latency", type=float, help="Latence médiane des réponses image (s)")
+    parser.add_argument("--jitter", type=float, default=0.3, help="Dispersion log-normale de la latence")
+    parser.add_argument("--stream", action="store_true", help="Prédiction en streaming")
+    parser.add_argument("--visual", action="store_true", help="Inclure le visuel publicitaire (image)")
+    parser.add_argument("--warm", action="store_true", help="Garder les caches de rendu entre les mesures")
+    parser.add_argument("--json", help="Fichier où enregistrer les résultats")
+    parser.add_argument("--baseline", help="Résultats de référence (JSON) à comparer")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+    if args.runs < 2:
+        parser.error("--runs doit valoir au moins 2")
+
+    model = StandInModel(
+        app.MODEL_OPTIONS[0], app.GENERATION_CONFIG,
+        latency={"distribution": "lognormal", "median": args.latency, "sigma": args.jitter},
+        image_latency={"distribution": "lognormal", "median": args.image_latency or args.latency,
+                       "sigma": args.jitter},
+        chunk_delay=0.005, seed=0)
+    stages = {}
+    print(f"{'Étape':<30}{'p50':>11}{'p95':>11}{'pic mémoire':>14}")
+    for name, func in build_cases(model, args):
+        stages[name] = stats = measure(func, args.runs, args.warm)
+        print(f"{name:<30}{stats['p50_ms']:>9.1f}ms{stats['p95_ms']:>9.1f}ms{stats['peak_kib']:>10.0f} Kio")
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"Mémoire résidente maximale du processus : {max_rss / 1024:.0f} Mio")
+    print(f"Appels au simulateur : {model.stats['calls']}")
+
+    results = {
+        "commit": git_commit(),
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "config": {key: getattr(args, key) for key in
+                   ("runs", "latency", "image_latency", "jitter", "stream", "visual", "warm")},
+        "max_rss_kib": max_rss,
+        "stages": stages,
+    }
+    if args.json:
+        (CALLER_DIR / args.json).write_text(json.dumps(results, indent=2))
+
+    if args.baseline:
+        baseline = json.loads((CALLER_DIR / args.baseline).read_text()).get("stages", {})
+        regressions = [name for name, stats in stages.items()
+                       if name in baseline and stats["p50_ms"] > baseline[name]["p50_ms"] * (1 + args.tolerance)]
+        for name in regressions:
+            print(f"⚠️  Régression : {name} {stages[name]['p50_ms']:.1f}ms "
+                  f"(référence {baseline[name]['p50_ms']:.1f}ms)")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+# --- Benchmark : score de qualité des analyses
+# Compare l'ancienne évaluation (recherches successives de sous-chaînes,
+# français uniquement) au moteur en une passe de scoring.py, sur un très
+# long texte et sur un lot d'analyses courtes en français et en anglais
+# (cas du re-scoring rétroactif d'un historique ou d'un journal batch).
+#
+#   python benchmarks/bench_scoring.py [--batch 10000] [--size-mb 2] [--runs 3]
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from scoring import ScoringEngine  # noqa: E402
+
+PHRASES = [
+    "Le ROI estimé est élevé, entre 120 % et 180 %.",
+    "Le ROI n'est pas très élevé sur les premiers mois.",
+    "Le CPA moyen reste faible grâce au ciblage.",
+    "Une stratégie efficace et rentable sur Instagram.",
+    "Des résultats remarquables sont attendus en fin de campagne.",
+    "La campagne repose sur un budget réparti entre trois canaux.",
+    "The expected ROI is high for this audience.",
+    "CPA is not low during the learning phase.",
+    "An outstanding, high-performing creative strategy.",
+    "Budget allocation follows the funnel stages.",
+]
+
+
+def legacy_quality(prediction_text, budget):
+    """Copie de l'ancienne version d'evaluate_results_quality (référence)."""
+    text_lower = prediction_text.lower()
+    positive_indicators = 0
+    if "roi" in text_lower and any(word in text_lower for word in ["élevé", "fort", "important", "supérieur", "excellent"]):
+        positive_indicators += 2
+    if "cpa" in text_lower and any(word in text_lower for word in ["faible", "bas", "réduit", "optimisé"]):
+        positive_indicators += 2
+    if any(word in text_lower for word in ["exceptionnel", "excellent", "remarquable", "exceptionnelle"]):
+        positive_indicators += 3
+    if any(word in text_lower for word in ["efficace", "performant", "rentable", "optimisé"]):
+        positive_indicators += 2
+    budget_factor = 1.0
+    if budget > 20000:
+        budget_factor = 1.2
+    elif budget < 5000:
+        budget_factor = 0.8
+    adjusted_score = positive_indicators * budget_factor
+    if adjusted_score >= 5:
+        return "excellent"
+    elif adjusted_score >= 3:
+        return "good"
+    return "normal"
+
+
+def make_batch(n, rng):
+    return [(" ".join(rng.choices(PHRASES, k=rng.randint(8, 20))), rng.choice([3000, 15000, 30000]))
+            for _ in range(n)]
+
+
+def best_of(func, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--batch", type=int, default=10_000, help="Nombre d'analyses du lot")
+    parser.add_argument("--size-mb", type=float, default=2.0, help="Taille du texte long")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    start = time.perf_counter()
+    engine = ScoringEngine()
+    print(f"Compilation du moteur : {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    batch = make_batch(args.batch, rng)
+    big_text = " ".join(rng.choices(PHRASES, k=int(args.size_mb * 1_000_000 / 45)))
+
+    print(f"{'Cas':<28}{'ancien':>12}{'moteur':>12}")
+    legacy = best_of(lambda: legacy_quality(big_text, 15000), args.runs)
+    new = best_of(lambda: engine.score(big_text, 15000), args.runs)
+    print(f"{f'texte de {len(big_text) / 1e6:.1f} Mo':<28}{legacy * 1000:>10.1f}ms{new * 1000:>10.1f}ms")
+
+    legacy = best_of(lambda: [legacy_quality(t, b) for t, b in batch], args.runs)
+    new = best_of(lambda: engine.score_many(batch), args.runs)
+    print(f"{f'lot de {len(batch):,} analyses':<28}{legacy * 1000:>10.1f}ms{new * 1000:>10.1f}ms")
+    print(f"Débit du moteur : {len(batch) / new:,.0f} analyses/s")
+
+    # Écarts de niveau : négations et textes anglais désormais pris en compte
+    changed = sum(legacy_quality(t, b) != r["tier"] for (t, b), r in zip(batch, engine.score_many(batch)))
+    print(f"Niveaux différents de l'ancienne évaluation : {changed}/{len(batch)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# --- Benchmark : simulation Monte Carlo des graphiques prédictifs
+# Mesure le moteur vectorisé (run_monte_carlo) pour différents nombres de
+# scénarios, ainsi que le coût d'un changement du filtre de mois une fois
+# la campagne simulée (simple découpage des bandes en cache).
+#
+#   python benchmarks/bench_simulation.py [--runs 5]
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+os.chdir(ROOT)
+
+import app  # noqa: E402
+
+BUDGET_LIMIT_SECONDS = 1.0
+
+
+def best_of(func, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'Scénarios':>12}{'temps':>14}{'scénarios/s':>16}")
+    for n in (1_000, 10_000, 100_000):
+        elapsed = best_of(lambda: app.run_monte_carlo(15000, 30, "Conversion", n_scenarios=n), args.runs)
+        print(f"{n:>12,}{elapsed * 1000:>12.1f}ms{n / elapsed:>16,.0f}")
+        if n == 100_000 and elapsed > BUDGET_LIMIT_SECONDS:
+            print(f"⚠️  100k scénarios dépassent le budget de {BUDGET_LIMIT_SECONDS:.1f} s")
+
+    # Reproductibilité : mêmes paramètres -> mêmes bandes
+    a = app.run_monte_carlo(15000, 30, "Conversion")
+    b = app.run_monte_carlo(15000, 30, "Conversion")
+    print("Bandes identiques pour une même campagne :", all((a[k] == b[k]).all() for k in a))
+
+    app.simulate_campaign.clear()
+    first = best_of(lambda: app.generate_advanced_graphs(15000, 30, "Conversion", (1, 6)), 1)
+    rerun = best_of(lambda: app.generate_advanced_graphs(15000, 30, "Conversion", (2, 4)), args.runs)
+    print(f"Premier affichage des graphiques : {first * 1000:.1f}ms, changement de filtre : {rerun * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+# --- Benchmark : démarrage à froid et reruns de app.py
+# Mesure, chaque fois dans un interpréteur neuf (comme un conteneur qui
+# démarre) : le temps d'import de app.py, le premier affichage complet puis
+# les reruns suivants (page d'accueil, et page de résultats déjà calculés).
+# Le préchauffage réseau de Gemini est désactivé : aucune clé n'est utilisée.
+#
+#   python benchmarks/bench_startup.py [--runs 3] [--json startup.json] [--baseline startup.json]
+#
+# Avec --baseline, le script se termine en erreur si une mesure dépasse la
+# référence de plus de --tolerance (20 % par défaut).
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+HEAVY_MODULES = ["google.generativeai", "pandas", "fpdf", "plotly.graph_objects", "PIL.Image", "numpy"]
+RERUNS = 5
+
+IMPORT_PROBE = f"""
+import json, sys, time
+sys.path.insert(0, {str(ROOT)!r})
+start = time.perf_counter()
+import app
+elapsed = time.perf_counter() - start
+print(json.dumps({{"import_s": elapsed, "loaded": [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))
+"""
+
+RENDER_PROBE = f"""
+import json, logging, statistics, sys, time
+sys.path.insert(0, {str(ROOT)!r})
+logging.getLogger("streamlit").setLevel(logging.ERROR)
+import gemini_clients
+gemini_clients.warm_up = lambda *args, **kwargs: None
+from streamlit.testing.v1 import AppTest
+
+def timed(at):
+    start = time.perf_counter()
+    at.run()
+    if at.exception:
+        raise SystemExit(f"Exception dans l'application : {{at.exception}}")
+    return time.perf_counter() - start
+
+at = AppTest.from_file({str(ROOT / "app.py")!r}, default_timeout=120)
+at.secrets["GEMINI_API_KEY"] = "bench"
+first = timed(at)
+reruns = [timed(at) for _ in range({RERUNS})]
+
+# Page de résultats : une analyse déjà calculée, comme après le clic sur « Lancer »
+params = {{"budget": 15000, "audience": "25-34 ans", "duration": 30, "goal": "Conversion"}}
+state = {{
+    "last_prediction": "ROI estimé : 120% à 180%. CPA moyen : 12 €. Stratégie efficace et rentable.",
+    "last_kpis": None, "last_params": params, "domain": "Général", "filename_pdf": "rapport.pdf",
+    "premium_content": None, "result_quality": "good", "last_timings": {{}},
+}}
+for key, value in state.items():
+    at.session_state[key] = value
+results_first = timed(at)
+results_reruns = [timed(at) for _ in range({RERUNS})]
+print(json.dumps({{
+    "first_render_s": first,
+    "rerun_s": statistics.median(reruns),
+    "results_first_render_s": results_first,
+    "results_rerun_s": statistics.median(results_reruns),
+    "loaded": [m for m in {HEAVY_MODULES!r} if m in sys.modules],
+}}))
+"""
+
+
+def probe(code):
+    completed = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise SystemExit(completed.stderr.strip().splitlines()[-1] if completed.stderr else "échec de la mesure")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=3, help="Nombre d'interpréteurs neufs par mesure")
+    parser.add_argument("--json", help="Fichier où enregistrer les résultats")
+    parser.add_argument("--baseline", help="Résultats de référence (JSON) à comparer")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    imports = [probe(IMPORT_PROBE) for _ in range(args.runs)]
+    renders = [probe(RENDER_PROBE) for _ in range(args.runs)]
+    results = {"import_s": statistics.median(r["import_s"] for r in imports)}
+    for key in ("first_render_s", "rerun_s", "results_first_render_s", "results_rerun_s"):
+        results[key] = statistics.median(r[key] for r in renders)
+
+    labels = {
+        "import_s": "import de app.py",
+        "first_render_s": "premier affichage",
+        "rerun_s": "rerun (accueil)",
+        "results_first_render_s": "premier affichage des résultats",
+        "results_rerun_s": "rerun (résultats)",
+    }
+    for key, label in labels.items():
+        print(f"{label:<36}{results[key] * 1000:>10.1f}ms")
+    print("Modules lourds chargés à l'import :", ", ".join(imports[0]["loaded"]) or "aucun")
+    print("Modules lourds chargés après affichage :", ", ".join(renders[0]["loaded"]) or "aucun")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps({**results, "loaded_at_import": imports[0]["loaded"]}, indent=2))
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        regressions = [key for key in labels
+                       if key in baseline and results[key] > baseline[key] * (1 + args.tolerance)]
+        for key in regressions:
+            print(f"⚠️  Régression : {labels[key]} {results[key] * 1000:.1f}ms "
+                  f"(référence {baseline[key] * 1000:.1f}ms)")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
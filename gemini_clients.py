@@ -0,0 +1,160 @@
+# --- Registre des clients Gemini
+# genai.configure() recrée les clients de transport (et donc les connexions) à
+# chaque appel. Ce registre configure l'API une seule fois par clé et garde un
+# GenerativeModel par (modèle, configuration de génération), partagé entre les
+# reruns, les sessions et les threads Streamlit. google.generativeai n'est
+# importé qu'à la première configuration (plus d'une demi-seconde d'import).
+# Le backend peut être remplacé par le simulateur local ou une cassette
+# (voir gemini_standin.py) : mêmes modèles partagés, sans réseau ni quota.
+import json
+import threading
+
+BACKENDS = ("gemini", "local", "record", "replay")
+LOCAL_BACKENDS = ("local", "replay")   # Pas de clé API ni de SDK nécessaires
+
+_lock = threading.Lock()
+_configured = None   # (clé API, transport) actuellement configurés
+_backend = ("gemini", None, {})   # (nom, chemin de la cassette, options du simulateur)
+_models = {}
+_warmed = set()
+_warming = set()
+_warm_errors = {}   # (modèle, configuration) -> dernière erreur de préchauffage
+
+
+def _config_key(generation_config):
+    return json.dumps(generation_config or {}, sort_keys=True, default=str)
+
+
+def set_backend(name="gemini", cassette=None, **options):
+    """
+    Choisit le backend des modèles : "gemini" (API réelle), "local"
+    (simulateur, `options` transmises à StandInModel), "record" (API réelle,
+    réponses enregistrées dans `cassette`) ou "replay" (rejeu de `cassette`).
+    """
+    global _backend, _configured
+    if name not in BACKENDS:
+        raise ValueError(f"Backend Gemini inconnu : {name} (attendu : {', '.join(BACKENDS)})")
+    if name in ("record", "replay") and not cassette:
+        raise ValueError(f"Le backend '{name}' nécessite un fichier de cassette")
+    backend = (name, cassette, options)
+    with _lock:
+        if _backend == backend:
+            return
+        _backend = backend
+        # Le SDK n'a pas forcément été configuré par le backend précédent
+        _configured = None
+        _models.clear()
+        _warmed.clear()
+        _warming.clear()
+        _warm_errors.clear()
+
+
+def backend_name():
+    return _backend[0]
+
+
+def configure(api_key, transport=None):
+    """Configure l'API une seule fois ; une nouvelle clé invalide les modèles existants."""
+    global _configured
+    with _lock:
+        if _configured == (api_key, transport):
+            return
+        if _backend[0] in LOCAL_BACKENDS:
+            _configured = (api_key, transport)
+            return
+        import google.generativeai as genai
+
+        kwargs = {"api_key": api_key}
+        if transport:
+            kwargs["transport"] = transport
+        genai.configure(**kwargs)
+        if _configured is not None:
+            # Changement de clé : les modèles et préchauffages précédents ne valent plus
+            _models.clear()
+            _warmed.clear()
+        _configured = (api_key, transport)
+
+
+def get_model(model_name, generation_config=None):
+    """Retourne le GenerativeModel partagé pour ce couple (modèle, configuration)."""
+    key = (model_name, _config_key(generation_config))
+    with _lock:
+        if _configured is None and _backend[0] not in LOCAL_BACKENDS:
+            raise RuntimeError("L'API Gemini n'est pas configurée : appelez configure() d'abord")
+        model = _models.get(key)
+        if model is None:
+            model = _models[key] = _build_model(model_name, generation_config)
+        return model
+
+
+def _build_model(model_name, generation_config):
+    name, cassette, options = _backend
+    if name in ("gemini", "record"):
+        import google.generativeai as genai
+
+        model = genai.GenerativeModel(model_name=model_name, generation_config=generation_config)
+        if name == "gemini":
+            return model
+    import gemini_standin
+
+    if name == "local":
+        return gemini_standin.StandInModel(model_name, generation_config, **options)
+    if name == "record":
+        return gemini_standin.RecordingModel(model, gemini_standin.get_cassette(cassette))
+    # Le rejeu ne reprend que les options qui le concernent (latence, découpage du streaming)
+    replay_options = {k: v for k, v in options.items() if k in gemini_standin.ReplayModel.OPTIONS}
+    return gemini_standin.ReplayModel(model_name, gemini_standin.get_cassette(cassette), generation_config,
+                                      **replay_options)
+
+
+def warm_up(model_name, generation_config=None, background=True, api_key=None, transport=None):
+    """
+    Ouvre la connexion du modèle par un appel count_tokens (gratuit, sans
+    génération), une seule fois par processus et par modèle. Avec `api_key`,
+    la configuration (et l'import du SDK) se fait aussi dans le thread.
+    Un échec est conservé (voir warm_up_error) et le préchauffage sera retenté.
+    """
+    key = (model_name, _config_key(generation_config))
+    with _lock:
+        if key in _warmed or key in _warming:
+            return None
+        _warming.add(key)
+
+    def run():
+        error = None
+        try:
+            if api_key:
+                configure(api_key, transport)
+            get_model(model_name, generation_config).count_tokens("ping")
+        except Exception as e:
+            error = e
+        with _lock:
+            _warming.discard(key)
+            if error is None:
+                _warmed.add(key)
+                _warm_errors.pop(key, None)
+            else:
+                _warm_errors[key] = error
+
+    if not background:
+        run()
+        return None
+    thread = threading.Thread(target=run, name=f"gemini-warmup-{model_name}", daemon=True)
+    thread.start()
+    return thread
+
+
+def warm_up_error(model_name, generation_config=None):
+    """Dernière erreur de préchauffage du modèle, ou None."""
+    with _lock:
+        return _warm_errors.get((model_name, _config_key(generation_config)))
+
+
+def reset():
+    global _configured
+    with _lock:
+        _configured = None
+        _models.clear()
+        _warmed.clear()
+        _warming.clear()
+        _warm_errors.clear()
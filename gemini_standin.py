@@ -0,0 +1,429 @@
+# --- Simulateur local de Gemini et enregistrement / rejeu des réponses
+# StandInModel remplace genai.GenerativeModel sans réseau ni clé : réponses
+# préenregistrées (texte, JSON structuré, images), latence tirée d'une loi
+# configurable, erreurs 429 injectées et réponses sans image aux prompts
+# d'image. RecordingModel enregistre les réponses d'un vrai modèle dans une
+# cassette (fichier JSON) que ReplayModel rejoue ensuite à l'identique.
+import base64
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from io import BytesIO
+from pathlib import Path
+
+from response_cache import make_cache_key
+
+DEFAULT_LATENCY = {"distribution": "lognormal", "median": 0.8, "sigma": 0.4}
+DEFAULT_IMAGE_LATENCY = {"distribution": "lognormal", "median": 4.0, "sigma": 0.3}
+IMAGE_PROMPT_MARKERS = ("Générez l'image", "Generate the image")
+VARIANTS_PROMPT = re.compile(r"\[VARIANTES\] Rédigez (\d+) versions")
+CASSETTE_VERSION = 1
+
+CANNED_PREDICTION = """### Analyse Prédictive
+- ROI estimé : 120% à 180%
+- CPA moyen : 12 €
+Une stratégie efficace et rentable : le ROI est élevé et le CPA reste faible.
+
+### Stratégies Recommandées
+1. Campagnes Google Ads sur les requêtes à forte intention
+2. Contenus courts sur Instagram et TikTok
+3. Séquences e-mail de relance
+
+### Canaux Prioritaires
+- Google Ads (40% du budget)
+- Instagram (35% du budget)
+- E-mail (25% du budget)
+"""
+CANNED_STRUCTURED = {
+    "analysis_markdown": CANNED_PREDICTION,
+    "roi_min": 120, "roi_max": 180, "cpa": 12,
+    "channels": [{"name": "Google Ads", "budget_share": 40}, {"name": "Instagram", "budget_share": 35},
+                 {"name": "E-mail", "budget_share": 25}],
+    "strategies": ["Google Ads sur les requêtes à forte intention", "Contenus courts Instagram et TikTok",
+                   "Séquences e-mail de relance"],
+}
+CANNED_PREMIUM = """### Insights Premium
+1. **Tendances** : la vidéo courte concentre l'essentiel de la croissance de l'engagement.
+2. **Opportunités** : les requêtes de longue traîne restent peu disputées.
+3. **Stratégie** : tests A/B hebdomadaires sur les créations les plus performantes.
+4. **Étude de cas** : un acteur comparable a réduit son CPA de 25 % en six semaines.
+5. **Checklist** : suivi des conversions, audiences similaires, relances automatisées.
+"""
+CANNED_IMAGE_REFUSAL = "Je ne peux pas générer d'image pour cette demande, voici une description du visuel."
+
+
+class CassetteMiss(LookupError):
+    """Aucune réponse enregistrée pour ce prompt dans la cassette."""
+
+
+# --- Réponses au format du SDK (text, parts[].inline_data, usage_metadata)
+class _InlineData:
+    def __init__(self, data, mime_type="image/png"):
+        self.data = data
+        self.mime_type = mime_type
+
+
+class _Part:
+    def __init__(self, data, mime_type="image/png"):
+        self.inline_data = _InlineData(data, mime_type)
+
+
+class _Usage:
+    def __init__(self, prompt_token_count=0, candidates_token_count=0, total_token_count=None):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+        self.total_token_count = (prompt_token_count + candidates_token_count
+                                  if total_token_count is None else total_token_count)
+
+
+class _TokenCount:
+    def __init__(self, total_tokens):
+        self.total_tokens = total_tokens
+
+
+class StandInResponse:
+    def __init__(self, text=None, image=None, usage=None, mime_type="image/png"):
+        self._text = text
+        self.parts = [_Part(image, mime_type)] if image else []
+        self.usage_metadata = usage or _Usage()
+
+    @property
+    def text(self):
+        # Comme le SDK : accéder au texte d'une réponse qui n'en contient pas lève ValueError
+        if self._text is None:
+            raise ValueError("La réponse ne contient pas de texte")
+        return self._text
+
+    def to_dict(self):
+        usage = self.usage_metadata
+        return {
+            "text": self._text,
+            "image": base64.b64encode(self.parts[0].inline_data.data).decode("ascii") if self.parts else None,
+            "mime_type": self.parts[0].inline_data.mime_type if self.parts else None,
+            "usage": [getattr(usage, "prompt_token_count", 0) or 0, getattr(usage, "candidates_token_count", 0) or 0,
+                      getattr(usage, "total_token_count", 0) or 0],
+        }
+
+    @classmethod
+    def from_response(cls, response):
+        """Copie d'une réponse du SDK (ou du simulateur) : texte, première image et décompte de tokens."""
+        try:
+            parts = list(getattr(response, "parts", None) or [])
+        except ValueError:
+            # SDK : aucun candidat (prompt bloqué)
+            parts = []
+        try:
+            text = response.text
+        except ValueError:
+            # Image seule, ou réponse mixte texte + image que `.text` du SDK refuse de convertir
+            texts = [part.text for part in parts if getattr(part, "text", "")]
+            text = "\n".join(texts) if texts else None
+        image, mime_type = None, "image/png"
+        for part in parts:
+            inline_data = getattr(part, "inline_data", None)
+            if inline_data is not None and inline_data.data:
+                image, mime_type = inline_data.data, inline_data.mime_type or mime_type
+                break
+        usage = getattr(response, "usage_metadata", None)
+        return cls(text, image, _Usage(getattr(usage, "prompt_token_count", 0) or 0,
+                                       getattr(usage, "candidates_token_count", 0) or 0,
+                                       getattr(usage, "total_token_count", 0) or 0), mime_type)
+
+    @classmethod
+    def from_dict(cls, data):
+        image = base64.b64decode(data["image"]) if data.get("image") else None
+        return cls(data.get("text"), image, _Usage(*data.get("usage", (0, 0, 0))),
+                   data.get("mime_type") or "image/png")
+
+
+def _stream(text, usage, chunk_size, chunk_delay):
+    """Découpe un texte en morceaux ; le dernier porte le décompte de tokens, comme l'API."""
+    chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)] or [""]
+    for i, chunk in enumerate(chunks):
+        if i:
+            time.sleep(chunk_delay)
+        yield StandInResponse(chunk, usage=usage if i == len(chunks) - 1 else _Usage())
+
+
+def _namespace(generation_config):
+    return json.dumps(generation_config, sort_keys=True, default=str) if generation_config else "text"
+
+
+def full_model_name(model_name):
+    # Même normalisation que le SDK : "gemini-pro" -> "models/gemini-pro"
+    return model_name if "/" in model_name else f"models/{model_name}"
+
+
+def prompt_reference(prompt):
+    """Référence courte et stable d'un prompt (ajoutée aux réponses avec tag_responses)."""
+    return f"Réf. {hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:12]}"
+
+
+def _is_image_prompt(prompt):
+    return any(marker in prompt for marker in IMAGE_PROMPT_MARKERS)
+
+
+def _prompt_text(contents):
+    return contents if isinstance(contents, str) else json.dumps(contents, ensure_ascii=False, default=str)
+
+
+# --- Simulateur
+def sample_latency(spec, rng):
+    """
+    Délai en secondes selon `spec` : un nombre (délai fixe) ou un dict
+    {"distribution": "fixed" | "uniform" | "normal" | "lognormal", ...}.
+    """
+    if spec is None:
+        return 0.0
+    if isinstance(spec, (int, float)):
+        return float(spec)
+    distribution = spec.get("distribution", "lognormal")
+    if distribution == "fixed":
+        return float(spec["value"])
+    if distribution == "uniform":
+        return rng.uniform(spec["low"], spec["high"])
+    if distribution == "normal":
+        return max(0.0, rng.gauss(spec["mean"], spec.get("sd", 0.0)))
+    if distribution == "lognormal":
+        return spec["median"] * math.exp(rng.gauss(0, spec.get("sigma", 0.0)))
+    raise ValueError(f"Loi de latence inconnue : {distribution}")
+
+
+def _placeholder_image(width, height):
+    from PIL import Image, ImageDraw
+
+    img = Image.new("RGB", (width, height), (16, 19, 185))
+    draw = ImageDraw.Draw(img)
+    draw.rectangle([(0, height * 3 // 4), (width, height)], fill=(200, 229, 70))
+    draw.text((20, 20), "Visuel simulé", fill="white")
+    buffer = BytesIO()
+    img.save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+class StandInModel:
+    """
+    Remplaçant local de genai.GenerativeModel. Options :
+    - latency / image_latency : délai avant la réponse (voir sample_latency)
+    - error_rate : proportion d'appels qui lèvent ResourceExhausted (429)
+    - retry_after : délai suggéré dans le message des 429 simulés
+    - image_text_only_rate : proportion de prompts d'image qui ne reçoivent que du texte
+    - chunk_size / chunk_delay : découpage des réponses en streaming
+    - seed : graine du tirage (latences et erreurs reproductibles)
+    - tag_responses : ajoute aux textes la référence du prompt (prompt_reference),
+      pour vérifier qu'une réponse revient bien à la session qui l'a demandée
+    """
+
+    def __init__(self, model_name="gemini-standin", generation_config=None, latency=None, image_latency=None,
+                 error_rate=0.0, retry_after=1.0, image_text_only_rate=0.0, chunk_size=64, chunk_delay=0.02,
+                 seed=None, texts=None, tag_responses=False):
+        self.model_name = full_model_name(model_name)
+        self.generation_config = generation_config
+        self.latency = DEFAULT_LATENCY if latency is None else latency
+        self.image_latency = DEFAULT_IMAGE_LATENCY if image_latency is None else image_latency
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.image_text_only_rate = image_text_only_rate
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+        self.texts = {"prediction": CANNED_PREDICTION, "premium": CANNED_PREMIUM, **(texts or {})}
+        self.tag_responses = tag_responses
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._images = {}
+        self.stats = {"calls": 0, "errors": 0, "images": 0, "text_only_images": 0}
+
+    def _draw(self, latency_spec):
+        with self._lock:
+            self.stats["calls"] += 1
+            delay = sample_latency(latency_spec, self._rng)
+            failed = self._rng.random() < self.error_rate
+            text_only = self._rng.random() < self.image_text_only_rate
+        return delay, failed, text_only
+
+    def _image(self, prompt):
+        match = re.search(r"(\d{3,4})\s*x\s*(\d{3,4})", prompt)
+        size = (int(match.group(1)), int(match.group(2))) if match else (1024, 1024)
+        with self._lock:
+            if size not in self._images:
+                self._images[size] = _placeholder_image(*size)
+            return self._images[size]
+
+    def _text(self, prompt, generation_config):
+        config = generation_config or self.generation_config or {}
+        if config.get("response_mime_type") == "application/json":
+            data = dict(CANNED_STRUCTURED)
+            if self.tag_responses:
+                data["analysis_markdown"] += f"\n_{prompt_reference(prompt)}_\n"
+            return json.dumps(data, ensure_ascii=False)
+        text = self.texts["premium"] if "premium" in prompt.lower() else self.texts["prediction"]
+        if self.tag_responses:
+            text = f"{text}\n_{prompt_reference(prompt)}_\n"
+        variants = VARIANTS_PROMPT.search(prompt)
+        if variants:
+            # Prompt de variantes : une section numérotée par rendu demandé
+            return "\n".join(f"=== VARIANTE {i} ===\n{text}" for i in range(1, int(variants.group(1)) + 1))
+        return text
+
+    def generate_content(self, contents, stream=False, generation_config=None, **kwargs):
+        prompt = _prompt_text(contents)
+        image_prompt = _is_image_prompt(prompt)
+        delay, failed, text_only = self._draw(self.image_latency if image_prompt else self.latency)
+        time.sleep(delay)
+        if failed:
+            from google.api_core import exceptions as google_exceptions
+
+            with self._lock:
+                self.stats["errors"] += 1
+            raise google_exceptions.ResourceExhausted(
+                f"Quota simulé dépassé, please retry in {self.retry_after:g}s")
+
+        if image_prompt:
+            with self._lock:
+                self.stats["text_only_images" if text_only else "images"] += 1
+            usage = _Usage(len(prompt) // 4, 0 if text_only else 1290)
+            if text_only:
+                return StandInResponse(CANNED_IMAGE_REFUSAL, usage=usage)
+            return StandInResponse(image=self._image(prompt), usage=usage)
+
+        text = self._text(prompt, generation_config)
+        usage = _Usage(len(prompt) // 4, len(text) // 4)
+        if stream:
+            return _stream(text, usage, self.chunk_size, self.chunk_delay)
+        return StandInResponse(text, usage=usage)
+
+    def count_tokens(self, contents):
+        return _TokenCount(len(_prompt_text(contents)) // 4)
+
+
+# --- Cassettes : enregistrement et rejeu
+class Cassette:
+    """
+    Réponses enregistrées, indexées comme le cache de réponses (modèle,
+    configuration, prompt normalisé). Plusieurs réponses pour un même prompt
+    sont rejouées dans l'ordre de leur enregistrement, puis en boucle.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._interactions = {}
+        self._positions = {}
+        if path and Path(path).exists():
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != CASSETTE_VERSION:
+                raise ValueError(f"Version de cassette non prise en charge : {data.get('version')}")
+            self._interactions = data.get("interactions", {})
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(responses) for responses in self._interactions.values())
+
+    def record(self, model_name, prompt, generation_config, response):
+        # Les réponses du SDK (protos) sont ramenées au format des cassettes : texte, image, tokens
+        entry = {"model": model_name, **StandInResponse.from_response(response).to_dict()}
+        key = make_cache_key(model_name, prompt, _namespace(generation_config))
+        with self._lock:
+            self._interactions.setdefault(key, []).append(entry)
+            self._save()
+
+    def replay(self, model_name, prompt, generation_config):
+        key = make_cache_key(model_name, prompt, _namespace(generation_config))
+        with self._lock:
+            responses = self._interactions.get(key)
+            if not responses:
+                raise CassetteMiss(f"Aucune réponse enregistrée pour ce prompt ({model_name}) dans {self.path}")
+            position = self._positions.get(key, 0)
+            self._positions[key] = position + 1
+            return StandInResponse.from_dict(responses[position % len(responses)])
+
+    def rewind(self):
+        with self._lock:
+            self._positions.clear()
+
+    def _save(self):
+        if not self.path:
+            return
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": CASSETTE_VERSION, "interactions": self._interactions}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+
+class RecordingModel:
+    """Appelle le vrai modèle et enregistre chaque réponse (streaming compris) dans la cassette."""
+
+    def __init__(self, model, cassette):
+        self.model = model
+        self.model_name = model.model_name
+        self.cassette = cassette
+
+    def generate_content(self, contents, stream=False, generation_config=None, **kwargs):
+        if generation_config is not None:
+            kwargs["generation_config"] = generation_config
+        response = self.model.generate_content(contents, stream=stream, **kwargs)
+        prompt = _prompt_text(contents)
+        if not stream:
+            self.cassette.record(self.model_name, prompt, generation_config, response)
+            return response
+        return self._record_stream(response, prompt, generation_config)
+
+    def _record_stream(self, chunks, prompt, generation_config):
+        parts, last = [], None
+        for chunk in chunks:
+            last = chunk
+            try:
+                parts.append(chunk.text)
+            except ValueError:
+                pass
+            yield chunk
+        usage = getattr(last, "usage_metadata", None)
+        self.cassette.record(self.model_name, prompt, generation_config, StandInResponse("".join(parts), usage=usage))
+
+    def count_tokens(self, contents):
+        return self.model.count_tokens(contents)
+
+
+class ReplayModel:
+    """Rejoue les réponses d'une cassette, sans réseau ; un prompt absent lève CassetteMiss."""
+
+    OPTIONS = ("latency", "chunk_size", "chunk_delay", "seed")
+
+    def __init__(self, model_name, cassette, generation_config=None, latency=0.0, chunk_size=64, chunk_delay=0.0,
+                 seed=None):
+        self.model_name = full_model_name(model_name)
+        self.generation_config = generation_config
+        self.cassette = cassette
+        self.latency = latency
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+        self._rng = random.Random(seed)
+
+    def generate_content(self, contents, stream=False, generation_config=None, **kwargs):
+        response = self.cassette.replay(self.model_name, _prompt_text(contents), generation_config)
+        time.sleep(sample_latency(self.latency, self._rng))
+        if stream and response._text is not None:
+            return _stream(response._text, response.usage_metadata, self.chunk_size, self.chunk_delay)
+        return response
+
+    def count_tokens(self, contents):
+        return _TokenCount(len(_prompt_text(contents)) // 4)
+
+
+_cassettes = {}
+_cassettes_lock = threading.Lock()
+
+
+def get_cassette(path):
+    """Cassette partagée par toutes les sessions du processus pour ce fichier."""
+    with _cassettes_lock:
+        if path not in _cassettes:
+            _cassettes[path] = Cassette(path)
+        return _cassettes[path]
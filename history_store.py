@@ -0,0 +1,135 @@
+# --- Historique persistant des analyses
+# Chaque analyse (paramètres, texte de la prédiction, KPIs, références des
+# images) est enregistrée dans SQLite, rattachée à un propriétaire (jeton de
+# l'historique). Les listes sont paginées et ne lisent que les colonnes
+# légères ; le texte complet n'est chargé qu'à la demande.
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+
+DEFAULT_HISTORY_PATH = ".cache/history.sqlite3"
+SUMMARY_COLUMNS = "id, created_at, domain, quality, budget, duration, goal, audience, premium, assets"
+
+
+def _escape_like(text):
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+class HistoryStore:
+    def __init__(self, path=DEFAULT_HISTORY_PATH):
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS analyses (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                owner TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                domain TEXT,
+                quality TEXT,
+                budget INTEGER,
+                duration INTEGER,
+                goal TEXT,
+                audience TEXT,
+                premium INTEGER NOT NULL DEFAULT 0,
+                params TEXT NOT NULL,
+                prediction TEXT,
+                kpis TEXT,
+                assets TEXT
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_analyses_owner_date ON analyses(owner, created_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_analyses_domain ON analyses(owner, domain, created_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_analyses_quality ON analyses(owner, quality, created_at)")
+        self._conn.commit()
+
+    def add(self, owner, params, domain, quality, prediction, kpis=None, assets=None, premium=False,
+            created_at=None):
+        """Enregistre une analyse et retourne son identifiant."""
+        created_at = created_at or datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO analyses (owner, created_at, domain, quality, budget, duration, goal, audience, "
+                "premium, params, prediction, kpis, assets) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (owner, created_at, domain, quality, params.get("budget"), params.get("duration"),
+                 params.get("goal"), params.get("audience"), int(bool(premium)),
+                 json.dumps(params, ensure_ascii=False), prediction,
+                 json.dumps(kpis, ensure_ascii=False) if kpis else None,
+                 json.dumps(assets or {}))
+            )
+            self._conn.commit()
+            return cursor.lastrowid
+
+    @staticmethod
+    def _filters(owner, search=None, domain=None, quality=None):
+        clauses, args = ["owner = ?"], [owner]
+        if domain:
+            clauses.append("domain = ?")
+            args.append(domain)
+        if quality:
+            clauses.append("quality = ?")
+            args.append(quality)
+        if search:
+            pattern = f"%{_escape_like(search.strip())}%"
+            clauses.append("(prediction LIKE ? ESCAPE '\\' OR domain LIKE ? ESCAPE '\\' "
+                           "OR goal LIKE ? ESCAPE '\\' OR audience LIKE ? ESCAPE '\\')")
+            args.extend([pattern] * 4)
+        return " AND ".join(clauses), args
+
+    def count(self, owner, search=None, domain=None, quality=None):
+        where, args = self._filters(owner, search, domain, quality)
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM analyses WHERE {where}", args).fetchone()[0]
+
+    def page(self, owner, page=0, page_size=10, search=None, domain=None, quality=None):
+        """Résumés des analyses (sans le texte, avec les références des images), les plus récentes d'abord."""
+        where, args = self._filters(owner, search, domain, quality)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {SUMMARY_COLUMNS} FROM analyses WHERE {where} "
+                "ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?",
+                args + [page_size, page * page_size]
+            ).fetchall()
+        summaries = [dict(row) for row in rows]
+        for summary in summaries:
+            summary["assets"] = json.loads(summary["assets"]) if summary["assets"] else {}
+        return summaries
+
+    def get(self, owner, analysis_id):
+        """Analyse complète (texte, KPIs, références des images) ou None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM analyses WHERE owner = ? AND id = ?", (owner, analysis_id)
+            ).fetchone()
+        if row is None:
+            return None
+        analysis = dict(row)
+        analysis["params"] = json.loads(analysis["params"])
+        analysis["kpis"] = json.loads(analysis["kpis"]) if analysis["kpis"] else None
+        analysis["assets"] = json.loads(analysis["assets"]) if analysis["assets"] else {}
+        analysis["premium"] = bool(analysis["premium"])
+        return analysis
+
+    def delete(self, owner, analysis_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM analyses WHERE owner = ? AND id = ?", (owner, analysis_id))
+            self._conn.commit()
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_history_store(**kwargs):
+    """Instance partagée par toutes les sessions du processus."""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = HistoryStore(**kwargs)
+        return _default_store
@@ -0,0 +1,183 @@
+# --- Déclinaisons des images générées (affichage, vignette, PDF)
+# L'original renvoyé par le modèle est conservé tel quel (téléchargement).
+# Un thread d'arrière-plan le décode une seule fois et en tire chaque
+# déclinaison : réduite à sa largeur maximale, ré-encodée sans métadonnées
+# (EXIF, profil ICC, texte PNG). Le format « AUTO » est celui que st.image
+# sert sans le ré-encoder à chaque rerun : JPEG, ou PNG pour une image avec
+# transparence (un WebP serait reconverti par Streamlit). Un original sans
+# métadonnées déjà au bon format et plus léger que sa déclinaison sert
+# directement. Les déclinaisons sont rangées dans le stockage d'assets ; y a
+# accès toute session qui a accès à l'original.
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from io import BytesIO
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RENDITIONS = {
+    "display": {"max_width": 1460, "format": "AUTO", "quality": 82},
+    "thumbnail": {"max_width": 120, "format": "AUTO", "quality": 75},
+    "pdf": {"max_width": 1600, "format": "JPEG", "quality": 85},
+}
+DEFAULT_MAX_JOBS = 256
+MIME_TYPES = {"PNG": "image/png", "JPEG": "image/jpeg", "WEBP": "image/webp", "GIF": "image/gif"}
+EXTENSIONS = {"image/png": "png", "image/jpeg": "jpg", "image/webp": "webp", "image/gif": "gif"}
+
+
+def sniff_mime(data):
+    """Type MIME d'après la signature des octets (image/png par défaut)."""
+    if data[:3] == b"\xff\xd8\xff":
+        return "image/jpeg"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    return "image/png"
+
+
+def has_alpha(img):
+    # Même règle que st.image pour choisir entre PNG et JPEG
+    return img.mode in ("RGBA", "LA", "P")
+
+
+def resolve_format(img, img_format):
+    if img_format == "AUTO":
+        return "PNG" if has_alpha(img) else "JPEG"
+    return img_format
+
+
+def encode_rendition(img, max_width, img_format="AUTO", quality=82):
+    """Image PIL réduite à `max_width` et ré-encodée sans métadonnées : (octets, type MIME)."""
+    from PIL import Image
+
+    img_format = resolve_format(img, img_format)
+    if max_width and img.width > max_width:
+        if img.mode == "P":
+            img = img.convert("RGBA")
+        img = img.resize((max_width, max(1, round(img.height * max_width / img.width))), Image.LANCZOS)
+    if img_format == "JPEG":
+        if has_alpha(img):
+            # Pas de transparence en JPEG : fond blanc, comme à l'affichage
+            rgba = img.convert("RGBA")
+            img = Image.new("RGB", img.size, (255, 255, 255))
+            img.paste(rgba, mask=rgba.getchannel("A"))
+        elif img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        options = {"quality": quality, "optimize": True, "progressive": True}
+    else:
+        if img.mode not in ("RGB", "RGBA", "L", "LA", "P"):
+            img = img.convert("RGBA" if "A" in img.getbands() else "RGB")
+        options = {"optimize": True}
+    buffer = BytesIO()
+    # Seuls les pixels sont écrits : les métadonnées de l'original ne sont pas recopiées
+    img.save(buffer, img_format, **options)
+    return buffer.getvalue(), MIME_TYPES[img_format]
+
+
+class ImageRenditions:
+    def __init__(self, store, renditions=DEFAULT_RENDITIONS, max_workers=2, max_jobs=DEFAULT_MAX_JOBS):
+        self.store = store
+        self.renditions = dict(renditions)
+        self.max_jobs = max_jobs
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="renditions")
+        self._jobs = OrderedDict()   # id de l'original -> Future({nom: id de la déclinaison})
+        self._lock = threading.Lock()
+        self.stats = {"jobs": 0, "failures": 0, "original_bytes": 0, "rendition_bytes": 0}
+
+    def put(self, session_id, data, mime=None):
+        """Enregistre l'original pour la session, lance ses déclinaisons et retourne son identifiant."""
+        asset_id = self.store.put(session_id, data, mime or sniff_mime(data))
+        self._submit(session_id, asset_id, data)
+        return asset_id
+
+    def _submit(self, session_id, asset_id, data):
+        with self._lock:
+            future = self._jobs.get(asset_id)
+            if future is not None:
+                self._jobs.move_to_end(asset_id)
+                return future
+            future = self._executor.submit(self._transcode, session_id, asset_id, data)
+            self._jobs[asset_id] = future
+            self.stats["jobs"] += 1
+            while len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+            return future
+
+    def _transcode(self, session_id, asset_id, data):
+        from PIL import Image
+
+        try:
+            with Image.open(BytesIO(data)) as img:
+                img.load()   # Décodage unique, partagé par toutes les déclinaisons
+                clean = not (set(img.info) & {"exif", "icc_profile", "xmp"})
+                ids = {}
+                for name, spec in self.renditions.items():
+                    max_width = spec.get("max_width")
+                    img_format = spec.get("format", "AUTO")
+                    encoded, mime = encode_rendition(img, max_width, img_format, spec.get("quality", 82))
+                    # Un original déjà léger (aplats, petit format) au bon format peut servir tel quel
+                    if (clean and img.format == resolve_format(img, img_format) and len(encoded) >= len(data)
+                            and (not max_width or img.width <= max_width)):
+                        ids[name] = asset_id
+                        continue
+                    ids[name] = self.store.put(session_id, encoded, mime)
+                    with self._lock:
+                        self.stats["rendition_bytes"] += len(encoded)
+        except Exception as e:
+            with self._lock:
+                self.stats["failures"] += 1
+            # get() sert alors l'original sans signaler l'erreur
+            logger.warning("Déclinaisons d'image impossibles (%s) : %s", asset_id, e)
+            raise
+        with self._lock:
+            self.stats["original_bytes"] += len(data)
+        return ids
+
+    def ready(self, asset_id):
+        """Vrai si les déclinaisons de l'asset sont calculées (ou en échec) : get() répond sans attendre."""
+        with self._lock:
+            future = self._jobs.get(asset_id)
+        return future is not None and future.done()
+
+    def get(self, session_id, asset_id, name, timeout=None):
+        """
+        Octets de la déclinaison `name` d'un asset de la session. Tant qu'elle
+        n'est pas prête (au-delà de `timeout` secondes) ou si elle a échoué,
+        l'original est retourné. None si la session n'a pas accès à l'original.
+        """
+        original = self.store.get(session_id, asset_id)
+        if original is None:
+            return None
+        future = self._submit(session_id, asset_id, original)
+        try:
+            rendition_id = future.result(timeout=timeout).get(name)
+        except FutureTimeoutError:
+            return original
+        except Exception:
+            return original
+        if rendition_id is None:
+            return original
+        self.store.grant(session_id, rendition_id)
+        data = self.store.get(session_id, rendition_id)
+        if data is None:
+            # Déclinaison évincée du stockage : elle sera recalculée au prochain accès
+            with self._lock:
+                if self._jobs.get(asset_id) is future:
+                    del self._jobs[asset_id]
+            return original
+        return data
+
+
+_default_renditions = None
+_default_renditions_lock = threading.Lock()
+
+
+def get_image_renditions(**kwargs):
+    """Instance partagée par toutes les sessions du processus."""
+    global _default_renditions
+    with _default_renditions_lock:
+        if _default_renditions is None:
+            _default_renditions = ImageRenditions(**kwargs)
+        return _default_renditions
@@ -0,0 +1,66 @@
+# --- Cache approché des analyses (campagnes voisines)
+# Deux campagnes qui ne diffèrent que de quelques centaines d'euros reçoivent
+# de Gemini des analyses quasi identiques. Les paramètres numériques sont
+# ramenés à des tranches (ex. budget par tranches de 2 500 €) : la dernière
+# analyse de la tranche est conservée et peut servir, après ajustement, à une
+# demande voisine. Les entrées sont stockées dans le cache de réponses (espace
+# de noms « neighbor »), avec sa persistance, son TTL et son éviction.
+import json
+import threading
+
+from response_cache import get_response_cache, make_cache_key
+
+NAMESPACE = "neighbor"
+DEFAULT_BANDS = {"budget": 2500}
+
+
+def band_of(value, width):
+    """Indice de la tranche de largeur `width` qui contient `value`."""
+    return int(value // width)
+
+
+class NeighborCache:
+    def __init__(self, bands=DEFAULT_BANDS, cache=None):
+        self.bands = dict(bands)
+        self.cache = cache if cache is not None else get_response_cache()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "writes": 0}
+
+    def key(self, model_name, params, context=None):
+        """Clé commune à toutes les demandes de la même tranche (paramètres non numériques identiques)."""
+        banded = {name: (f"tranche {band_of(value, self.bands[name])}" if self.bands.get(name) else value)
+                  for name, value in params.items()}
+        signature = json.dumps({"params": banded, "context": context or {}}, sort_keys=True, ensure_ascii=False)
+        return make_cache_key(model_name, signature, NAMESPACE)
+
+    def get(self, model_name, params, context=None):
+        """Dernière entrée de la tranche : {"params", "value"}, ou None."""
+        raw = self.cache.get(self.key(model_name, params, context), count_stats=False)
+        entry = None
+        if raw is not None:
+            try:
+                entry = json.loads(raw)
+            except json.JSONDecodeError:
+                entry = None
+        with self._lock:
+            self.stats["hits" if entry is not None else "misses"] += 1
+        return entry
+
+    def set(self, model_name, params, value, context=None):
+        entry = json.dumps({"params": params, "value": value}, ensure_ascii=False)
+        self.cache.set(self.key(model_name, params, context), entry, model_name=model_name)
+        with self._lock:
+            self.stats["writes"] += 1
+
+
+_default_neighbor_cache = None
+_default_neighbor_cache_lock = threading.Lock()
+
+
+def get_neighbor_cache(**kwargs):
+    """Instance partagée par toutes les sessions du processus."""
+    global _default_neighbor_cache
+    with _default_neighbor_cache_lock:
+        if _default_neighbor_cache is None:
+            _default_neighbor_cache = NeighborCache(**kwargs)
+        return _default_neighbor_cache
@@ -0,0 +1,430 @@
+# --- Rapport PDF complet (synthèse, analyse, graphiques, images)
+# Le rapport est décrit par un dictionnaire de données simples (textes,
+# tableaux de valeurs, octets d'images) et rendu avec fpdf2 :
+# - polices DejaVuSans réduites une fois par processus aux plages Unicode
+#   utiles (REPORT_UNICODE_RANGES) ; fpdf2 n'embarque ensuite que les glyphes
+#   réellement utilisés. Les caractères absents (emojis) sont retirés du texte ;
+# - images lues depuis la mémoire (BytesIO), sans fichier temporaire ; un JPEG
+#   est inclus tel quel, sans ré-encodage ;
+# - graphiques dessinés en primitives PDF (tracés, polygones, rectangles) :
+#   ni Plotly ni navigateur headless.
+# Sans les polices, le rapport est rendu en Helvetica (latin-1).
+import logging
+import math
+import os
+import re
+import threading
+from io import BytesIO
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+FONT_FAMILY = "DejaVu"
+FONT_CACHE_DIR = ".cache/fonts"
+REPORT_UNICODE_RANGES = (
+    (0x0020, 0x007E),   # ASCII
+    (0x00A0, 0x024F),   # Latin-1, Latin étendu A et B
+    (0x2000, 0x206F),   # Ponctuation générale (tirets, guillemets, puces)
+    (0x20A0, 0x20CF),   # Symboles monétaires
+    (0x2100, 0x215F),   # Symboles de type lettre (№, ™)
+    (0x2190, 0x21FF),   # Flèches
+    (0x2200, 0x22FF),   # Opérateurs mathématiques
+    (0x25A0, 0x25FF),   # Formes géométriques
+    (0x2600, 0x27BF),   # Symboles divers et dingbats
+)
+
+PAGE_MARGIN = 15
+TEXT_COLOR = (31, 41, 55)
+MUTED_COLOR = (107, 114, 128)
+GRID_COLOR = (229, 231, 235)
+PANEL_COLOR = (243, 244, 246)
+BAND_OPACITY = 0.3
+POINT_RADIUS = 1.1   # mm : points de la médiane
+IMAGE_MAX_HEIGHT = 130   # mm : une image tient sur une page avec son titre
+
+_MARKDOWN_SPECIALS = ("__", "--", "~~")
+_HEADING = re.compile(r"^(#{1,6})\s+(.*)$")
+_BULLET = re.compile(r"^(\s*)[-*+]\s+(.*)$")
+_NUMBERED = re.compile(r"^(\s*)(\d+[.)])\s+(.*)$")
+_RULE = re.compile(r"^\s*([-*_])(\s*\1){2,}\s*$")
+_TABLE_SEPARATOR = re.compile(r"^\s*\|?\s*:?-{2,}:?\s*(\|\s*:?-{2,}:?\s*)*\|?\s*$")
+_ITALIC = re.compile(r"(?<![*\w])[*_](?![*_\s])(.+?)(?<![*_\s])[*_](?![*\w])")
+
+
+# --- Polices (réduites une seule fois par processus)
+_fonts = {}
+_fonts_lock = threading.Lock()
+
+
+def _subset_font(source, target):
+    from fontTools import subset
+    from fontTools.ttLib import TTFont
+
+    options = subset.Options()
+    options.layout_features = ["*"]
+    options.name_IDs = ["*"]
+    options.notdef_outline = True
+    options.glyph_names = True
+    options.drop_tables += ["FFTM"]   # Horodatage FontForge, inutile à l'affichage
+    subsetter = subset.Subsetter(options)
+    subsetter.populate(unicodes=[code for start, end in REPORT_UNICODE_RANGES for code in range(start, end + 1)])
+    font = TTFont(source)
+    subsetter.subset(font)
+    tmp = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+    font.save(tmp)
+    os.replace(tmp, target)
+
+
+def prepare_fonts(regular_path, bold_path, cache_dir=FONT_CACHE_DIR):
+    """
+    Polices du rapport : {"regular", "bold", "charset"} (chemins des polices
+    réduites et caractères couverts), ou None si elles sont indisponibles.
+    Les fichiers réduits sont recalculés quand la police d'origine change.
+    """
+    if not regular_path or not bold_path:
+        return None
+    try:
+        signature = tuple((path, os.stat(path).st_mtime_ns) for path in (regular_path, bold_path))
+    except OSError:
+        return None
+    with _fonts_lock:
+        if signature in _fonts:
+            return _fonts[signature]
+        try:
+            from fontTools.ttLib import TTFont
+
+            Path(cache_dir).mkdir(parents=True, exist_ok=True)
+            paths = {}
+            for style, (path, mtime) in zip(("regular", "bold"), signature):
+                target = Path(cache_dir) / f"{Path(path).stem}-report-{mtime}.ttf"
+                if not target.exists():
+                    _subset_font(path, str(target))
+                paths[style] = str(target)
+            with TTFont(paths["regular"], lazy=True) as font:
+                charset = frozenset(chr(code) for code in font.getBestCmap())
+            fonts = dict(paths, charset=charset)
+        except Exception as e:
+            logger.warning("Polices du rapport indisponibles, rendu en Helvetica : %s", e)
+            fonts = None
+        _fonts[signature] = fonts
+        return fonts
+
+
+def clean_text(text, charset=None):
+    """Texte limité aux caractères de la police (latin-1 sans police Unicode)."""
+    text = text.replace("\r", "")
+    if charset is None:
+        text = text.encode("latin-1", "ignore").decode("latin-1")
+    else:
+        text = "".join(c for c in text if c in charset or c == "\n")
+    # Un emoji retiré laisse souvent un double espace
+    return re.sub(r"(?<=\S) {2,}", " ", text)
+
+
+def _inline(text, charset):
+    """Markdown en ligne vers le sous-ensemble compris par fpdf2 (gras seulement)."""
+    text = clean_text(text, charset).replace("\\", "\\\\")
+    for marker in _MARKDOWN_SPECIALS:
+        text = text.replace(marker, "\\" + marker)
+    text = _ITALIC.sub(r"\1", text)
+    return text.replace("`", "").strip()
+
+
+# --- Document
+def _report_pdf_class():
+    from fpdf import FPDF
+
+    class ReportPDF(FPDF):
+        report_font = "helvetica"
+
+        def footer(self):
+            self.set_y(-12)
+            self.set_font(self.report_font, "", 8)
+            self.set_text_color(*MUTED_COLOR)
+            self.cell(0, 6, f"Page {self.page_no()}/{{nb}}", align="C")
+
+    return ReportPDF
+
+
+def _set_font(pdf, size, bold=False):
+    pdf.set_font(pdf.report_font, "B" if bold else "", size)
+
+
+def _ensure_space(pdf, height):
+    if pdf.get_y() + height > pdf.page_break_trigger:
+        pdf.add_page()
+
+
+def _section_title(pdf, title, charset, keep_with=20):
+    """Titre de section, gardé sur la même page que les `keep_with` mm qui suivent."""
+    _ensure_space(pdf, 15 + keep_with)
+    pdf.ln(4)
+    _set_font(pdf, 14, bold=True)
+    pdf.set_text_color(*TEXT_COLOR)
+    pdf.multi_cell(0, 8, clean_text(title, charset).strip(), new_x="LMARGIN")
+    y = pdf.get_y() + 1
+    pdf.set_draw_color(*GRID_COLOR)
+    pdf.line(pdf.l_margin, y, pdf.w - pdf.r_margin, y)
+    pdf.set_y(y + 3)
+
+
+def _header(pdf, report, logo, charset):
+    top = pdf.get_y()
+    if logo:
+        try:
+            pdf.image(BytesIO(logo), x=pdf.l_margin, y=top, w=30)
+        except Exception as e:
+            logger.warning("Logo du rapport illisible : %s", e)
+    pdf.set_xy(pdf.l_margin + 35, top + 4)
+    _set_font(pdf, 18, bold=True)
+    pdf.set_text_color(*TEXT_COLOR)
+    title = report.get("title", "Rapport d'Analyse Marketing")
+    pdf.multi_cell(0, 9, clean_text(title, charset), new_x="LMARGIN")
+    if report.get("subtitle"):
+        pdf.set_x(pdf.l_margin + 35)
+        _set_font(pdf, 10)
+        pdf.set_text_color(*MUTED_COLOR)
+        pdf.multi_cell(0, 5, clean_text(report["subtitle"], charset), new_x="LMARGIN")
+    pdf.set_y(max(pdf.get_y(), top + 30) + 4)
+
+
+def _summary(pdf, rows, charset):
+    """Tableau clé / valeur sur deux colonnes de paires."""
+    if not rows:
+        return
+    width = (pdf.w - pdf.l_margin - pdf.r_margin) / 2
+    label_width = width * 0.42
+    pdf.set_fill_color(*PANEL_COLOR)
+    for start in range(0, len(rows), 2):
+        _ensure_space(pdf, 8)
+        for index, (label, value) in enumerate(rows[start:start + 2]):
+            pdf.set_x(pdf.l_margin + index * width)
+            _set_font(pdf, 9)
+            pdf.set_text_color(*MUTED_COLOR)
+            pdf.cell(label_width, 7, clean_text(label, charset), fill=True)
+            value = clean_text(str(value), charset)
+            size = 10
+            _set_font(pdf, size, bold=True)
+            while size > 6 and pdf.get_string_width(value) > width - label_width - 4:
+                size -= 1
+                _set_font(pdf, size, bold=True)
+            pdf.set_text_color(*TEXT_COLOR)
+            pdf.cell(width - label_width - 2, 7, value, fill=True)
+        pdf.ln(8)
+
+
+def _markdown(pdf, text, charset):
+    """Rendu simple du markdown de Gemini : titres, listes, règles, tableaux, gras."""
+    width = pdf.w - pdf.l_margin - pdf.r_margin
+    pdf.set_text_color(*TEXT_COLOR)
+    for raw in text.splitlines():
+        line = raw.rstrip()
+        if not line.strip():
+            pdf.ln(2)
+            continue
+        if _RULE.match(line):
+            _ensure_space(pdf, 4)
+            y = pdf.get_y() + 2
+            pdf.set_draw_color(*GRID_COLOR)
+            pdf.line(pdf.l_margin, y, pdf.w - pdf.r_margin, y)
+            pdf.set_y(y + 2)
+            continue
+        if _TABLE_SEPARATOR.match(line) and "|" in line:
+            continue
+        heading = _HEADING.match(line)
+        if heading:
+            _ensure_space(pdf, 16)
+            pdf.ln(2)
+            _set_font(pdf, max(10, 15 - len(heading.group(1))), bold=True)
+            pdf.multi_cell(0, 7, _inline(heading.group(2), charset).replace("**", ""), markdown=True,
+                           new_x="LMARGIN")
+            pdf.ln(1)
+            continue
+        if line.lstrip().startswith("|"):
+            cells = [cell.strip() for cell in line.strip().strip("|").split("|")]
+            line = "  ·  ".join(cells)
+        indent, prefix = 0, ""
+        item = _BULLET.match(line) or _NUMBERED.match(line)
+        if item:
+            groups = item.groups()
+            indent = 5 + 4 * (len(groups[0]) // 2)
+            prefix = "•" if len(groups) == 2 else groups[1]
+            line = groups[-1]
+        _set_font(pdf, 10)
+        _ensure_space(pdf, 6)
+        if prefix:
+            pdf.set_x(pdf.l_margin + indent - 4)
+            pdf.cell(4 if prefix == "•" else 6, 5.5, clean_text(prefix, charset) or "-")
+            pdf.set_x(pdf.l_margin + indent + (0 if prefix == "•" else 2))
+        pdf.multi_cell(width - indent - (0 if prefix in ("", "•") else 2), 5.5, _inline(line, charset),
+                       markdown=True, new_x="LMARGIN")
+
+
+def _image(pdf, data, title, caption, charset):
+    from PIL import Image
+
+    try:
+        with Image.open(BytesIO(data)) as img:
+            size = img.size
+    except Exception as e:
+        logger.warning("Image du rapport illisible (%s) : %s", title, e)
+        return
+    width = pdf.w - pdf.l_margin - pdf.r_margin
+    height = width * size[1] / size[0]
+    if height > IMAGE_MAX_HEIGHT:
+        width, height = width * IMAGE_MAX_HEIGHT / height, IMAGE_MAX_HEIGHT
+    _section_title(pdf, title, charset, keep_with=height + 2)
+    pdf.image(BytesIO(data), x=(pdf.w - width) / 2, y=pdf.get_y(), w=width, h=height)
+    pdf.set_y(pdf.get_y() + height + 2)
+    if caption:
+        _set_font(pdf, 8)
+        pdf.set_text_color(*MUTED_COLOR)
+        pdf.multi_cell(0, 4, clean_text(caption, charset), align="C", new_x="LMARGIN")
+
+
+# --- Graphiques vectoriels
+def _rgb(color):
+    return tuple(int(color[i:i + 2], 16) for i in (1, 3, 5))
+
+
+def nice_ticks(low, high, count=4):
+    """Graduations « rondes » couvrant [low, high]."""
+    if high <= low:
+        high = low + 1
+    raw = (high - low) / count
+    magnitude = 10 ** math.floor(math.log10(raw))
+    step = next(m * magnitude for m in (1, 2, 2.5, 5, 10) if m * magnitude >= raw)
+    start = math.floor(low / step) * step
+    ticks = [start]
+    while ticks[-1] < high - 1e-9:
+        ticks.append(ticks[-1] + step)
+    return ticks
+
+
+def _tick_label(value):
+    if abs(value) >= 1000:
+        return f"{value:,.0f}".replace(",", " ")
+    return f"{value:g}"
+
+
+def _chart(pdf, chart, x, y, width, height, charset):
+    """
+    Graphique d'une bande de percentiles (P10, P50, P90) : zone P10–P90 et
+    médiane ("band"), ou barres de la médiane avec barres d'erreur ("bar").
+    La zone de tracé occupe le rectangle (x, y, width, height) en mm.
+    """
+    labels = chart["labels"]
+    p10, p50, p90 = (list(map(float, row)) for row in chart["band"])
+    color = _rgb(chart["color"])
+    bar = chart.get("kind") == "bar"
+
+    _set_font(pdf, 10, bold=True)
+    pdf.set_text_color(*TEXT_COLOR)
+    pdf.set_xy(x, y)
+    pdf.cell(width, 6, clean_text(chart["title"], charset))
+    ticks = nice_ticks(0 if bar else min(p10), max(p90))
+    low, high = ticks[0], ticks[-1]
+    left, top = x + 14, y + 9
+    plot_width, plot_height = width - 16, height - 17
+    bottom = top + plot_height
+    slot = plot_width / len(labels)
+
+    def px(index):
+        return left + slot * (index + 0.5)
+
+    def py(value):
+        return bottom - (value - low) / (high - low) * plot_height
+
+    # Grille et axe des valeurs
+    _set_font(pdf, 7)
+    pdf.set_text_color(*MUTED_COLOR)
+    pdf.set_draw_color(*GRID_COLOR)
+    pdf.set_line_width(0.2)
+    for tick in ticks:
+        pdf.line(left, py(tick), left + plot_width, py(tick))
+        pdf.set_xy(x, py(tick) - 2)
+        pdf.cell(13, 4, _tick_label(tick), align="R")
+    for index, label in enumerate(labels):
+        pdf.set_xy(px(index) - slot / 2, bottom + 1)
+        pdf.cell(slot, 4, clean_text(label, charset), align="C")
+
+    pdf.set_draw_color(*color)
+    pdf.set_fill_color(*color)
+    if bar:
+        for index, value in enumerate(p50):
+            pdf.rect(px(index) - slot * 0.3, py(value), slot * 0.6, bottom - py(value), style="F")
+        pdf.set_draw_color(*TEXT_COLOR)
+        pdf.set_line_width(0.3)
+        for index in range(len(labels)):
+            cx = px(index)
+            pdf.line(cx, py(p10[index]), cx, py(p90[index]))
+            for value in (p10[index], p90[index]):
+                pdf.line(cx - 1.2, py(value), cx + 1.2, py(value))
+    else:
+        outline = ([(px(i), py(v)) for i, v in enumerate(p90)]
+                   + [(px(i), py(v)) for i, v in reversed(list(enumerate(p10)))])
+        with pdf.local_context(fill_opacity=BAND_OPACITY):
+            pdf.polygon(outline, style="F")
+        pdf.set_line_width(0.8)
+        pdf.polyline([(px(i), py(v)) for i, v in enumerate(p50)])
+        # ellipse() plutôt que circle() : même signature depuis fpdf2 2.7 (circle() prend le centre depuis 2.8.1)
+        for index, value in enumerate(p50):
+            pdf.ellipse(px(index) - POINT_RADIUS, py(value) - POINT_RADIUS, 2 * POINT_RADIUS, 2 * POINT_RADIUS,
+                        style="F")
+        if chart.get("show_values"):
+            _set_font(pdf, 7)
+            pdf.set_text_color(*TEXT_COLOR)
+            for index, value in enumerate(p50):
+                pdf.set_xy(px(index) - slot / 2, py(value) - 5.5)
+                pdf.cell(slot, 4, _tick_label(round(value)), align="C")
+    pdf.set_line_width(0.2)
+
+    # Légende
+    _set_font(pdf, 7)
+    pdf.set_text_color(*MUTED_COLOR)
+    pdf.set_xy(left, bottom + 5)
+    pdf.cell(plot_width, 4, clean_text("Médiane et intervalle P10 à P90 (simulation Monte Carlo)", charset),
+             align="R")
+
+
+def _charts(pdf, title, charts, charset):
+    width = pdf.w - pdf.l_margin - pdf.r_margin
+    height = 62
+    _section_title(pdf, title, charset, keep_with=height)
+    for chart in charts:
+        _ensure_space(pdf, height + 4)
+        y = pdf.get_y()
+        _chart(pdf, chart, pdf.l_margin, y, width, height, charset)
+        pdf.set_y(y + height + 4)
+
+
+def render_report(report, fonts=None, logo=None):
+    """
+    Octets PDF du rapport. `report` : title, subtitle, summary [(libellé,
+    valeur)], sections [{"title", "markdown"} | {"title", "image", "caption"}
+    | {"title", "charts"}] ; `fonts` : résultat de prepare_fonts.
+    """
+    pdf = _report_pdf_class()()
+    pdf.set_margins(PAGE_MARGIN, PAGE_MARGIN, PAGE_MARGIN)
+    pdf.set_auto_page_break(True, margin=PAGE_MARGIN + 5)
+    pdf.set_title(report.get("title", "Rapport d'Analyse Marketing"))
+    charset = None
+    if fonts:
+        pdf.add_font(FONT_FAMILY, "", fonts["regular"])
+        pdf.add_font(FONT_FAMILY, "B", fonts["bold"])
+        pdf.report_font = FONT_FAMILY
+        charset = fonts["charset"]
+    pdf.add_page()
+    _header(pdf, report, logo, charset)
+    _summary(pdf, report.get("summary"), charset)
+
+    for section in report.get("sections", []):
+        if section.get("image"):
+            _image(pdf, section["image"], section["title"], section.get("caption"), charset)
+        elif section.get("charts"):
+            _charts(pdf, section["title"], section["charts"], charset)
+        elif section.get("markdown"):
+            _section_title(pdf, section["title"], charset)
+            _markdown(pdf, section["markdown"], charset)
+
+    return bytes(pdf.output())
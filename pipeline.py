@@ -0,0 +1,111 @@
+# --- Orchestrateur du pipeline d'analyse
+# Exécute les étapes indépendantes (appels Gemini, rendus locaux) en parallèle
+# dans un pool de threads, en respectant leurs dépendances, et conserve les
+# résultats partiels lorsqu'une étape échoue.
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# Statuts possibles d'une étape
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+SKIPPED = "skipped"
+
+
+class Stage:
+    """
+    Une étape du pipeline. `func` reçoit le dictionnaire des résultats déjà
+    disponibles et retourne la valeur de l'étape (None = pas de résultat).
+    """
+
+    def __init__(self, name, func, depends_on=(), label=None):
+        self.name = name
+        self.func = func
+        self.depends_on = tuple(depends_on)
+        self.label = label or name
+
+
+class PipelineResult:
+    def __init__(self):
+        self.results = {}
+        self.statuses = {}
+        self.errors = {}
+        self.durations = {}
+
+    def get(self, name, default=None):
+        return self.results.get(name, default)
+
+    def ok(self, name):
+        return self.statuses.get(name) == DONE and self.results.get(name) is not None
+
+
+def run_pipeline(stages, max_workers=4, on_update=None, worker_init=None):
+    """
+    Exécute les étapes dès que leurs dépendances sont satisfaites.
+
+    - Une étape dont une dépendance a échoué ou n'a rien retourné est ignorée.
+    - `on_update(stage, status, result)` est appelé depuis le thread appelant,
+      ce qui permet de mettre à jour l'interface Streamlit en toute sécurité.
+    - `worker_init()` est exécuté dans chaque thread avant l'étape (par exemple
+      pour rattacher le contexte d'exécution Streamlit).
+    """
+    by_name = {stage.name: stage for stage in stages}
+    for stage in stages:
+        for dep in stage.depends_on:
+            if dep not in by_name:
+                raise ValueError(f"Étape '{stage.name}' : dépendance inconnue '{dep}'")
+
+    result = PipelineResult()
+    for stage in stages:
+        result.statuses[stage.name] = PENDING
+
+    def notify(stage, status):
+        result.statuses[stage.name] = status
+        if on_update:
+            on_update(stage, status, result)
+
+    def execute(stage, inputs):
+        if worker_init:
+            worker_init()
+        start = time.perf_counter()
+        try:
+            return stage.func(inputs)
+        finally:
+            result.durations[stage.name] = time.perf_counter() - start
+
+    running = {}
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pipeline") as executor:
+        while True:
+            # Lancer (ou ignorer) toutes les étapes en attente dont les dépendances sont résolues
+            progressed = True
+            while progressed:
+                progressed = False
+                for stage in stages:
+                    if result.statuses[stage.name] != PENDING:
+                        continue
+                    dep_statuses = [result.statuses[dep] for dep in stage.depends_on]
+                    if any(s in (PENDING, RUNNING) for s in dep_statuses):
+                        continue
+                    progressed = True
+                    if not all(result.ok(dep) for dep in stage.depends_on):
+                        notify(stage, SKIPPED)
+                        continue
+                    inputs = dict(result.results)
+                    running[executor.submit(execute, stage, inputs)] = stage
+                    notify(stage, RUNNING)
+
+            if not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage = running.pop(future)
+                try:
+                    result.results[stage.name] = future.result()
+                    notify(stage, DONE)
+                except Exception as e:
+                    result.errors[stage.name] = e
+                    notify(stage, FAILED)
+
+    return result
@@ -0,0 +1,219 @@
+# --- Ordonnanceur partagé des appels Gemini
+# Un seau à jetons par modèle (requêtes/minute et tokens/minute), une file
+# d'attente équitable entre sessions (tourniquet) et des nouvelles tentatives
+# avec backoff exponentiel bruité sur les erreurs 429, en respectant les délais
+# suggérés par l'API.
+import random
+import re
+import threading
+import time
+from collections import deque
+from itertools import count
+
+DEFAULT_RPM = 10
+DEFAULT_TPM = 250_000
+DEFAULT_OUTPUT_TOKENS = 1_500
+
+
+class TokenBucket:
+    """Seau à jetons rempli en continu : `capacity` jetons par minute."""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """Temps à attendre avant de pouvoir consommer `amount` jetons (0 si disponible)."""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount, now):
+        self._refill(now)
+        self.tokens -= min(amount, self.capacity)
+
+    def drain(self, now):
+        self._refill(now)
+        self.tokens = min(self.tokens, 0.0)
+
+
+def retry_after(exc):
+    """Extrait le délai suggéré par l'API (RetryInfo ou « retry in Xs ») d'une erreur 429."""
+    for detail in getattr(exc, "details", None) or []:
+        delay = getattr(detail, "retry_delay", None)
+        if delay is not None:
+            return getattr(delay, "seconds", 0) + getattr(delay, "nanos", 0) / 1e9
+    match = re.search(r"retry in ([\d.]+)\s*s", str(exc), re.IGNORECASE)
+    if match:
+        return float(match.group(1))
+    return None
+
+
+class _ModelQueue:
+    def __init__(self, rpm, tpm):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.tickets = {}         # session -> deque de tickets
+        self.rotation = deque()   # ordre de passage des sessions
+
+    def position(self, session_id, ticket):
+        """Nombre de requêtes servies avant `ticket` dans l'ordre du tourniquet."""
+        own = self.tickets.get(session_id)
+        if not own or ticket not in own:
+            return 0
+        rank = own.index(ticket)
+        session_index = self.rotation.index(session_id)
+        ahead = 0
+        for index, other in enumerate(self.rotation):
+            pending = len(self.tickets[other])
+            ahead += min(pending, rank)
+            if index < session_index and pending > rank:
+                ahead += 1
+        return ahead
+
+    def is_next(self, session_id, ticket):
+        return bool(self.rotation) and self.rotation[0] == session_id and self.tickets[session_id][0] == ticket
+
+    def pop(self, session_id):
+        own = self.tickets[session_id]
+        own.popleft()
+        self.rotation.popleft()
+        if own:
+            self.rotation.append(session_id)
+        else:
+            del self.tickets[session_id]
+
+
+class GeminiScheduler:
+    def __init__(self, limits=None, default_limits=(DEFAULT_RPM, DEFAULT_TPM), max_retries=4,
+                 base_delay=1.0, max_delay=32.0, retry_on=None):
+        self.limits = dict(limits or {})
+        self.default_limits = default_limits
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        if retry_on is None:
+            from google.api_core import exceptions as google_exceptions
+
+            retry_on = (google_exceptions.ResourceExhausted,)
+        self.retry_on = retry_on
+        self._queues = {}
+        self._cond = threading.Condition()
+        self._tickets = count()
+        self.stats = {"calls": 0, "retries": 0, "throttled": 0, "queued_seconds": 0.0}
+
+    def _queue(self, model_name):
+        queue = self._queues.get(model_name)
+        if queue is None:
+            queue = self._queues[model_name] = _ModelQueue(*self.limits.get(model_name, self.default_limits))
+        return queue
+
+    def acquire(self, session_id, model_name, tokens, on_wait=None):
+        """Bloque jusqu'à ce que ce soit le tour de la session et que le quota le permette."""
+        started = time.monotonic()
+        last_notice = None
+        with self._cond:
+            queue = self._queue(model_name)
+            ticket = next(self._tickets)
+            if session_id not in queue.tickets:
+                queue.tickets[session_id] = deque()
+                queue.rotation.append(session_id)
+            queue.tickets[session_id].append(ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    if queue.is_next(session_id, ticket):
+                        wait = max(queue.requests.wait_time(1, now), queue.tokens.wait_time(tokens, now))
+                        if wait == 0:
+                            queue.requests.consume(1, now)
+                            queue.tokens.consume(tokens, now)
+                            queue.pop(session_id)
+                            self._cond.notify_all()
+                            break
+                        position = 0
+                    else:
+                        wait = 1.0
+                        position = queue.position(session_id, ticket)
+                    if on_wait and last_notice != (position, round(wait)):
+                        last_notice = (position, round(wait))
+                        on_wait(position, wait, 0)
+                    self._cond.wait(timeout=min(wait, 1.0))
+            except BaseException:
+                # Ne pas bloquer la file si l'attente est interrompue
+                if ticket in queue.tickets.get(session_id, ()):
+                    queue.tickets[session_id].remove(ticket)
+                    if not queue.tickets[session_id]:
+                        del queue.tickets[session_id]
+                        queue.rotation.remove(session_id)
+                    self._cond.notify_all()
+                raise
+            self.stats["queued_seconds"] += time.monotonic() - started
+
+    def record_usage(self, model_name, estimated, actual):
+        """Corrige le seau de tokens avec la consommation réelle rapportée par l'API."""
+        if actual is None:
+            return
+        with self._cond:
+            queue = self._queue(model_name)
+            queue.tokens.consume(actual - estimated, time.monotonic())
+
+    def call(self, session_id, model_name, request, estimated_tokens=DEFAULT_OUTPUT_TOKENS, on_wait=None):
+        """
+        Exécute `request()` dans le respect des quotas. En cas de 429, la
+        requête est remise en file après un backoff ; l'erreur est relancée
+        après `max_retries` tentatives.
+        """
+        attempt = 0
+        while True:
+            self.acquire(session_id, model_name, estimated_tokens, on_wait)
+            with self._cond:
+                self.stats["calls"] += 1
+            try:
+                response = request()
+            except self.retry_on as e:
+                with self._cond:
+                    self.stats["throttled"] += 1
+                    # Le quota serveur est atteint : les autres sessions doivent aussi patienter
+                    self._queue(model_name).requests.drain(time.monotonic())
+                if attempt >= self.max_retries:
+                    raise
+                hint = retry_after(e)
+                backoff = min(self.max_delay, self.base_delay * 2 ** attempt)
+                delay = (hint if hint is not None else backoff) + random.uniform(0, backoff / 2)
+                attempt += 1
+                with self._cond:
+                    self.stats["retries"] += 1
+                if on_wait:
+                    on_wait(0, delay, attempt)
+                time.sleep(delay)
+                continue
+
+            try:
+                usage = getattr(response, "usage_metadata", None)
+                actual = getattr(usage, "total_token_count", None)
+            except Exception:
+                # Réponse en streaming pas encore consommée : on garde l'estimation
+                actual = None
+            self.record_usage(model_name, estimated_tokens, actual)
+            return response
+
+
+_default_scheduler = None
+_default_scheduler_lock = threading.Lock()
+
+
+def get_scheduler(**kwargs):
+    """Instance partagée par toutes les sessions du processus."""
+    global _default_scheduler
+    with _default_scheduler_lock:
+        if _default_scheduler is None:
+            _default_scheduler = GeminiScheduler(**kwargs)
+        return _default_scheduler
@@ -0,0 +1,286 @@
+# --- Moteur de score de qualité des analyses
+# Reconnaît les termes des lexiques français et anglais (mots entiers, formes
+# fléchies listées explicitement), les indicateurs (ROI, CPA) et les négations
+# (« pas élevé », « not high »). Chaque groupe de termes a un poids
+# configurable ; le résultat détaille le score.
+# Comme l'ancienne évaluation, le texte n'est parcouru que par des recherches
+# de sous-chaînes (en C) : une par préfixe commun à plusieurs formes, arrêtées
+# dès qu'un groupe a un terme retenu. Mots entiers et négation ne sont
+# vérifiés qu'aux positions trouvées.
+import operator
+import threading
+from os.path import commonprefix
+
+# Groupes pondérés : un groupe compte au plus une fois (au moins un terme non nié).
+# `requires` : indicateur qui doit apparaître dans le texte pour que le groupe compte.
+# Les accords (genre, nombre) sont des formes à part entière : « bas » ne reconnaît pas « base ».
+DEFAULT_LEXICON = {
+    "roi_positif": {
+        "weight": 2,
+        "requires": "roi",
+        "terms": {
+            "fr": ["élevé", "élevée", "élevés", "élevées", "fort", "forte", "forts", "fortes",
+                   "important", "importante", "importants", "importantes",
+                   "supérieur", "supérieure", "supérieurs", "supérieures",
+                   "excellent", "excellente", "excellents", "excellentes"],
+            "en": ["high", "strong", "significant", "above average", "excellent"],
+        },
+    },
+    "cpa_maitrise": {
+        "weight": 2,
+        "requires": "cpa",
+        "terms": {
+            "fr": ["faible", "faibles", "bas", "basse", "basses", "réduit", "réduite", "réduits", "réduites",
+                   "optimisé", "optimisée", "optimisés", "optimisées"],
+            "en": ["low", "reduced", "optimized", "optimised"],
+        },
+    },
+    "exceptionnel": {
+        "weight": 3,
+        "terms": {
+            "fr": ["exceptionnel", "exceptionnelle", "exceptionnels", "exceptionnelles",
+                   "excellent", "excellente", "excellents", "excellentes", "remarquable", "remarquables"],
+            "en": ["exceptional", "excellent", "outstanding", "remarkable"],
+        },
+    },
+    "efficacite": {
+        "weight": 2,
+        "terms": {
+            "fr": ["efficace", "efficaces", "performant", "performante", "performants", "performantes",
+                   "rentable", "rentables", "optimisé", "optimisée", "optimisés", "optimisées"],
+            "en": ["effective", "efficient", "high-performing", "profitable", "optimized", "optimised"],
+        },
+    },
+}
+
+DEFAULT_ANCHORS = {
+    "roi": ["roi", "retour sur investissement", "return on investment"],
+    "cpa": ["cpa", "coût par acquisition", "cost per acquisition"],
+}
+
+DEFAULT_NEGATIONS = {
+    "fr": ["pas", "non", "peu", "guère", "jamais", "sans", "aucun", "aucune"],
+    "en": ["not", "no", "never", "hardly", "without", "isn't", "aren't", "won't", "barely"],
+}
+
+# Une conjonction ou une ponctuation termine la portée d'une négation (« pas élevé mais important »)
+DEFAULT_CONJUNCTIONS = {
+    "fr": ["mais", "et", "ou", "donc", "car", "puis", "cependant", "pourtant", "toutefois", "néanmoins"],
+    "en": ["but", "and", "or", "so", "yet", "then", "however", "although", "though", "whereas", "while"],
+}
+_CLAUSE_PUNCTUATION = frozenset(".,;:!?()[]{}«»\"“”…—–")
+
+DEFAULT_THRESHOLDS = (("excellent", 5), ("good", 3))
+# Un budget élevé relève les attentes : (comparaison, seuil, facteur), le premier qui s'applique.
+# Plus de 20 000 € : 1.2 ; de 5 000 € à 20 000 € inclus : 1.0 ; moins de 5 000 € : 0.8
+DEFAULT_BUDGET_FACTORS = ((">", 20000, 1.2), (">=", 5000, 1.0), (None, None, 0.8))
+_COMPARISONS = {">": operator.gt, ">=": operator.ge}
+
+# Nombre maximal de mots entre la négation et le terme (« pas très élevé »)
+NEGATION_WINDOW = 2
+# Caractères examinés avant un terme par mot de la fenêtre de négation
+_LOOKBACK_PER_WORD = 16
+# Des formes qui partagent au moins ce préfixe sont cherchées ensemble (exceptionnel, excellent)
+_SHARED_PREFIX = 4
+
+# Lettres et chiffres latins précalculés ; le trait d'union lie les mots composés :
+# « high » n'est pas reconnu dans « high-performing »
+_LATIN_LIMIT = "\u024f"
+_LATIN_WORD_CHARS = frozenset(chr(code) for code in range(ord(_LATIN_LIMIT) + 1) if chr(code).isalnum()) | {"_", "-"}
+# Minuscules ASCII et Latin-1 (À-Þ sauf ×), comme str.lower() sur ces caractères
+_LATIN1_LOWER = bytes(code + 32 if 65 <= code <= 90 or (0xC0 <= code <= 0xDE and code != 0xD7) else code
+                      for code in range(256))
+
+
+def _is_word_char(char):
+    return char in _LATIN_WORD_CHARS or (char > _LATIN_LIMIT and char.isalnum())
+
+
+def _lower(text):
+    """Texte en minuscules ; table d'octets pour un texte Latin-1 (le cas courant), bien plus rapide que lower()."""
+    try:
+        return text.encode("latin-1").translate(_LATIN1_LOWER).decode("latin-1")
+    except UnicodeEncodeError:
+        return text.lower().replace("’", "'")
+
+
+def _lemmas(forms):
+    """
+    Regroupe les formes d'un même préfixe (élevé, élevée, élevés...) : une
+    seule recherche dans le texte par groupe de formes.
+    Retourne [(préfixe cherché, formes les plus longues d'abord, préfixe est une forme)].
+    """
+    clusters = []
+    for form in sorted(set(forms)):
+        if clusters:
+            previous = clusters[-1][-1]
+            shared = len(commonprefix([previous, form]))
+            if shared >= min(_SHARED_PREFIX, len(previous)):
+                clusters[-1].append(form)
+                continue
+        clusters.append([form])
+    # Ordre du lexique : le français d'abord, comme l'ancienne évaluation
+    clusters.sort(key=lambda cluster: min(forms.index(form) for form in cluster))
+    lemmas = []
+    for cluster in clusters:
+        key = commonprefix(cluster)
+        lemmas.append((key, tuple(sorted(cluster, key=len, reverse=True)), key in cluster))
+    return lemmas
+
+
+def _normalize(term):
+    return " ".join(term.lower().replace("’", "'").split())
+
+
+class ScoringEngine:
+    def __init__(self, lexicon=None, anchors=None, negations=None, thresholds=DEFAULT_THRESHOLDS,
+                 budget_factors=DEFAULT_BUDGET_FACTORS, negation_window=NEGATION_WINDOW, conjunctions=None):
+        self.lexicon = lexicon or DEFAULT_LEXICON
+        self.anchors = anchors or DEFAULT_ANCHORS
+        self.negations = negations or DEFAULT_NEGATIONS
+        self.conjunctions = conjunctions if conjunctions is not None else DEFAULT_CONJUNCTIONS
+        self.thresholds = thresholds
+        self.budget_factors = budget_factors
+        self.negation_window = negation_window
+        self._compile()
+
+    def _compile(self):
+        self._negation_words = frozenset(_normalize(term) for terms in self.negations.values() for term in terms)
+        self._conjunction_words = frozenset(_normalize(term) for terms in self.conjunctions.values()
+                                            for term in terms)
+        self._scope = self.negation_window + 1
+        self._lookback = _LOOKBACK_PER_WORD * self._scope
+        # Langue de chaque forme (la première déclarée l'emporte)
+        self._form_lang = {}
+        # (nom, poids, indicateur requis, lemmes) dans l'ordre du lexique
+        self._groups = []
+        for name, group in self.lexicon.items():
+            forms = []
+            for lang, terms in group["terms"].items():
+                for term in terms:
+                    form = _normalize(term)
+                    self._form_lang.setdefault(form, lang)
+                    forms.append(form)
+            self._groups.append((name, group["weight"], group.get("requires"), _lemmas(forms)))
+        self._anchor_lemmas = [(name, _lemmas([_normalize(term) for term in terms]))
+                               for name, terms in self.anchors.items()]
+
+    def _search(self, text, lemmas, negated=None):
+        """
+        Premier terme retenu (mot entier, non nié) parmi `lemmas`, ou None ;
+        les formes rencontrées niées sont ajoutées à `negated` (sans liste,
+        la négation n'est pas vérifiée).
+        """
+        find = text.find
+        size = len(text)
+        negation_words = self._negation_words
+        for key, forms, key_is_form in lemmas:
+            position = find(key)
+            while position >= 0:
+                before = text[position - 1] if position else " "
+                if before not in _LATIN_WORD_CHARS and not (before > _LATIN_LIMIT and before.isalnum()):
+                    end = position + len(key)
+                    after = text[end] if end < size else " "
+                    if after not in _LATIN_WORD_CHARS and not (after > _LATIN_LIMIT and after.isalnum()):
+                        found = key if key_is_form else None
+                    else:
+                        # Suite du mot : forme plus longue (« élevés »), ou mot qui ne fait que commencer pareil
+                        found = None
+                        for form in forms:
+                            if text.startswith(form, position):
+                                end = position + len(form)
+                                after = text[end] if end < size else " "
+                                if after not in _LATIN_WORD_CHARS and not (after > _LATIN_LIMIT and after.isalnum()):
+                                    found = form
+                                break
+                    if found is not None:
+                        if negated is None:
+                            return found
+                        # Chemin rapide (en C) : aucune négation dans les mots qui précèdent
+                        begin = position - self._lookback
+                        words = text[begin if begin > 0 else 0:position].rsplit(None, self._scope)
+                        if negation_words.isdisjoint(words) or not self._negated(text, position, words):
+                            return found
+                        negated.append(found)
+                position = find(key, position + 1)
+        return None
+
+    def _negated(self, text, start, words):
+        """Vrai si une négation précède le terme de `negation_window` mots au plus, dans la même proposition."""
+        begin = start - self._lookback
+        if len(words) <= self._scope and begin > 0 and _is_word_char(text[begin - 1]) and _is_word_char(text[begin]):
+            words = words[1:]   # Premier mot tronqué par la fenêtre
+        for word in words[:-self._scope - 1:-1]:
+            if word[-1] in _CLAUSE_PUNCTUATION:
+                return False
+            if word in self._negation_words:
+                return True
+            if word in self._conjunction_words or word[0] in _CLAUSE_PUNCTUATION:
+                return False
+        return False
+
+    def _budget_factor(self, budget):
+        for comparison, threshold, factor in self.budget_factors:
+            if comparison is None or _COMPARISONS[comparison](budget, threshold):
+                return factor
+        return 1.0
+
+    def score(self, text, budget):
+        """
+        Analyse le texte et retourne le détail du score. Pour chaque groupe,
+        "hits" contient le premier terme retenu ; "negated" les termes trouvés
+        niés avant lui (tous, si le groupe ne compte pas).
+        """
+        text = _lower(text)
+        anchors_seen = [name for name, lemmas in self._anchor_lemmas if self._search(text, lemmas)]
+        groups = {}
+        languages = {}
+        raw_score = 0
+        for name, weight, required, lemmas in self._groups:
+            hit = None
+            negated = []
+            # Comme l'ancienne évaluation : sans son indicateur, le groupe n'est pas examiné
+            if required is None or required in anchors_seen:
+                hit = self._search(text, lemmas, negated)
+            groups[name] = {"weight": weight, "hits": [hit] if hit else [], "negated": negated,
+                            "counted": hit is not None}
+            if hit is not None:
+                raw_score += weight
+                lang = self._form_lang[hit]
+                languages[lang] = languages.get(lang, 0) + 1
+
+        budget_factor = self._budget_factor(budget)
+        score = raw_score * budget_factor
+        tier = "normal"
+        for name, threshold in self.thresholds:
+            if score >= threshold:
+                tier = name
+                break
+        return {
+            "tier": tier,
+            "score": score,
+            "raw_score": raw_score,
+            "budget_factor": budget_factor,
+            "groups": groups,
+            "anchors": sorted(anchors_seen),
+            "languages": languages,
+        }
+
+    def tier(self, text, budget):
+        return self.score(text, budget)["tier"]
+
+    def score_many(self, items):
+        """Score d'un lot d'analyses : itérable de (texte, budget)."""
+        return [self.score(text, budget) for text, budget in items]
+
+
+_default_engine = None
+_default_engine_lock = threading.Lock()
+
+
+def get_scoring_engine():
+    global _default_engine
+    with _default_engine_lock:
+        if _default_engine is None:
+            _default_engine = ScoringEngine()
+        return _default_engine
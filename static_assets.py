@@ -0,0 +1,110 @@
+# --- Registre des fichiers statiques (logos, photos, modèles de documents)
+# Les fichiers sont lus une seule fois par processus et servis en octets à
+# st.image / st.download_button. Les images sont pré-encodées à la taille
+# d'affichage. Un fichier modifié sur disque est rechargé : son mtime n'est
+# revérifié qu'au plus toutes les `revalidate_after` secondes.
+import logging
+import os
+import threading
+import time
+from io import BytesIO
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REVALIDATE_SECONDS = 2.0
+
+
+def _signature(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class StaticAssetRegistry:
+    def __init__(self, revalidate_after=DEFAULT_REVALIDATE_SECONDS):
+        self.revalidate_after = revalidate_after
+        self._entries = {}   # (chemin, variante) -> {"signature", "checked", "data"}
+        self._placeholders = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "loads": 0, "stat_calls": 0}
+
+    def _get(self, path, variant, loader):
+        key = (path, variant)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry["checked"] < self.revalidate_after:
+                self.stats["hits"] += 1
+                return entry["data"]
+            self.stats["stat_calls"] += 1
+            signature = _signature(path)
+            if entry is not None and entry["signature"] == signature:
+                entry["checked"] = now
+                self.stats["hits"] += 1
+                return entry["data"]
+            data = None
+            if signature is not None:
+                try:
+                    data = loader(path)
+                except (OSError, ValueError) as e:
+                    logger.warning("Fichier statique illisible (%s) : %s", path, e)
+                self.stats["loads"] += 1
+            self._entries[key] = {"signature": signature, "checked": now, "data": data}
+            return data
+
+    def read(self, path):
+        """Octets bruts du fichier, ou None s'il est absent."""
+        def load(file_path):
+            with open(file_path, "rb") as f:
+                return f.read()
+        return self._get(path, "raw", load)
+
+    def image(self, path, max_width=None, placeholder=None):
+        """
+        Image réduite à `max_width` pixels et ré-encodée (PNG, ou JPEG pour
+        les photos). Si le fichier manque, `placeholder()` produit une image
+        PIL de remplacement, générée une seule fois.
+        """
+        def load(file_path):
+            from PIL import Image
+
+            with Image.open(file_path) as img:
+                return self._encode(img, max_width)
+
+        data = self._get(path, ("image", max_width), load)
+        if data is None and placeholder is not None:
+            with self._lock:
+                key = (path, max_width)
+                if key not in self._placeholders:
+                    self._placeholders[key] = self._encode(placeholder(), max_width)
+                return self._placeholders[key]
+        return data
+
+    @staticmethod
+    def _encode(img, max_width):
+        img_format = "JPEG" if img.format == "JPEG" else "PNG"
+        img.load()
+        if max_width and img.width > max_width:
+            img = img.copy()
+            img.thumbnail((max_width, max_width * img.height // img.width + 1))
+        if img_format == "JPEG" and img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        buffer = BytesIO()
+        # Pas de métadonnées recopiées : seule l'image est ré-encodée
+        img.save(buffer, img_format, **({"quality": 90} if img_format == "JPEG" else {}))
+        return buffer.getvalue()
+
+
+_default_registry = None
+_default_registry_lock = threading.Lock()
+
+
+def get_static_assets(**kwargs):
+    """Instance partagée par toutes les sessions du processus."""
+    global _default_registry
+    with _default_registry_lock:
+        if _default_registry is None:
+            _default_registry = StaticAssetRegistry(**kwargs)
+        return _default_registry
@@ -0,0 +1,66 @@
+import pytest
+
+from gemini_standin import Cassette, RecordingModel, ReplayModel
+
+generation_types = pytest.importorskip("google.generativeai.types.generation_types")
+protos = pytest.importorskip("google.generativeai.protos")
+
+
+def sdk_response(*parts, usage=(12, 30, 42)):
+    prompt_tokens, candidates_tokens, total_tokens = usage
+    result = protos.GenerateContentResponse(
+        candidates=[protos.Candidate(content=protos.Content(parts=list(parts), role="model"),
+                                     finish_reason=protos.Candidate.FinishReason.STOP)],
+        usage_metadata=protos.GenerateContentResponse.UsageMetadata(
+            prompt_token_count=prompt_tokens, candidates_token_count=candidates_tokens,
+            total_token_count=total_tokens),
+    )
+    return generation_types.GenerateContentResponse.from_response(result)
+
+
+class SdkModel:
+    model_name = "models/gemini-test"
+
+    def __init__(self, responses):
+        self.responses = responses
+
+    def generate_content(self, contents, stream=False, **kwargs):
+        return self.responses[contents]
+
+
+def test_records_and_replays_real_sdk_responses(tmp_path):
+    path = tmp_path / "cassette.json"
+    image = b"\xff\xd8\xff\xe0 jpeg"
+    responses = {
+        "Analyse": sdk_response(protos.Part(text="### Analyse Prédictive")),
+        "Générez l'image": sdk_response(protos.Part(text="Voici le visuel"),
+                                        protos.Part(inline_data=protos.Blob(mime_type="image/jpeg", data=image)),
+                                        usage=(5, 1290, 1295)),
+    }
+    recorder = RecordingModel(SdkModel(responses), Cassette(str(path)))
+    for prompt in responses:
+        recorder.generate_content(prompt)
+
+    replay = ReplayModel("gemini-test", Cassette(str(path)))
+    text = replay.generate_content("Analyse")
+    assert text.text == "### Analyse Prédictive"
+    assert text.parts == []
+    assert (text.usage_metadata.prompt_token_count, text.usage_metadata.candidates_token_count,
+            text.usage_metadata.total_token_count) == (12, 30, 42)
+
+    visual = replay.generate_content("Générez l'image")
+    assert visual.text == "Voici le visuel"
+    assert visual.parts[0].inline_data.data == image
+    assert visual.parts[0].inline_data.mime_type == "image/jpeg"
+    assert visual.usage_metadata.total_token_count == 1295
+
+
+def test_records_image_only_response_without_text(tmp_path):
+    path = tmp_path / "cassette.json"
+    response = sdk_response(protos.Part(inline_data=protos.Blob(mime_type="image/png", data=b"\x89PNG")))
+    RecordingModel(SdkModel({"Bannière": response}), Cassette(str(path))).generate_content("Bannière")
+
+    replayed = ReplayModel("gemini-test", Cassette(str(path))).generate_content("Bannière")
+    with pytest.raises(ValueError):
+        replayed.text
+    assert replayed.parts[0].inline_data.data == b"\x89PNG"
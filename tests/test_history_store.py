@@ -0,0 +1,44 @@
+import pytest
+
+from history_store import HistoryStore
+
+PARAMS = {"budget": 5000, "duration": 30, "goal": "Notoriété", "audience": "Étudiants"}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = HistoryStore(path=str(tmp_path / "history.sqlite3"))
+    store.add("alice", PARAMS, "Mode", "Bonne", "Campagne TikTok pour la rentrée",
+              created_at="2026-01-01 10:00:00")
+    store.add("alice", PARAMS, "Sport", "Excellente", "Partenariat avec un club local",
+              created_at="2026-01-02 10:00:00")
+    store.add("bob", PARAMS, "Mode", "Bonne", "Campagne TikTok pour les soldes",
+              created_at="2026-01-03 10:00:00")
+    return store
+
+
+def test_search_only_sees_the_owner_analyses(store):
+    assert store.count("alice", search="TikTok") == 1
+    assert store.count("bob", search="TikTok") == 1
+    assert store.count("carol", search="TikTok") == 0
+    assert [row["domain"] for row in store.page("alice", search="campagne")] == ["Mode"]
+    assert store.page("carol") == []
+
+
+def test_filters_are_combined_with_the_owner(store):
+    assert store.count("alice", domain="Mode") == 1
+    assert store.count("alice", quality="Excellente") == 1
+    assert store.count("bob", quality="Excellente") == 0
+    assert [row["domain"] for row in store.page("alice")] == ["Sport", "Mode"]
+
+
+def test_get_and_delete_ignore_other_owners(store):
+    bob_id = store.page("bob")[0]["id"]
+    assert store.get("alice", bob_id) is None
+    store.delete("alice", bob_id)
+    assert store.get("bob", bob_id)["prediction"] == "Campagne TikTok pour les soldes"
+
+
+@pytest.mark.parametrize("search", ["%", "_", "\\"])
+def test_like_wildcards_are_literal(store, search):
+    assert store.count("alice", search=search) == 0
@@ -0,0 +1,38 @@
+import pytest
+
+import app
+from neighbor_cache import NeighborCache
+from response_cache import ResponseCache
+
+PARAMS = {"budget": 5000, "duration": 30, "goal": "Notoriété", "audience": "Étudiants"}
+
+
+@pytest.mark.parametrize("text, ratio, expected", [
+    ("Budget total : 5 000 € sur 30 jours", 1.2, "Budget total : 6 000 € sur 30 jours"),
+    ("Panier moyen 12,50 € (+15 %)", 2, "Panier moyen 25,00 € (+15 %)"),
+    ("Réserve de 1.500 EUR", 1.5, "Réserve de 2.250 EUR"),
+    ("Média : 2500 euros, soit 50 %", 0.5, "Média : 1250 euros, soit 50 %"),
+    ("1 000 000 €", 1.1, "1 100 000 €"),
+    # Les coûts unitaires ne dépendent pas du budget
+    ("CPC estimé : 0,40 €", 2, "CPC estimé : 0,40 €"),
+    ("Coût par clic 1 €", 3, "Coût par clic 1 €"),
+])
+def test_rescale_budget_figures(text, ratio, expected):
+    assert app.rescale_budget_figures(text, ratio) == expected
+
+
+def test_rescale_keeps_lines_and_non_amounts():
+    text = "## Budget\n- Total : 4 000 €\n- CPA : 8 €\n- Durée : 30 jours"
+    assert app.rescale_budget_figures(text, 1.25) == "## Budget\n- Total : 5 000 €\n- CPA : 8 €\n- Durée : 30 jours"
+
+
+def test_neighbor_cache_shares_a_band():
+    cache = NeighborCache(bands={"budget": 2500}, cache=ResponseCache(path=None))
+    cache.set("models/test", PARAMS, {"text": "analyse"}, {"style": "Formel"})
+
+    entry = cache.get("models/test", dict(PARAMS, budget=7400), {"style": "Formel"})
+    assert entry == {"params": PARAMS, "value": {"text": "analyse"}}
+    assert cache.get("models/test", dict(PARAMS, budget=7500), {"style": "Formel"}) is None
+    assert cache.get("models/test", dict(PARAMS, duration=31), {"style": "Formel"}) is None
+    assert cache.get("models/test", dict(PARAMS, budget=6000), {"style": "Créatif"}) is None
+    assert cache.stats == {"hits": 1, "misses": 3, "writes": 1}
@@ -0,0 +1,59 @@
+import threading
+
+import pytest
+
+from pipeline import DONE, FAILED, SKIPPED, Stage, run_pipeline
+
+
+def test_stages_run_after_their_dependencies():
+    order = []
+    lock = threading.Lock()
+
+    def step(name, value):
+        def run(results):
+            with lock:
+                order.append(name)
+            return value(results)
+        return run
+
+    stages = [
+        Stage("report", step("report", lambda r: f"{r['prediction']} / {r['quality']}"),
+              depends_on=["prediction", "quality"]),
+        Stage("prediction", step("prediction", lambda r: "texte")),
+        Stage("quality", step("quality", lambda r: len(r["prediction"])), depends_on=["prediction"]),
+    ]
+    result = run_pipeline(stages, max_workers=3)
+
+    assert order == ["prediction", "quality", "report"]
+    assert result.get("report") == "texte / 5"
+    assert all(status == DONE for status in result.statuses.values())
+
+
+def test_failure_skips_dependents_and_keeps_other_results():
+    def fail(results):
+        raise RuntimeError("quota")
+
+    stages = [
+        Stage("prediction", fail),
+        Stage("premium", lambda r: "insights"),
+        Stage("quality", lambda r: "good", depends_on=["prediction"]),
+        Stage("celebration", lambda r: "image", depends_on=["quality"]),
+    ]
+    updates = []
+    result = run_pipeline(stages, on_update=lambda stage, status, r: updates.append((stage.name, status)))
+
+    assert result.statuses == {"prediction": FAILED, "premium": DONE, "quality": SKIPPED, "celebration": SKIPPED}
+    assert str(result.errors["prediction"]) == "quota"
+    assert result.get("premium") == "insights"
+    assert ("celebration", SKIPPED) in updates
+
+
+def test_empty_result_skips_dependents():
+    stages = [Stage("visual", lambda r: None), Stage("banner", lambda r: "png", depends_on=["visual"])]
+    result = run_pipeline(stages)
+    assert result.statuses == {"visual": DONE, "banner": SKIPPED}
+
+
+def test_unknown_dependency_is_rejected():
+    with pytest.raises(ValueError):
+        run_pipeline([Stage("quality", lambda r: "good", depends_on=["prediction"])])
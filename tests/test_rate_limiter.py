@@ -0,0 +1,90 @@
+from collections import deque
+from types import SimpleNamespace
+
+import pytest
+
+import rate_limiter
+from rate_limiter import GeminiScheduler, TokenBucket, _ModelQueue, retry_after
+
+
+class Throttled(Exception):
+    pass
+
+
+def enqueue(queue, session_id, ticket):
+    # Comme GeminiScheduler.acquire
+    if session_id not in queue.tickets:
+        queue.tickets[session_id] = deque()
+        queue.rotation.append(session_id)
+    queue.tickets[session_id].append(ticket)
+
+
+def test_round_robin_serves_sessions_in_turn():
+    queue = _ModelQueue(10, 1000)
+    for ticket, session_id in enumerate(["a", "a", "a", "b", "c"]):
+        enqueue(queue, session_id, ticket)
+
+    assert [queue.position(session_id, ticket) for ticket, session_id in enumerate("aaabc")] == [0, 3, 4, 1, 2]
+    served = []
+    while queue.rotation:
+        session_id = queue.rotation[0]
+        ticket = queue.tickets[session_id][0]
+        assert queue.is_next(session_id, ticket)
+        served.append(ticket)
+        queue.pop(session_id)
+    # Une session chargée ne passe pas devant les autres
+    assert served == [0, 3, 4, 1, 2]
+
+
+def test_token_bucket_refills_continuously():
+    bucket = TokenBucket(60)
+    bucket.consume(60, bucket.updated)
+    assert bucket.wait_time(1, bucket.updated) == pytest.approx(1.0)
+    assert bucket.wait_time(1, bucket.updated + 1.0) == 0
+    # Une demande plus grande que la capacité attend au plus un seau plein
+    assert bucket.wait_time(500, bucket.updated) == pytest.approx(59.0)
+
+
+@pytest.mark.parametrize("exc, delay", [
+    (Exception("429 Quota exceeded. Please retry in 7.5s."), 7.5),
+    (SimpleNamespace(details=[SimpleNamespace(retry_delay=SimpleNamespace(seconds=3, nanos=500_000_000))]), 3.5),
+    (Exception("500 Internal error"), None),
+])
+def test_retry_after(exc, delay):
+    assert retry_after(exc) == delay
+
+
+def test_call_waits_the_suggested_delay_then_gives_up(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(rate_limiter.time, "sleep", sleeps.append)
+    monkeypatch.setattr(rate_limiter.random, "uniform", lambda low, high: 0)
+    scheduler = GeminiScheduler(default_limits=(1000, 1_000_000), max_retries=2, retry_on=(Throttled,))
+    attempts = []
+
+    def request():
+        attempts.append(len(attempts))
+        raise Throttled("Resource exhausted, retry in 4s")
+
+    with pytest.raises(Throttled):
+        scheduler.call("a", "models/test", request, estimated_tokens=10)
+    assert len(attempts) == 3
+    assert sleeps == [4.0, 4.0]
+    assert scheduler.stats["retries"] == 2
+    assert scheduler.stats["throttled"] == 3
+
+
+def test_call_backs_off_exponentially_without_hint(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(rate_limiter.time, "sleep", sleeps.append)
+    monkeypatch.setattr(rate_limiter.random, "uniform", lambda low, high: 0)
+    scheduler = GeminiScheduler(default_limits=(1000, 1_000_000), base_delay=1.0, retry_on=(Throttled,))
+    responses = iter([Throttled("429"), Throttled("429"), "ok"])
+
+    def request():
+        response = next(responses)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    assert scheduler.call("a", "models/test", request, estimated_tokens=10) == "ok"
+    assert sleeps == [1.0, 2.0]
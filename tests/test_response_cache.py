@@ -0,0 +1,63 @@
+import pytest
+
+import response_cache
+from response_cache import ResponseCache
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(response_cache.time, "time", clock)
+    return clock
+
+
+def test_entries_expire_after_ttl_in_both_tiers(tmp_path, clock):
+    path = tmp_path / "responses.sqlite"
+    cache = ResponseCache(path=str(path), ttl=60)
+    cache.set("k", "réponse")
+    clock.now += 30
+    assert cache.get("k") == "réponse"
+
+    # Une nouvelle instance ne lit que le niveau disque
+    assert ResponseCache(path=str(path), ttl=60).get("k") == "réponse"
+
+    clock.now += 31
+    assert cache.get("k") is None
+    assert ResponseCache(path=str(path), ttl=60).get("k") is None
+    assert cache.stats["misses"] == 1
+
+
+def test_memory_tier_evicts_least_recently_used(clock):
+    cache = ResponseCache(path=None, memory_items=2)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    assert cache.get("a") == "1"
+    cache.set("c", "3")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    assert cache.get("c") == "3"
+    assert cache.stats["evictions"] == 1
+
+
+def test_disk_tier_stays_under_size_limit(tmp_path, clock):
+    path = str(tmp_path / "responses.sqlite")
+    cache = ResponseCache(path=path, memory_items=1, max_disk_bytes=25)
+    for key in "abc":
+        cache.set(key, key * 10)
+        clock.now += 1
+    clock.now += 1
+    # "b" est relu sur disque : il devient le plus récemment utilisé
+    assert ResponseCache(path=path, max_disk_bytes=25).get("b") == "b" * 10
+
+    cache.set("d", "d" * 10)
+    disk = ResponseCache(path=path, max_disk_bytes=25)
+    assert [key for key in "abcd" if disk.get(key) is not None] == ["b", "d"]
@@ -0,0 +1,66 @@
+import pytest
+
+from scoring import ScoringEngine
+
+TEXT = "Le ROI est élevé et le CPA reste faible."
+
+
+@pytest.fixture(scope="module")
+def engine():
+    return ScoringEngine()
+
+
+@pytest.mark.parametrize("budget, factor", [
+    (4999, 0.8), (5000, 1.0), (12000, 1.0), (20000, 1.0), (20001, 1.2),
+])
+def test_budget_factor_matches_baseline_thresholds(engine, budget, factor):
+    assert engine.score(TEXT, budget)["budget_factor"] == factor
+
+
+@pytest.mark.parametrize("budget, tier", [(4999, "good"), (5000, "excellent"), (20000, "excellent")])
+def test_tier_at_budget_boundaries(engine, budget, tier):
+    # 2 (ROI) + 2 (CPA) + 2 (efficacité) = 6 : 4.8 sous 5 000 €, 6 à partir de 5 000 €
+    text = TEXT + " Une campagne efficace."
+    assert engine.tier(text, budget) == tier
+
+
+def test_negation_within_window_and_sentence(engine):
+    groups = engine.score("Le ROI n'est pas très élevé. Le ROI reste élevé.", 10000)["groups"]
+    assert groups["roi_positif"]["negated"] == ["élevé"]
+    assert groups["roi_positif"]["hits"] == ["élevé"]
+
+
+def test_negation_does_not_cross_sentence_end(engine):
+    groups = engine.score("The ROI is not. High returns overall.", 10000)["groups"]
+    assert groups["roi_positif"]["hits"] == ["high"]
+
+
+def test_multiword_terms(engine):
+    result = engine.score("A high-performing campaign; the return on investment isn’t above average.", 10000)
+    assert result["groups"]["efficacite"]["hits"] == ["high-performing"]
+    assert result["groups"]["roi_positif"]["hits"] == []
+    assert result["groups"]["roi_positif"]["negated"] == ["above average"]
+    assert result["anchors"] == ["roi"]
+
+
+def test_french_agreement_and_typography(engine):
+    result = engine.score("Retour sur investissement : « ÉLEVÉS » !", 10000)
+    assert result["groups"]["roi_positif"]["hits"] == ["élevés"]
+    assert result["languages"] == {"fr": 1}
+
+
+def test_word_prefix_is_not_a_term(engine):
+    # « bas » ne doit pas être reconnu dans « base »
+    result = engine.score("Le CPA moyen est calculé sur la base des données historiques.", 10000)
+    assert result["groups"]["cpa_maitrise"]["hits"] == []
+    assert result["groups"]["cpa_maitrise"]["counted"] is False
+
+
+@pytest.mark.parametrize("text, hit, negated", [
+    ("Le ROI n'est pas élevé mais important.", "important", "élevé"),
+    ("The ROI is not high, strong overall.", "strong", "high"),
+])
+def test_negation_stops_at_conjunction_and_punctuation(engine, text, hit, negated):
+    group = engine.score(text, 10000)["groups"]["roi_positif"]
+    assert group["hits"] == [hit]
+    assert group["negated"] == [negated]
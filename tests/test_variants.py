@@ -0,0 +1,32 @@
+import pytest
+
+import app
+
+
+def test_sections_are_placed_by_their_number():
+    text = "=== VARIANTE 2 ===\nSecond\n\n=== VARIANTE 1 ===\nPremier\n"
+    assert app.split_variants(text, 2) == ["Premier", "Second"]
+
+
+@pytest.mark.parametrize("header", [
+    "=== VARIANTE 1 ===",
+    "## === Variante 1 ===",
+    "**=== VARIANTE 1 === (Formel, Français)**",
+])
+def test_header_decorations_are_tolerated(header):
+    assert app.split_variants(f"{header}\nTexte\n=== VARIANTE 2 ===\nText", 2) == ["Texte", "Text"]
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Pas de section du tout", [None, None]),
+    ("=== VARIANTE 1 ===\n\n=== VARIANTE 2 ===\nText", [None, "Text"]),
+    ("=== VARIANTE 1 ===\nTexte\n=== VARIANTE 3 ===\nHors limite", ["Texte", None]),
+    ("=== VARIANTE 0 ===\nZéro\n=== VARIANTE 2 ===\nText", [None, "Text"]),
+    ("=== VARIANTE 1 ===\nPremier\n=== VARIANTE 1 ===\nDoublon", ["Premier", None]),
+])
+def test_missing_empty_or_unexpected_sections(text, expected):
+    assert app.split_variants(text, 2) == expected
+
+
+def test_text_before_the_first_header_is_ignored():
+    assert app.split_variants("Voici les versions :\n=== VARIANTE 1 ===\nTexte", 1) == ["Texte"]
@@ -0,0 +1,263 @@
+# --- Traces des analyses
+# Chaque étape d'une analyse (initialisation du client, prédiction, insights,
+# visuels, célébration, graphiques, PDF) est enregistrée dans un « span » :
+# durée, tokens rapportés par usage_metadata, nouvelles tentatives après un
+# 429, classe de l'erreur éventuelle. Les spans sont écrits en JSON (une ligne
+# par span) et agrégés dans un fichier texte au format Prometheus (à exposer
+# par exemple via le collecteur « textfile » de node_exporter).
+import json
+import logging
+import os
+import secrets
+import statistics
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOG_PATH = ".cache/traces.jsonl"
+DEFAULT_METRICS_PATH = ".cache/metrics.prom"
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+DEFAULT_RECENT_TRACES = 100
+DEFAULT_WINDOW = 500   # Durées conservées par étape pour les percentiles
+METRIC_PREFIX = "gemini_marketing"
+TOKEN_KINDS = ("prompt", "candidates", "total")
+
+_local = threading.local()
+
+
+def new_trace_id():
+    return secrets.token_hex(8)
+
+
+class Span:
+    def __init__(self, trace_id, name, attributes):
+        self.trace_id = trace_id
+        self.name = name
+        self.attributes = dict(attributes)
+        self.started_at = time.time()
+        self.duration = None
+        self.status = "ok"
+        self.error = None
+        self.calls = 0
+        self.retries = 0
+        self.tokens = dict.fromkeys(TOKEN_KINDS, 0)
+
+    def record_usage(self, response):
+        """Ajoute les tokens de `response.usage_metadata` (un appel au modèle)."""
+        self.calls += 1
+        usage = getattr(response, "usage_metadata", None)
+        if usage is None:
+            return
+        for kind in TOKEN_KINDS:
+            self.tokens[kind] += getattr(usage, f"{kind}_token_count", 0) or 0
+
+    def record_error(self, exc):
+        self.status = "error"
+        self.error = type(exc).__name__
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "span": self.name,
+            "started_at": round(self.started_at, 3),
+            "duration_s": round(self.duration, 4) if self.duration is not None else None,
+            "status": self.status,
+            "error": self.error,
+            "calls": self.calls,
+            "retries": self.retries,
+            "tokens": self.tokens,
+            "attributes": self.attributes,
+        }
+
+
+# --- Span courant (par thread) : les appels Gemini y rattachent tokens et erreurs
+def current_span():
+    return getattr(_local, "span", None)
+
+
+def record_usage(response):
+    span = current_span()
+    if span is not None:
+        span.record_usage(response)
+
+
+def record_retry():
+    span = current_span()
+    if span is not None:
+        span.retries += 1
+
+
+def record_error(exc):
+    span = current_span()
+    if span is not None:
+        span.record_error(exc)
+
+
+def annotate(**attributes):
+    span = current_span()
+    if span is not None:
+        span.attributes.update(attributes)
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class _StageMetrics:
+    def __init__(self, buckets):
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=DEFAULT_WINDOW)
+        self.tokens = dict.fromkeys(TOKEN_KINDS, 0)
+        self.retries = 0
+        self.errors = {}
+
+
+class Tracer:
+    def __init__(self, log_path=DEFAULT_LOG_PATH, metrics_path=DEFAULT_METRICS_PATH, buckets=DEFAULT_BUCKETS,
+                 recent_traces=DEFAULT_RECENT_TRACES):
+        self.metrics_path = metrics_path
+        self.buckets = tuple(buckets)
+        self.recent_traces = recent_traces
+        self._traces = OrderedDict()   # trace_id -> [dict des spans]
+        self._stages = {}
+        self._lock = threading.Lock()
+
+        self._logger = logging.getLogger(f"{__name__}.{id(self)}")
+        self._logger.propagate = False
+        self._logger.setLevel(logging.INFO)
+        if log_path:
+            try:
+                Path(log_path).parent.mkdir(parents=True, exist_ok=True)
+                handler = logging.FileHandler(log_path, encoding="utf-8")
+                handler.setFormatter(logging.Formatter("%(message)s"))
+                self._logger.addHandler(handler)
+            except OSError as e:
+                # Les traces restent consultables en mémoire (panneau de debug)
+                logger.warning("Journal des traces indisponible (%s) : %s", log_path, e)
+        if metrics_path:
+            Path(metrics_path).parent.mkdir(parents=True, exist_ok=True)
+
+    @contextmanager
+    def span(self, name, trace_id=None, **attributes):
+        """Mesure le bloc ; une exception qui le traverse est enregistrée puis relancée."""
+        span = Span(trace_id or new_trace_id(), name, attributes)
+        parent = current_span()
+        _local.span = span
+        start = time.perf_counter()
+        try:
+            yield span
+        except BaseException as e:
+            span.record_error(e)
+            raise
+        finally:
+            span.duration = time.perf_counter() - start
+            _local.span = parent
+            self._finish(span)
+
+    def _finish(self, span):
+        record = span.to_dict()
+        with self._lock:
+            spans = self._traces.setdefault(span.trace_id, [])
+            spans.append(record)
+            self._traces.move_to_end(span.trace_id)
+            while len(self._traces) > self.recent_traces:
+                self._traces.popitem(last=False)
+
+            stage = self._stages.get(span.name)
+            if stage is None:
+                stage = self._stages[span.name] = _StageMetrics(self.buckets)
+            stage.count += 1
+            stage.sum += span.duration
+            stage.recent.append(span.duration)
+            for i, bound in enumerate(self.buckets):
+                if span.duration <= bound:
+                    stage.bucket_counts[i] += 1
+            for kind in TOKEN_KINDS:
+                stage.tokens[kind] += span.tokens[kind]
+            stage.retries += span.retries
+            if span.error:
+                stage.errors[span.error] = stage.errors.get(span.error, 0) + 1
+            metrics = self.prometheus_text() if self.metrics_path else None
+
+        self._logger.info(json.dumps(record, ensure_ascii=False, default=str))
+        if metrics is not None:
+            self._write_metrics(metrics)
+
+    def _write_metrics(self, text):
+        # Écriture atomique : un collecteur ne lit jamais un fichier à moitié écrit
+        tmp_path = f"{self.metrics_path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp_path, self.metrics_path)
+        except OSError as e:
+            logger.warning("Écriture des métriques impossible (%s) : %s", self.metrics_path, e)
+
+    def trace(self, trace_id):
+        """Spans d'une analyse, dans l'ordre où ils se sont terminés."""
+        with self._lock:
+            return list(self._traces.get(trace_id, []))
+
+    def summary(self):
+        """Par étape : nombre, p50/p95 (s) sur les dernières mesures, tokens, nouvelles tentatives, erreurs."""
+        with self._lock:
+            stages = {name: (list(m.recent), m.count, dict(m.tokens), m.retries, dict(m.errors))
+                      for name, m in self._stages.items()}
+        summary = {}
+        for name, (recent, count, tokens, retries, errors) in stages.items():
+            quantiles = statistics.quantiles(recent, n=20, method="inclusive") if len(recent) > 1 else recent * 19
+            summary[name] = {"count": count, "p50": statistics.median(recent), "p95": quantiles[18],
+                             "tokens": tokens, "retries": retries, "errors": errors}
+        return summary
+
+    def prometheus_text(self):
+        """Métriques agrégées au format texte de Prometheus (appelée sous verrou par _finish)."""
+        prefix = METRIC_PREFIX
+        lines = [
+            f"# HELP {prefix}_stage_duration_seconds Durée des étapes d'analyse.",
+            f"# TYPE {prefix}_stage_duration_seconds histogram",
+        ]
+        for name, m in sorted(self._stages.items()):
+            stage = _label(name)
+            for bound, n in zip(self.buckets, m.bucket_counts):
+                lines.append(f'{prefix}_stage_duration_seconds_bucket{{stage="{stage}",le="{bound:g}"}} {n}')
+            lines.append(f'{prefix}_stage_duration_seconds_bucket{{stage="{stage}",le="+Inf"}} {m.count}')
+            lines.append(f'{prefix}_stage_duration_seconds_sum{{stage="{stage}"}} {m.sum:.6f}')
+            lines.append(f'{prefix}_stage_duration_seconds_count{{stage="{stage}"}} {m.count}')
+
+        lines += [f"# HELP {prefix}_stage_tokens_total Tokens Gemini consommés par étape.",
+                  f"# TYPE {prefix}_stage_tokens_total counter"]
+        for name, m in sorted(self._stages.items()):
+            for kind in TOKEN_KINDS:
+                lines.append(f'{prefix}_stage_tokens_total{{stage="{_label(name)}",kind="{kind}"}} {m.tokens[kind]}')
+
+        lines += [f"# HELP {prefix}_stage_retries_total Nouvelles tentatives après un dépassement de quota.",
+                  f"# TYPE {prefix}_stage_retries_total counter"]
+        for name, m in sorted(self._stages.items()):
+            lines.append(f'{prefix}_stage_retries_total{{stage="{_label(name)}"}} {m.retries}')
+
+        lines += [f"# HELP {prefix}_stage_errors_total Étapes en erreur, par classe d'exception.",
+                  f"# TYPE {prefix}_stage_errors_total counter"]
+        for name, m in sorted(self._stages.items()):
+            for error, n in sorted(m.errors.items()):
+                lines.append(f'{prefix}_stage_errors_total{{stage="{_label(name)}",error="{_label(error)}"}} {n}')
+        return "\n".join(lines) + "\n"
+
+
+_default_tracer = None
+_default_tracer_lock = threading.Lock()
+
+
+def get_tracer(**kwargs):
+    """Instance partagée par toutes les sessions du processus."""
+    global _default_tracer
+    with _default_tracer_lock:
+        if _default_tracer is None:
+            _default_tracer = Tracer(**kwargs)
+        return _default_tracer